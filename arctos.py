@@ -1,12 +1,22 @@
-from time import sleep
+import asyncio
+from concurrent.futures import wait
+from typing import Callable, Dict, List, Optional, Tuple
 
 import can
-from can.interfaces import serial
+from serial import SerialException
 
-from base_motor import MotorStatus
+from base_motor import BaseMotor, MotorStatus, limit_speed, limit_acc, estimate_turn_duration
+from can_device import CanDevice
+from can_helper import is_message_trace
+from can_requests import PendingRequests
 from gripper_device import GripperDevice
-from led_device import LedDevice, Color
+from led_device import LedDevice, LedRenderer, Color
+from motion_queue import MotionQueue
 from motors import XMotor, YMotor, ZMotor, AMotor, BMotor, CMotor
+from position_snapshot import save_snapshot, load_snapshot, mark_dirty, restore_positions
+from timer_wheel import TimerWheel
+from trajectory_planner import TrajectoryPlan
+from tx_scheduler import TransmitScheduler
 
 
 motor_statuses_to_color_mapping = {
@@ -18,14 +28,115 @@ motor_statuses_to_color_mapping = {
 }
 
 
+def synchronized_turn_parameters(motors: Dict[str, BaseMotor],
+                                 joints: Dict[str, float],
+                                 speed: int,
+                                 acc: int) -> Dict[str, Tuple[int, int]]:
+    """
+    Compute per axis speed and acceleration so all joints arrive together.
+
+    The axis with the most motor rotation (joint degrees times gear ratio)
+    runs at the given speed, the others are slowed down in proportion.
+    Accelerations are scaled so every axis spends the same time ramping: the
+    firmware changes the speed by 1 every (256 - acc) * 50 us.
+
+    :param motors: Axis name -> motor.
+    :param joints: Axis name -> relative joint angle in degrees.
+    :param speed: Speed of the leading axis (0-3000).
+    :param acc: Acceleration of the leading axis (0-255).
+    :return: Axis name -> (speed, acc).
+    """
+    speed = limit_speed(speed)
+    acc = limit_acc(acc)
+    rotations = {axis: abs(degrees * motors[axis].ratio) for axis, degrees in joints.items()}
+    max_rotation = max(rotations.values(), default=0)
+    parameters = {}
+    for axis, rotation in rotations.items():
+        if max_rotation == 0:
+            parameters[axis] = (speed, acc)
+            continue
+        axis_speed = max(1, round(speed * rotation / max_rotation))
+        axis_acc = 256 - (256 - acc) * speed / axis_speed
+        parameters[axis] = (axis_speed, min(255, max(1, round(axis_acc))))
+    return parameters
+
+
+# Seconds waited beyond a command timeout, so the timer wheel expires the command first
+_WATCHDOG_MARGIN = 0.5
+
+
+# Errors of a closed bus or serial port: reading it again fails the same way
+CLOSED_BUS_ERRORS = (OSError, SerialException, can.CanOperationError)
+
+
+class ArctosListener(can.Listener):
+    def __init__(self, arctos: 'Arctos') -> None:
+        """
+        Forward every frame received by the notifier to an Arctos instance.
+
+        :param arctos: Arctos instance to dispatch the frames to.
+        """
+        self._arctos = arctos
+
+    def on_message_received(self, msg: can.Message) -> None:
+        try:
+            self._arctos.on_new_can_message(msg)
+        except Exception as e:
+            print(f"Error (on_new_can_message): {e}")
+
+    def on_error(self, exc: Exception) -> None:
+        print(f"Error: {exc}")
+        if isinstance(exc, CLOSED_BUS_ERRORS):
+            # Likely the bus/serial port is closed. Stop the notifier without
+            # joining: we are running inside its reader thread.
+            self._arctos.stop_notifier()
+
+    def stop(self) -> None:
+        print("Listener stopped")
+
+
 class Arctos:
-    def __init__(self, bus: can.interface.Bus) -> None:
+    def __init__(self,
+                 bus: can.interface.Bus,
+                 loop: Optional[asyncio.AbstractEventLoop] = None,
+                 tx: Optional[TransmitScheduler] = None,
+                 led_rate: float = 10,
+                 threaded: bool = True,
+                 snapshot_path: Optional[str] = None,
+                 timers: Optional[TimerWheel] = None) -> None:
         """
         Initialize the Arctos class with a CAN bus interface and motor instances.
         
         :param bus: CAN bus interface for motor communication.
+        :param loop: Optional asyncio event loop. When given, received frames are
+            dispatched inside the loop (see :class:`async_arctos.AsyncArctos`).
+        :param tx: Transmit scheduler of the bus. By default one is created with its own thread.
+        :param led_rate: Maximum LED frames per second.
+        :param threaded: Start the receive, transmit, LED and timer threads. When False the owner
+            passes received frames to :meth:`on_new_can_message` (or calls :meth:`start_can_listener`)
+            and calls ``tx.pump()``, ``led_renderer.pump()`` and ``timers.pump()``
+            (see :class:`arm_controller.ArmController` and :class:`async_arctos.AsyncArctos`).
+        :param snapshot_path: Position snapshot written on shutdown and used by :meth:`warm_start`.
+        :param timers: Timer wheel failing commands whose reply is late, may be shared by several arms.
+            By default one is created with its own thread (pumped by the owner when not threaded).
         """
         self._bus = bus
+        self._loop = loop
+        self._threaded = threaded
+        self.snapshot_path = snapshot_path
+        # Every frame to the arm goes through one priority queue, emergency stops first
+        if tx is None:
+            tx = TransmitScheduler(bus)
+            if threaded:
+                tx.start()
+        self.tx = tx
+        # Deadlines of every command in flight: turns that never report "stopped" set their motor to ERROR
+        self._owns_timers = timers is None
+        if timers is None:
+            timers = TimerWheel()
+            if threaded:
+                timers.start()
+        self.timers = timers
 
         # Initialize motor instances
         self._motor_classes = {
@@ -37,54 +148,89 @@ class Arctos:
             'c': CMotor
         }
         self._motors = {key: cls(bus) for key, cls in self._motor_classes.items()}
+        # Axis -> turn queue, created on first use
+        self._motion_queues: Dict[str, MotionQueue] = {}
         for motor in self._motors.values():
             motor.can_wait_for_response = False
 
         self.led = LedDevice(bus)
+        # Status colors are sent by a rate limited renderer instead of once per received frame
+        self.led_renderer = LedRenderer(self.led, rate=led_rate)
+        if threaded:
+            self.led_renderer.start()
         self.gripper = GripperDevice(bus)
 
+        # Arbitration id -> device, used to route every received frame
+        self._motors_by_id = {motor.can_id: motor for motor in self._motors.values()}
+        self._devices = {device.can_id: device for device in [*self._motors.values(), self.led, self.gripper]}
+
+        # Commands waiting for their replies, resolved by on_new_can_message
+        self.requests = PendingRequests(self.timers)
+        # Extra consumers of every received frame (telemetry, recorders...)
+        self._message_listeners: List[Callable[[can.Message], None]] = []
+        for device in self._devices.values():
+            device.requests = self.requests
+            device.tx = self.tx
+        # Commands the scheduler could not send fail right away instead of timing out
+        self.tx.add_failed_listener(self.requests.fail_request)
+
         # Start the CAN listener
-        self._listener_active = False
-        self._listener_thread = None
-        self.start_can_listener()
+        self._notifier = None
+        if threaded:
+            self.start_can_listener()
         self.motor_statuses_to_led()
 
     def __str__(self):
-        return f"Arctos \n\t Motors: \n\t\t {'\n\t\t '.join([str(motor) for motor in self._motors.values()])}"
+        motors = '\n\t\t '.join([str(motor) for motor in self._motors.values()])
+        return f"Arctos \n\t Motors: \n\t\t {motors}"
 
     def start_can_listener(self):
-        import threading
-        self._listener_active = True  # Ensure flag is set
-        self._listener_thread = threading.Thread(target=self._listener, daemon=True)
-        self._listener_thread.start()
-
-    def _listener(self):
-        while self._listener_active:
-            try:
-                message = self._bus.recv(timeout=0.1)
-                try:
-                    if message:
-                        self.on_new_can_message(message)
-                except Exception as e:
-                    print(f"Error (on_new_can_message): {e}")
-                sleep(0.3)
-            except (OSError, serial.serialutil.SerialException) as e:
-                print(f"Error: {e}")
-                # Likely the bus/serial port is closed.
-                break
-        print("Listener stopped")
+        """
+        Start dispatching received frames as soon as they arrive.
+
+        The notifier blocks in ``bus.recv`` and calls :meth:`on_new_can_message`
+        for every frame, so there is no polling interval between frames.
+        """
+        if self._notifier is not None:
+            return
+        self._notifier = can.Notifier(self._bus, [ArctosListener(self)], timeout=0.1, loop=self._loop)
+
+    def stop_notifier(self):
+        """
+        Stop the notifier without waiting for its reader thread.
+        """
+        if self._notifier is not None:
+            self._notifier.stop(timeout=0)
 
     def stop_can_listener(self):
-        self._listener_active = False
-        if hasattr(self, '_listener_thread'):
-            self._listener_thread.join(timeout=2)
+        """
+        Save the position snapshot, stop the receive, transmit, LED and timer threads and shut the bus down.
+
+        Called on leaving a ``with Arctos(bus) as arctos:`` block. Nothing is stopped
+        when the object is garbage collected: the owner calls it explicitly.
+        """
+        if getattr(self, 'snapshot_path', None) is not None:
+            # Clean only when every motor is idle, see position_snapshot.save_snapshot
+            save_snapshot(self.snapshot_path, self._motors, clean=True)
+            self.snapshot_path = None
+        if getattr(self, '_notifier', None) is not None:
+            self._notifier.stop(timeout=2)
+            self._notifier = None
+        if getattr(self, 'requests', None) is not None:
+            self.requests.fail_all(can.CanOperationError("CAN listener stopped"))
+        if getattr(self, 'led_renderer', None) is not None:
+            self.led_renderer.stop()
+        if getattr(self, 'tx', None) is not None:
+            self.tx.stop()
+        if getattr(self, '_owns_timers', False):
+            self.timers.stop()
         # Now it is safe to close the bus/serial port
         self._bus.shutdown()  # or self._bus.close() depending on your API
 
-    def __del__(self):
-        """
-        Destructor to clean up resources when the object is destroyed.
-        """
+    def __enter__(self) -> 'Arctos':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
         self.stop_can_listener()
 
     def motor_statuses_to_led(self):
@@ -95,7 +241,7 @@ class Arctos:
             is_led_changed = is_led_changed or changed
 
         if is_led_changed:
-            self.led.show()
+            self.led_renderer.invalidate()
 
 
     def on_new_can_message(self, message: can.Message):
@@ -106,17 +252,39 @@ class Arctos:
         """
         # Example: Call a method based on message content
         # This is a placeholder and should be replaced with actual logic
-        received_data_bytes = ", ".join(
-            [f"0x{byte:02X}" for byte in message.data]
-        )
         sender_id = message.arbitration_id
-        print(
-            f"\tReceived: arbitration_id=0x{sender_id:X}, data=[{received_data_bytes}], is_extended_id=False"
-        )
-        motor = self.get_motor_by_id(sender_id)
-        if motor:
-            motor.on_can_message(message)
-            self.motor_statuses_to_led()
+        if is_message_trace():
+            received_data_bytes = ", ".join(
+                [f"0x{byte:02X}" for byte in message.data]
+            )
+            print(
+                f"\tReceived: arbitration_id=0x{sender_id:X}, data=[{received_data_bytes}], is_extended_id=False"
+            )
+        self.tx.note_received(message)
+        device = self._devices.get(sender_id)
+        if device:
+            device.on_can_message(message)
+            if isinstance(device, BaseMotor):
+                self.motor_statuses_to_led()
+        # Device state is updated first so whoever waits on a reply sees it
+        self.requests.on_message_received(message)
+        for listener in self._message_listeners:
+            listener(message)
+
+    def add_message_listener(self, listener: Callable[[can.Message], None]):
+        """
+        Call listener with every received frame, after devices and pending requests handled it.
+
+        :param listener: Callable taking the received message. Runs on the receive path, keep it short.
+        """
+        self._message_listeners.append(listener)
+
+    def remove_message_listener(self, listener: Callable[[can.Message], None]):
+        self._message_listeners.remove(listener)
+
+    @property
+    def bus(self) -> can.interface.Bus:
+        return self._bus
 
     def get_motor_by_axis(self, axis_name: str):
         """
@@ -128,6 +296,18 @@ class Arctos:
         assert axis_name in self._motor_classes, f"Motor with id '{axis_name}' not found."
         return self._motors.get(axis_name)
 
+    def motion_queue(self, axis_name: str) -> MotionQueue:
+        """
+        Turn queue of a motor: each queued turn is sent as soon as the previous one stopped.
+
+        :param axis_name: The identifier of the motor ('x', 'y', 'z', 'a', 'b', 'c').
+        :return: The queue of the motor, the same one on every call.
+        """
+        queue = self._motion_queues.get(axis_name)
+        if queue is None:
+            queue = self._motion_queues[axis_name] = MotionQueue(self.get_motor_by_axis(axis_name))
+        return queue
+
     def get_motor_by_id(self, motor_id: int):
         """
         Get the motor instance by its CAN id.
@@ -135,10 +315,16 @@ class Arctos:
         :param motor_id: The CAN id of the motor.
         :return: The motor instance if found, otherwise None.
         """
-        for motor in self._motors.values():
-            if motor.can_id == motor_id:
-                return motor
-        return None
+        return self._motors_by_id.get(motor_id)
+
+    def get_device_by_id(self, can_id: int) -> Optional[CanDevice]:
+        """
+        Get any device (motor, gripper or LED) by its CAN id.
+
+        :param can_id: The CAN id of the device.
+        :return: The device instance if found, otherwise None.
+        """
+        return self._devices.get(can_id)
 
     def get_active_motors(self):
         """
@@ -148,13 +334,143 @@ class Arctos:
         """
         return [motor for motor in self._motors.values() if motor.is_active]
 
-    def go_home(self):
+    def get_active_axes(self):
+        """
+        Get the axis names of the active motors.
+
+        :return: A list of axis names, e.g. ['x', 'y', 'z'].
         """
-        Send the go home command to all motors.
+        return [axis for axis, motor in self._motors.items() if motor.is_active]
+
+    def go_home(self,
+                axes: Optional[List[str]] = None,
+                order: Optional[Dict[str, List[str]]] = None,
+                timeouts: Optional[Dict[str, float]] = None) -> Dict[str, Optional[int]]:
         """
-        for motor in self.get_active_motors():
-            if motor not in [self.b_motor(), self.c_motor()]:
-                motor.go_home()
+        Home the motors and move them to their zero point, independent axes in parallel.
+        The B/C wrist is not homed. See :class:`homing.HomingOrchestrator`.
+
+        :param axes: Axes to home, by default the active ones of the homing order.
+        :param order: Axis -> axes to home first, homing.DEFAULT_HOMING_ORDER by default.
+        :param timeouts: Axis -> max seconds to find home.
+        :return: Axis -> 0x02 when homed, 0x00 when homing failed, None on timeout or skipped.
+        """
+        from homing import HomingOrchestrator
+        return HomingOrchestrator(self, order=order, timeouts=timeouts).run(axes)
+
+    def warm_start(self, tolerance: float = 0.5) -> Dict[str, Optional[int]]:
+        """
+        Restore the positions of the snapshot that the encoders confirm and home the other axes.
+
+        :param tolerance: Max difference in joint degrees between the snapshot and the encoder.
+        :return: Axis -> 0x02 when restored or homed, see :meth:`go_home`.
+        """
+        restored = []
+        if self.snapshot_path is not None:
+            snapshot = load_snapshot(self.snapshot_path)
+            if snapshot is not None:
+                restored = restore_positions(snapshot, self._motors, tolerance)
+            # Until the next controlled shutdown the snapshot is not trusted
+            mark_dirty(self.snapshot_path)
+        from homing import HomingOrchestrator, HOME_FOUND
+        homing = HomingOrchestrator(self)
+        results = {axis: HOME_FOUND for axis in restored}
+        missing = [axis for axis in homing.default_axes() if axis not in restored]
+        if restored:
+            print(f"Restored {', '.join(restored)} from the snapshot")
+        if missing:
+            results.update(homing.run(missing))
+        return results
+
+    def emergency_stop(self):
+        """
+        Stop every motor immediately. The frames are sent ahead of anything queued.
+        """
+        for queue in self._motion_queues.values():
+            queue.clear()
+        for motor in self._motors.values():
+            motor.emergency_stop()
+
+    def move_joints(self,
+                    joints: Dict[str, float],
+                    speed: int = 1000,
+                    acc: int = 200,
+                    timeout: Optional[float] = None) -> Dict[str, Optional[int]]:
+        """
+        Turn several joints at once so that they all finish together.
+
+        All turn commands are sent back-to-back, then every completion is
+        awaited concurrently, so the move lasts as long as the slowest axis.
+
+        :param joints: Axis name -> relative joint angle in degrees, e.g. {'x': 90, 'y': -30}.
+        :param speed: Speed of the axis with the most motor rotation (0-3000).
+        :param acc: Acceleration of that axis (0-255).
+        :param timeout: Max time in seconds to wait, defaults to twice the estimated duration plus one second.
+        :return: Axis name -> final status (0x02 stopped, 0x03 endstop, 0x00 failed), None on timeout.
+        """
+        motors = {axis: self.get_motor_by_axis(axis) for axis in joints}
+        parameters = synchronized_turn_parameters(motors, joints, speed, acc)
+        if timeout is None:
+            duration = max(
+                [estimate_turn_duration(joints[axis] * motors[axis].ratio, *parameters[axis]) for axis in joints],
+                default=0
+            )
+            timeout = 2 * duration + 1
+
+        turns = {axis: (degrees, *parameters[axis]) for axis, degrees in joints.items()}
+        return self._run_turns(turns, timeout)
+
+    def run_trajectory(self, plan: TrajectoryPlan, stop_on_error: bool = True) -> List[Dict[str, Optional[int]]]:
+        """
+        Run a planned trajectory segment by segment.
+
+        Every segment is a synchronized burst of relative turns, waited for
+        with the timeout predicted by the planner.
+
+        :param plan: Plan from trajectory_planner.plan_trajectory / plan_motor_trajectory.
+        :param stop_on_error: Stop after a segment where an axis failed or timed out.
+        :return: Per segment axis name -> final status, as returned by move_joints.
+        """
+        results = []
+        for segment in range(len(plan)):
+            commands = plan.commands(segment)
+            turns = {axis: (command.degrees, command.speed, command.acc) for axis, command in commands.items()}
+            statuses = self._run_turns(turns, plan.timeout(segment))
+            results.append(statuses)
+            if stop_on_error and any(status in (None, 0x00) for status in statuses.values()):
+                break
+        return results
+
+    def _run_turns(self, turns: Dict[str, Tuple[float, int, int]], timeout: float) -> Dict[str, Optional[int]]:
+        """
+        Send relative turns in one burst and wait for all of them.
+
+        :param turns: Axis name -> (joint degrees, speed, acc).
+        :param timeout: Max time in seconds to wait for every axis.
+        :return: Axis name -> final status, None on timeout.
+        """
+        futures = {}
+        try:
+            for axis, (degrees, speed, acc) in turns.items():
+                futures[axis] = self.get_motor_by_axis(axis).start_turn(degrees, speed=speed, acc=acc, timeout=timeout)
+        except Exception:
+            # Do not leave the axes already sent turning unattended
+            for axis, future in futures.items():
+                future.cancel()
+                self.get_motor_by_axis(axis).emergency_stop()
+            raise
+        # The timer wheel fails late turns (and sets their motor to ERROR); waiting a
+        # bit longer lets it do so before the futures are cancelled here
+        wait(futures.values(), timeout=timeout + _WATCHDOG_MARGIN)
+
+        statuses = {}
+        for axis, future in futures.items():
+            if future.done() and not future.cancelled() and future.exception() is None:
+                statuses[axis] = future.result()[-1].data[1]
+            else:
+                future.cancel()
+                statuses[axis] = None
+        return statuses
 
     def x_motor(self):
         """Get the X motor instance."""
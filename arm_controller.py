@@ -0,0 +1,205 @@
+import selectors
+import socket
+import threading
+from typing import Dict, Optional
+
+import can
+
+from arctos import Arctos, ArctosListener, CLOSED_BUS_ERRORS
+from timer_wheel import TimerWheel
+from tx_scheduler import TransmitScheduler
+
+
+class _ArmEntry:
+    def __init__(self, name: str, arctos: Arctos) -> None:
+        self.name = name
+        self.arctos = arctos
+        self.bus = arctos.bus
+        self.listener = ArctosListener(arctos)
+        # Registered in the selector; False for buses read by their own notifier and while reading is paused
+        self.selected = False
+
+
+class ArmController:
+    def __init__(self,
+                 bitrate: int = 500000,
+                 max_bus_load: float = 0.7,
+                 led_rate: float = 10,
+                 error_backoff: float = 0.1) -> None:
+        """
+        Several arms, each on its own bus, served by one I/O thread.
+
+        The thread waits on the file descriptors of all the buses (socketcan,
+        slcan...) and on a wakeup socket, dispatches received frames to the
+        Arctos of their bus and sends queued frames through the transmit
+        scheduler of each bus, so every bus has its own load budget. One timer
+        wheel holds the command deadlines of all the arms. Buses without a
+        file descriptor (e.g. ``virtual``) cannot be waited on: their Arctos
+        reads them from its own notifier thread, blocking in ``recv``.
+
+        A bus whose read fails stops being read when it is closed (see
+        ArctosListener.on_error), else it is read again after error_backoff.
+
+        :param bitrate: Bitrate of the buses in bit/s.
+        :param max_bus_load: Bus load above which queries and LED frames are held back, per bus.
+        :param led_rate: Maximum LED frames per second, per arm.
+        :param error_backoff: Seconds without reading a bus after a read error.
+        """
+        self.bitrate = bitrate
+        self.max_bus_load = max_bus_load
+        self.led_rate = led_rate
+        self.error_backoff = error_backoff
+        self._arms: Dict[str, _ArmEntry] = {}
+        self._selector = selectors.DefaultSelector()
+        self._wakeup_reader, self._wakeup_writer = socket.socketpair()
+        self._wakeup_reader.setblocking(False)
+        self._wakeup_writer.setblocking(False)
+        self._selector.register(self._wakeup_reader, selectors.EVENT_READ, None)
+        # Command deadlines of every arm
+        self.timers = TimerWheel()
+        self.timers.wakeup = self._wakeup
+        self._lock = threading.Lock()
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+
+    def add_arm(self, name: str, bus: can.interface.Bus) -> Arctos:
+        """
+        Create the Arctos of an arm. Its CAN ids are only unique on its own bus.
+
+        :param name: Name of the arm.
+        :param bus: Bus of the arm, not shared with another arm.
+        :return: The arm.
+        """
+        with self._lock:
+            assert name not in self._arms, f'Arm {name} already exists'
+            assert all(entry.bus is not bus for entry in self._arms.values()), 'Bus already used by another arm'
+            tx = TransmitScheduler(bus, bitrate=self.bitrate, max_load=self.max_bus_load)
+            arctos = Arctos(bus, tx=tx, led_rate=self.led_rate, threaded=False, timers=self.timers)
+            tx.wakeup = self._wakeup
+            arctos.led_renderer.wakeup = self._wakeup
+            entry = _ArmEntry(name, arctos)
+            try:
+                self._selector.register(bus.fileno(), selectors.EVENT_READ, entry)
+                entry.selected = True
+            except (NotImplementedError, ValueError, OSError):
+                # Nothing to wait on: block in recv on a thread of its own
+                arctos.start_can_listener()
+            self._arms[name] = entry
+        self._wakeup()
+        return arctos
+
+    def remove_arm(self, name: str) -> None:
+        """
+        Stop serving an arm and shut its bus down.
+        """
+        with self._lock:
+            entry = self._arms.pop(name)
+            if entry.selected:
+                self._selector.unregister(entry.bus.fileno())
+                entry.selected = False
+        entry.arctos.stop_can_listener()
+
+    def arm(self, name: str) -> Arctos:
+        return self._arms[name].arctos
+
+    def __getitem__(self, name: str) -> Arctos:
+        return self.arm(name)
+
+    def arms(self) -> Dict[str, Arctos]:
+        return {name: entry.arctos for name, entry in self._arms.items()}
+
+    def emergency_stop(self) -> None:
+        for entry in list(self._arms.values()):
+            entry.arctos.emergency_stop()
+
+    def start(self) -> 'ArmController':
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True, name='arm controller')
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._running = False
+        self._wakeup()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+        for name in list(self._arms):
+            self.remove_arm(name)
+        self._selector.close()
+        self._wakeup_reader.close()
+        self._wakeup_writer.close()
+
+    def __enter__(self) -> 'ArmController':
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.stop()
+
+    def _wakeup(self) -> None:
+        try:
+            self._wakeup_writer.send(b'\0')
+        except (BlockingIOError, OSError):
+            # Already pending, or closing
+            pass
+
+    def _receive(self, entry: _ArmEntry) -> None:
+        while True:
+            try:
+                message = entry.bus.recv(0)
+            except (can.CanError, OSError) as e:
+                print(f"Error (arm {entry.name}): {e}")
+                self._pause(entry, closed=isinstance(e, CLOSED_BUS_ERRORS))
+                return
+            if message is None:
+                return
+            entry.listener.on_message_received(message)
+
+    def _pause(self, entry: _ArmEntry, closed: bool) -> None:
+        """
+        Stop waiting on a bus whose read failed, so that the loop does not spin on it.
+        Runs on the I/O thread.
+        """
+        with self._lock:
+            if not entry.selected:
+                return
+            self._selector.unregister(entry.bus.fileno())
+            entry.selected = False
+        if closed:
+            print(f"Arm {entry.name}: bus closed, not read anymore")
+            return
+        self.timers.schedule(self.error_backoff, lambda: self._resume(entry))
+
+    def _resume(self, entry: _ArmEntry) -> None:
+        with self._lock:
+            if entry.selected or self._arms.get(entry.name) is not entry:
+                # Removed meanwhile
+                return
+            self._selector.register(entry.bus.fileno(), selectors.EVENT_READ, entry)
+            entry.selected = True
+
+    def _pump(self) -> float:
+        """
+        Send what every bus may send now.
+
+        :return: Seconds until the next held back frame may be sent or the next timer tick.
+        """
+        wait = self.timers.pump()
+        for entry in list(self._arms.values()):
+            arctos = entry.arctos
+            wait = min(wait, arctos.led_renderer.pump(), arctos.tx.pump())
+        return wait
+
+    def _run(self) -> None:
+        wait = 0.0
+        while self._running:
+            events = self._selector.select(None if wait == float('inf') else wait)
+            for key, _ in events:
+                if key.data is None:
+                    try:
+                        self._wakeup_reader.recv(4096)
+                    except BlockingIOError:
+                        pass
+                else:
+                    self._receive(key.data)
+            wait = self._pump()
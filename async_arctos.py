@@ -0,0 +1,181 @@
+import asyncio
+from concurrent.futures import Future
+from typing import List, Optional
+
+import can
+
+from arctos import Arctos
+from base_motor import BaseMotor
+
+
+class MotorCommandError(Exception):
+    def __init__(self, motor: BaseMotor, command: str, status: int) -> None:
+        super().__init__(f"Motor {motor.can_id} {command} failed (status 0x{status:02X})")
+        self.motor = motor
+        self.command = command
+        self.status = status
+
+
+class AsyncMotor:
+    def __init__(self, motor: BaseMotor) -> None:
+        """
+        Awaitable front-end of a motor attached to an Arctos instance.
+
+        Every coroutine completes on the reply of the firmware, not after a
+        fixed delay.
+
+        :param motor: Motor to drive.
+        """
+        self.motor = motor
+
+    def __str__(self):
+        return str(self.motor)
+
+    async def _wait(self, future: Future, timeout: Optional[float], motion: Optional[str] = None) -> List[can.Message]:
+        """
+        :param motion: Name of the motion the future ends, the motor is set to ERROR when it times out
+            (as BaseMotor.start_turn does on the threaded path).
+        """
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            if motion is not None:
+                self.motor.motion_timed_out(motion)
+            raise
+
+    def _check_status(self, command: str, replies: List[can.Message]) -> int:
+        status = replies[-1].data[1]
+        if status == 0x00:
+            raise MotorCommandError(self.motor, command, status)
+        return status
+
+    async def turn(self, degrees: float, speed: int = 1000, acc: int = 200, timeout: Optional[float] = 10) -> int:
+        """
+        Turn the joint by a relative angle.
+
+        :param degrees: Joint angle in degrees.
+        :param speed: Motor speed (0-3000).
+        :param acc: Motor acceleration (0-255).
+        :param timeout: Max time in seconds to wait for the end of the move, None waits forever.
+        :return: Final status, 0x02 when stopped or 0x03 when an endstop was hit.
+        :raises MotorCommandError: The firmware reported a failure.
+        :raises asyncio.TimeoutError: No final status before the timeout, the motor is set to ERROR.
+        """
+        replies = await self._wait(self.motor.start_turn(degrees, speed=speed, acc=acc), timeout, 'turn')
+        return self._check_status('turn', replies)
+
+    async def go_home(self, timeout: Optional[float] = 30) -> int:
+        """
+        Run the homing sequence of the motor, then move to its zero point.
+
+        :param timeout: Max time in seconds to wait for the endstop.
+        :return: Final status, 0x02 when home was found.
+        :raises MotorCommandError: The firmware reported a failure.
+        :raises asyncio.TimeoutError: Home not found before the timeout, the motor is set to ERROR.
+        """
+        replies = await self._wait(self.motor.start_go_home(), timeout, 'home')
+        status = self._check_status('go home', replies)
+        if self.motor.zero_point != 0:
+            await self.turn(self.motor.zero_point, timeout=timeout)
+        return status
+
+    async def set_zero(self, timeout: Optional[float] = 0.5) -> int:
+        """
+        Set the current position as zero.
+
+        :param timeout: Max time in seconds to wait for the reply.
+        :return: Reply status, 0x01 on success.
+        :raises MotorCommandError: The firmware reported a failure.
+        """
+        replies = await self._wait(self.motor.start_set_zero(), timeout)
+        return self._check_status('set zero', replies)
+
+    async def read_encoder(self, timeout: Optional[float] = 0.5) -> can.Message:
+        """
+        Read the encoder of the motor.
+
+        :param timeout: Max time in seconds to wait for the reply.
+        :return: The encoder reply.
+        """
+        replies = await self._wait(self.motor.start_read_encoder(), timeout)
+        return replies[-1]
+
+
+class AsyncArctos:
+    def __init__(self, bus: can.interface.Bus, loop: Optional[asyncio.AbstractEventLoop] = None) -> None:
+        """
+        Asyncio front-end of Arctos.
+
+        Received frames are dispatched in the event loop, and queued frames, LED
+        updates and command deadlines are pumped from it, so no thread is started
+        (on buses with a file descriptor). One loop can drive every axis (and e.g.
+        a gamepad) while commands wait on their replies::
+
+            arm = AsyncArctos(bus)
+            await asyncio.gather(arm.x.turn(90), arm.y.turn(-30))
+
+        :param bus: CAN bus interface for motor communication.
+        :param loop: Event loop to dispatch in, defaults to the running loop.
+        """
+        self._loop = loop or asyncio.get_running_loop()
+        self.arctos = Arctos(bus, loop=self._loop, threaded=False)
+        self._pump_handle: Optional[asyncio.TimerHandle] = None
+        self._closed = False
+        self.arctos.tx.wakeup = self._wakeup
+        self.arctos.led_renderer.wakeup = self._wakeup
+        self.arctos.timers.wakeup = self._wakeup
+        self.arctos.start_can_listener()
+        self._wakeup()
+        self.x = AsyncMotor(self.arctos.x_motor())
+        self.y = AsyncMotor(self.arctos.y_motor())
+        self.z = AsyncMotor(self.arctos.z_motor())
+        self.a = AsyncMotor(self.arctos.a_motor())
+        self.b = AsyncMotor(self.arctos.b_motor())
+        self.c = AsyncMotor(self.arctos.c_motor())
+
+    def __str__(self):
+        return str(self.arctos)
+
+    async def __aenter__(self) -> 'AsyncArctos':
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def motors(self) -> List[AsyncMotor]:
+        return [self.x, self.y, self.z, self.a, self.b, self.c]
+
+    def active_motors(self) -> List[AsyncMotor]:
+        return [motor for motor in self.motors() if motor.motor.is_active]
+
+    async def go_home(self, timeout: Optional[float] = 30) -> List[int]:
+        """
+        Home all active motors at once, except the B/C wrist like Arctos.go_home.
+
+        :param timeout: Max time in seconds to wait for each motor.
+        :return: Final status of each homed motor.
+        """
+        motors = [motor for motor in self.active_motors() if motor not in [self.b, self.c]]
+        return await asyncio.gather(*[motor.go_home(timeout=timeout) for motor in motors])
+
+    def _wakeup(self) -> None:
+        # Called from the loop or from the notifier: pump on the next loop iteration
+        self._loop.call_soon_threadsafe(self._pump)
+
+    def _pump(self) -> None:
+        if self._closed:
+            return
+        if self._pump_handle is not None:
+            self._pump_handle.cancel()
+            self._pump_handle = None
+        arctos = self.arctos
+        wait = min(arctos.timers.pump(), arctos.led_renderer.pump(), arctos.tx.pump())
+        if wait != float('inf'):
+            self._pump_handle = self._loop.call_later(wait, self._pump)
+
+    def close(self) -> None:
+        self._closed = True
+        if self._pump_handle is not None:
+            self._pump_handle.cancel()
+            self._pump_handle = None
+        self.arctos.stop_can_listener()
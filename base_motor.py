@@ -1,11 +1,14 @@
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
 from enum import Enum
 from typing import Optional
 import can
 
 from can_device import CanDevice
-from can_helper import print_motor_message
+from can_helper import print_motor_message, can_send_message_and_wait_response, is_message_trace
 from constants import CMD_READ_ENCODER, CMD_GO_HOME, CMD_SET_ZERO, CMD_SET_ENABLE, CMD_REMAP, CMD_MOTOR_STATUS, \
-    CMD_RELATIVE_TURN, CMD_GET_CURRENT_SPEED, CMD_RUN_MOTOR
+    CMD_RELATIVE_TURN, CMD_GET_CURRENT_SPEED, CMD_RUN_MOTOR, CMD_EMERGENCY_STOP
+from mks_codec import ENCODER_COUNTS, EncoderReply, StatusReply, SpeedReply
 
 
 def limit_speed(speed: int):
@@ -16,6 +19,23 @@ def limit_acc(acc: int):
     # acc in range 0-255
     return acc if acc < 255 else 255
 
+def relative_turn_pulses(degrees: float) -> int:
+    # Relative axis value for a motor shaft rotation, counted like the encoder
+    return round(degrees * ENCODER_COUNTS / 360)
+
+def estimate_turn_duration(rotation: float, speed: int, acc: int) -> float:
+    """
+    Rough duration in seconds of a relative turn.
+
+    :param rotation: Motor shaft rotation in degrees (joint degrees times ratio).
+    :param speed: Motor speed in RPM (0-3000).
+    :param acc: Motor acceleration (0-255).
+    """
+    if speed <= 0:
+        return 0.0
+    ramp = speed * (256 - acc) * 50e-6
+    return abs(rotation) / (speed * 6) + ramp
+
 def make_relative_turn(speed: int, acc: int, degrees: float):
     # speed in range 0-3000
     # acc in range 0-255
@@ -23,7 +43,7 @@ def make_relative_turn(speed: int, acc: int, degrees: float):
     speed = limit_speed(speed)
     acc = limit_acc(acc)
     command = CMD_RELATIVE_TURN
-    degrees_value = round(degrees * 0x3FFF) // 360
+    degrees_value = relative_turn_pulses(degrees)
     data = [command]
     data.extend(list(speed.to_bytes(2, byteorder='big', signed=False)))
     data.extend(list(acc.to_bytes(1, byteorder='big', signed=False)))
@@ -54,9 +74,22 @@ class BaseMotor(CanDevice):
         self.left_limit = left_limit
         self.right_limit = right_limit
         self.position = None
+        # Joint position where the encoder reads 0, known after homing or set zero
+        self.encoder_offset: Optional[float] = None
+        # Last encoder reply: joint degrees (None while encoder_offset is unknown) and time.monotonic() of receipt
+        self.encoder_position: Optional[float] = None
+        self.encoder_time: Optional[float] = None
         self.status = MotorStatus.UNKNOWN
         self.pending_degrees = None
         self.current_speed = None
+        self.message_handlers = {
+            CMD_GO_HOME: self._on_go_home,
+            CMD_RELATIVE_TURN: self._on_relative_turn,
+            CMD_GET_CURRENT_SPEED: self._on_current_speed,
+            CMD_RUN_MOTOR: self._on_run_motor,
+            CMD_SET_ZERO: self._on_set_zero,
+            CMD_READ_ENCODER: self._on_read_encoder,
+        }
 
     def __str__(self):
         return f"Motor {self.can_id} (active={self.is_active}) with position {self.position}, status {self.status} speed {self.current_speed}"
@@ -68,102 +101,179 @@ class BaseMotor(CanDevice):
         return self.status == MotorStatus.OK
 
     def on_can_message(self, message: can.Message):
-        print(f"\tMotor {self.can_id} received message: {message}")
-        command = message.data[0]
+        if is_message_trace():
+            print(f"\tMotor {self.can_id} received message: {message}")
+            print_motor_message(message)
+        self.handle_message(message)
 
-        print_motor_message(message)
+    def _on_go_home(self, reply: StatusReply):
+        status = reply.status
+        if status == 0x01:
+            # Motor started homing
+            self.status = MotorStatus.HOMING
+        elif status == 0x02:
+            # Motor finished homing
+            self.status = MotorStatus.OK
+            self.position = -1 * self.zero_point
+            self.encoder_offset = self.position
+        elif status == 0x00:
+            # Motor failed homing
+            self.status = MotorStatus.ERROR
 
-        if command == CMD_GO_HOME:
-            status = message.data[1]
-            if status == 0x01:
-                # Motor started homing
-                self.status = MotorStatus.HOMING
-            elif status == 0x02:
-                # Motor finished homing
-                self.status = MotorStatus.OK
-                self.position = -1 * self.zero_point
-                self.go_zero()
-            elif status == 0x00:
-                # Motor failed homing
-                self.status = MotorStatus.ERROR
-        elif command == CMD_RELATIVE_TURN:
-            status = message.data[1]
+    def _on_relative_turn(self, reply: StatusReply):
+        status = reply.status
+        if status == 0x01:
+            # Motor started moving
+            self.status = MotorStatus.MOVING
+        elif status == 0x02:
+            # Motor finished moving. Without a pending turn (e.g. a replayed
+            # reply) the position is left to the next encoder read
+            if self.position is not None and self.pending_degrees is not None:
+                self.position += self.pending_degrees
+            self.pending_degrees = None
+            self.status = MotorStatus.OK
+        elif status == 0x03:
+            # Motor found limit
+            if self.pending_degrees is None:
+                pass
+            elif self.pending_degrees > 0:
+                self.position = self.right_limit
+            else:
+                self.position = self.left_limit
+            self.pending_degrees = None
+            self.status = MotorStatus.OK
+        elif status == 0x00:
+            # Motor failed moving
+            self.status = MotorStatus.ERROR
+
+    def _on_current_speed(self, reply: SpeedReply):
+        self.current_speed = reply.speed
+
+    def _on_run_motor(self, reply: StatusReply):
+        status = reply.status
+        if self.status == MotorStatus.OK:
             if status == 0x01:
-                # Motor started moving
                 self.status = MotorStatus.MOVING
-            elif status == 0x02:
-                # Motor finished moving
-                self.position += self.pending_degrees
-                self.pending_degrees = None
-                self.status = MotorStatus.OK
-            elif status == 0x03:
-                # Motor found limit
-                if self.pending_degrees > 0:
-                    self.position = self.right_limit
-                else:
-                    self.position = self.left_limit
-                self.pending_degrees = None
-                self.status = MotorStatus.OK
             elif status == 0x00:
-                # Motor failed moving
+                print(f'Motor {self.can_id} FAILED to start')
                 self.status = MotorStatus.ERROR
-        elif command == CMD_GET_CURRENT_SPEED:
-            speed_bytes = message.data[1:3]
-            self.current_speed = int.from_bytes(speed_bytes, byteorder='big', signed=True)
-        elif command == CMD_RUN_MOTOR:
-            status = message.data[1]
-            if self.status == MotorStatus.OK:
-                if status == 0x01:
-                    self.status = MotorStatus.MOVING
-                elif status == 0x00:
-                    print(f'Motor {self.can_id} FAILED to start')
-                    self.status = MotorStatus.ERROR
-            elif self.status == MotorStatus.MOVING:
-                if status == 0x02:
-                    self.status = MotorStatus.OK
-                elif status == 0x00:
-                    print(f'Motor {self.can_id} FAILED to stop')
-                    self.status = MotorStatus.ERROR
-                elif status == 0x01:
-                    # start to stop the motor
-                    pass
-        elif command == CMD_SET_ZERO:
-            status = message.data[1]
-            if status == 0x01:
-                self.position = 0
+        elif self.status == MotorStatus.MOVING:
+            if status == 0x02:
                 self.status = MotorStatus.OK
             elif status == 0x00:
-                self.position = None
+                print(f'Motor {self.can_id} FAILED to stop')
                 self.status = MotorStatus.ERROR
+            elif status == 0x01:
+                # start to stop the motor
+                pass
+
+    def _on_set_zero(self, reply: StatusReply):
+        status = reply.status
+        if status == 0x01:
+            self.position = 0
+            self.encoder_offset = 0
+            self.status = MotorStatus.OK
+        elif status == 0x00:
+            self.position = None
+            self.encoder_offset = None
+            self.status = MotorStatus.ERROR
+
+    def _on_read_encoder(self, reply: EncoderReply):
+        self.encoder_time = time.monotonic()
+        if self.encoder_offset is None:
+            self.encoder_position = None
+            return
+        self.encoder_position = reply.counts * 360 / ENCODER_COUNTS / self.ratio + self.encoder_offset
+        if self.position is None or (self.status == MotorStatus.OK and self.pending_degrees is None):
+            # Idle, or stopped part way: the encoder replaces the dead-reckoned position
+            self.position = self.encoder_position
 
     def read_encoder(self):
-        msg_read_encoder = self.make_message([CMD_READ_ENCODER])
+        msg_read_encoder = self.messages.request(CMD_READ_ENCODER)
         self.send_message(msg_read_encoder)
 
+    def start_read_encoder(self, timeout: Optional[float] = None) -> Future:
+        return self.send_request(self.messages.request(CMD_READ_ENCODER), timeout)
+
+    def get_position(self, max_age: float = 0.5, timeout: float = 0.5) -> Optional[float]:
+        """
+        Joint position from the encoder, read from the bus only when the cached value is older than max_age.
+
+        Blocks while reading, so it must not be called from the receive path (e.g. a message listener).
+
+        :param max_age: Max age in seconds of the cached encoder position.
+        :param timeout: Max time in seconds to wait for the encoder reply.
+        :return: Joint degrees, None when the encoder zero is unknown (no homing / set zero yet) or on timeout.
+        """
+        if self.encoder_time is not None and time.monotonic() - self.encoder_time <= max_age:
+            return self.encoder_position
+        message = self.messages.request(CMD_READ_ENCODER)
+        if self.requests is not None:
+            future = self.send_request(message)
+            try:
+                future.result(timeout=timeout)
+            except FutureTimeoutError:
+                future.cancel()
+                print(f"Motor {self.can_id}: timeout waiting for the encoder")
+                return None
+        else:
+            # No receive path is running: replies are not dispatched to the motor
+            replies = can_send_message_and_wait_response(self.bus, message, timeout=timeout)
+            if not replies:
+                return None
+            for reply in replies:
+                self.handle_message(reply)
+        return self.encoder_position
+
     def get_current_speed(self):
         self.current_speed = None
-        msg_get_current_speed = self.make_message([CMD_GET_CURRENT_SPEED])
+        msg_get_current_speed = self.messages.request(CMD_GET_CURRENT_SPEED)
         self.send_message(msg_get_current_speed)
 
     def motor_status(self):
-        msg_motor_status = self.make_message([CMD_MOTOR_STATUS])
+        msg_motor_status = self.messages.request(CMD_MOTOR_STATUS)
         self.send_message(msg_motor_status)
 
     def remap(self, enable: bool):
         enable = 1 if enable else 0
-        msg_read_encoder = self.make_message([CMD_REMAP, enable])
+        msg_read_encoder = self.encode(CMD_REMAP, enable)
         self.send_message(msg_read_encoder)
 
     def set_zero(self):
-        msg_motor_set_zero = self.make_message([CMD_SET_ZERO])
+        msg_motor_set_zero = self.encode(CMD_SET_ZERO)
         self.send_message(msg_motor_set_zero)
         self.position = 0
+        self.encoder_offset = 0
+
+    def start_set_zero(self) -> Future:
+        future = self.send_request(self.encode(CMD_SET_ZERO))
+        self.position = 0
+        self.encoder_offset = 0
+        return future
 
     def set_enable(self, enable: bool):
         enable = 1 if enable else 0
-        msg_motor_enable = self.make_message([CMD_SET_ENABLE, enable])
+        msg_motor_enable = self.encode(CMD_SET_ENABLE, enable)
         self.send_message(msg_motor_enable)
 
+    def emergency_stop(self):
+        """
+        Stop the motor without deceleration.
+
+        The motor stops part way through its motion, so the position is cleared and
+        read again from the encoder (when its zero is known).
+        """
+        self.pending_degrees = None
+        self.position = None
+        msg_emergency_stop = self.encode(CMD_EMERGENCY_STOP)
+        self.send_message(msg_emergency_stop)
+        if self.encoder_offset is None:
+            return
+        if self.requests is not None:
+            self.start_read_encoder(timeout=0.5)
+        else:
+            self.get_position(max_age=0)
+
     def go_zero(self, timeout=30):
         if self.zero_point != 0:
             self.make_turn(self.zero_point, speed=1000, acc=200, timeout=timeout)
@@ -171,20 +281,81 @@ class BaseMotor(CanDevice):
     def go_home(self, timeout=30):
         self.status = MotorStatus.UNKNOWN
         self.position = None
-        msg_go_home = self.make_message([CMD_GO_HOME])
+        self.encoder_offset = None
+        msg_go_home = self.encode(CMD_GO_HOME)
         self.send_message(msg_go_home, timeout=timeout)
+        if self.can_wait_for_response and self.status == MotorStatus.OK:
+            # Home found within the timeout, move to the zero point
+            self.go_zero()
 
-    def make_turn(self, degrees: float, speed: int=1000, acc: int=200, timeout: int = 10):
+    def start_go_home(self, timeout: Optional[float] = None) -> Future:
+        """
+        :param timeout: Seconds to find home, after which the future fails and the motor is set to ERROR.
+        """
+        self.status = MotorStatus.UNKNOWN
+        self.position = None
+        self.encoder_offset = None
+        return self._watch(self.send_request(self.encode(CMD_GO_HOME), timeout), 'home')
+
+    def _make_turn_message(self, degrees: float, speed: int, acc: int) -> can.Message:
         assert self.position is not None, 'Position is not set. First call go_home'
 
         if speed > 3000:
             speed = 3000
         if acc > 1000:
             acc = 1000
-        turn = make_relative_turn(speed=speed, acc=acc, degrees=degrees*self.ratio)
-        turn_msg = self.make_message(turn)
+        pulses = relative_turn_pulses(degrees * self.ratio)
+        # Set before sending: the "stopped" ack may arrive before send returns.
+        # The turn the motor makes, rounded to whole counts, so that rounding does not add up
+        self.pending_degrees = pulses * 360 / ENCODER_COUNTS / self.ratio
+        return self.encode(CMD_RELATIVE_TURN, limit_speed(speed), limit_acc(acc), pulses)
+
+    def make_turn(self, degrees: float, speed: int=1000, acc: int=200, timeout: int = 10):
+        turn_msg = self._make_turn_message(degrees, speed, acc)
         self.send_message(turn_msg, timeout=timeout)
-        self.pending_degrees = degrees
+
+    def start_turn(self, degrees: float, speed: int = 1000, acc: int = 200, timeout: Optional[float] = None) -> Future:
+        """
+        :param timeout: Seconds to wait for the "stopped" reply, after which the future
+            fails and the motor is set to ERROR. Twice the estimated duration plus one second by default.
+        """
+        if timeout is None:
+            timeout = 2 * estimate_turn_duration(degrees * self.ratio, limit_speed(speed), limit_acc(acc)) + 1
+        return self._watch(self.send_request(self._make_turn_message(degrees, speed, acc), timeout), 'turn')
+
+    def motion_timed_out(self, what: str) -> None:
+        """
+        The motor did not report the end of a motion in time: its position is unknown.
+        """
+        print(f"Motor {self.can_id}: {what} timed out")
+        self.pending_degrees = None
+        self.status = MotorStatus.ERROR
+
+    def _watch(self, future: Future, what: str) -> Future:
+        """
+        Future completed once the motor state reflects the outcome of future: on a
+        timeout the motor is set to ERROR before any waiter wakes up.
+        """
+        watched = Future()
+
+        def on_done(done: Future) -> None:
+            if done.cancelled():
+                watched.cancel()
+                return
+            exception = done.exception()
+            if isinstance(exception, TimeoutError):
+                self.motion_timed_out(what)
+            if not watched.set_running_or_notify_cancel():
+                return
+            if exception is not None:
+                watched.set_exception(exception)
+            else:
+                watched.set_result(done.result())
+
+        # Cancelling the returned future withdraws the request
+        watched.add_done_callback(lambda f: future.cancel() if f.cancelled() else None)
+        future.add_done_callback(on_done)
+        return watched
 
     def run_in_speed_mode(self, dir: int, speed: int, acc: int):
         print(f'Run motor {self.can_id} in speed mode. Status: {self.status}')
@@ -195,14 +366,32 @@ class BaseMotor(CanDevice):
         direction = 0
         if dir >= 0:
             direction = 1
-        byte3 = speed & 0xFF  # Lower 8 bits of speed
-        byte2 = ((direction & 0x01) << 7) | ((speed >> 8) & 0x0F)  # Highest bit for dir, lower 4 bits for speed
-        msg_run_motor = self.make_message([CMD_RUN_MOTOR, byte2, byte3, acc])
+        # Highest bit for dir, lower 12 bits for speed
+        direction_speed = ((direction & 0x01) << 15) | (speed & 0x0FFF)
+        msg_run_motor = self.encode(CMD_RUN_MOTOR, direction_speed, acc)
+        self.send_message(msg_run_motor)
+
+    def jog_speed(self, speed: int, acc: int) -> bool:
+        """
+        Set the speed mode speed, also while the motor already runs (speed changes and stops).
+
+        :param speed: Signed speed in RPM, 0 stops the motor.
+        :param acc: Acceleration.
+        :return: False when the motor is not ready (unknown position, homing or error).
+        """
+        if self.status not in (MotorStatus.OK, MotorStatus.MOVING):
+            return False
+        direction = 1 if speed >= 0 else 0
+        speed = limit_speed(abs(speed))
+        # Highest bit for dir, lower 12 bits for speed; all zero is a stop
+        direction_speed = ((direction & 0x01) << 15) | (speed & 0x0FFF) if speed else 0
+        msg_run_motor = self.encode(CMD_RUN_MOTOR, direction_speed, limit_acc(acc))
         self.send_message(msg_run_motor)
+        return True
 
     def stop_in_speed_mode(self, acc: int):
         if self.status != MotorStatus.MOVING:
             return
         acc = limit_acc(acc)
-        msg_run_motor = self.make_message([CMD_RUN_MOTOR, 0, 0, acc])
+        msg_run_motor = self.encode(CMD_RUN_MOTOR, 0, acc)
         self.send_message(msg_run_motor)
\ No newline at end of file
@@ -0,0 +1,50 @@
+"""
+Run every benchmark and store the results as JSON.
+
+Run from the repository root::
+
+    python -m benchmarks --output bench.json
+    python -m benchmarks --output bench_new.json --compare bench.json
+"""
+import argparse
+
+from benchmarks import codec, cycle, listener, round_trip, slcan
+from benchmarks.common import write_results, compare_results
+
+SUITES = {
+    'codec': codec.run,
+    'listener': listener.run,
+    'round_trip': round_trip.run,
+    'cycle': cycle.run,
+    'slcan': slcan.run,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Arctos benchmark suite")
+    parser.add_argument("suites", nargs="*", metavar="suite",
+                        help=f"Suites to run, all by default: {', '.join(SUITES)}")
+    parser.add_argument("--output", default="bench_output.json", help="JSON file to write the results to")
+    parser.add_argument("--compare", help="Previous results file to compare with")
+    args = parser.parse_args()
+    unknown = [name for name in args.suites if name not in SUITES]
+    if unknown:
+        parser.error(f"unknown suite(s): {', '.join(unknown)}")
+
+    results = {}
+    for name in args.suites or SUITES:
+        print(f"Running {name}...")
+        suite_results = SUITES[name]()
+        for metric_name, metrics in suite_results.items():
+            summary = ", ".join(f"{key}={value:.1f}" for key, value in metrics.items() if key != 'count')
+            print(f"\t{metric_name}: {summary}")
+        results.update(suite_results)
+
+    write_results(args.output, results)
+    print(f"Results written to {args.output}")
+    if args.compare:
+        compare_results(args.compare, results)
+
+
+if __name__ == "__main__":
+    main()
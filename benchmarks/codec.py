@@ -0,0 +1,33 @@
+"""
+Per frame cost of building, checksumming, decoding and printing motor frames.
+"""
+from typing import Dict
+
+from base_motor import make_relative_turn
+from benchmarks.common import summarize, time_calls, quiet
+from can_helper import calc_checksum, make_message, print_motor_message
+from constants import X_MOTOR_ID, CMD_READ_ENCODER, CMD_RELATIVE_TURN
+from mks_codec import MessagePool, decode_reply, encode_request
+
+
+def run(count: int = 20000) -> Dict[str, Dict]:
+    turn = make_relative_turn(speed=1000, acc=200, degrees=90 * 13.5)
+    encoder_reply = make_message(X_MOTOR_ID, [CMD_READ_ENCODER, 0, 0, 0, 1, 0x12, 0x34])
+    turn_reply = make_message(X_MOTOR_ID, [CMD_RELATIVE_TURN, 0x02])
+    pool = MessagePool(X_MOTOR_ID)
+
+    results = {
+        'calc_checksum': summarize(time_calls(lambda: calc_checksum(X_MOTOR_ID, turn), count)),
+        'make_relative_turn': summarize(time_calls(lambda: make_relative_turn(1000, 200, 1215.0), count)),
+        'make_message': summarize(time_calls(lambda: make_message(X_MOTOR_ID, list(turn)), count)),
+        'encode_request.turn': summarize(
+            time_calls(lambda: encode_request(X_MOTOR_ID, CMD_RELATIVE_TURN, 1000, 200, 55292), count)),
+        'message_pool.turn': summarize(time_calls(lambda: pool.request(CMD_RELATIVE_TURN, 1000, 200, 55292), count)),
+        'decode_reply.encoder': summarize(time_calls(lambda: decode_reply(encoder_reply), count)),
+        'decode_reply.turn': summarize(time_calls(lambda: decode_reply(turn_reply), count)),
+    }
+    with quiet():
+        results['print_motor_message.encoder'] = summarize(
+            time_calls(lambda: print_motor_message(encoder_reply), count))
+        results['print_motor_message.turn'] = summarize(time_calls(lambda: print_motor_message(turn_reply), count))
+    return results
@@ -0,0 +1,84 @@
+import contextlib
+import json
+import os
+import platform
+import subprocess
+import time
+from typing import Callable, Dict, List
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """
+    p50/p99/mean/min/max of durations in seconds, reported in microseconds.
+    """
+    ordered = sorted(samples)
+    count = len(ordered)
+    if count == 0:
+        return {'count': 0}
+    return {
+        'count': count,
+        'mean_us': sum(ordered) / count * 1e6,
+        'p50_us': ordered[count // 2] * 1e6,
+        'p99_us': ordered[min(count - 1, int(count * 0.99))] * 1e6,
+        'min_us': ordered[0] * 1e6,
+        'max_us': ordered[-1] * 1e6,
+    }
+
+
+def time_calls(fn: Callable[[], object], count: int, batch: int = 100) -> List[float]:
+    """
+    Per call durations of fn, measured in batches to hide the timer overhead.
+    """
+    samples = []
+    for _ in range(max(1, count // batch)):
+        start = time.perf_counter()
+        for _ in range(batch):
+            fn()
+        samples.append((time.perf_counter() - start) / batch)
+    return samples
+
+
+@contextlib.contextmanager
+def quiet():
+    """
+    Discard the console printing done on the measured paths.
+    """
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def write_results(path: str, results: Dict) -> None:
+    document = {
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'results': results,
+    }
+    with open(path, 'w') as f:
+        json.dump(document, f, indent=2)
+
+
+def compare_results(previous_path: str, results: Dict) -> None:
+    """
+    Print the relative change of every metric against a previous results file.
+    """
+    with open(previous_path) as f:
+        previous = json.load(f)
+    print(f"Compared to {previous.get('revision', '?')}:")
+    for name, metrics in results.items():
+        old_metrics = previous['results'].get(name, {})
+        for metric, value in metrics.items():
+            old = old_metrics.get(metric)
+            if metric in ('count', 'min_us', 'max_us') or not isinstance(old, (int, float)) or old == 0:
+                continue
+            change = (value - old) / old * 100
+            print(f"\t{name}.{metric}: {old:.1f} -> {value:.1f} ({change:+.1f}%)")
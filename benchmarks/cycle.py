@@ -0,0 +1,38 @@
+"""
+Full six axis homing and move cycle against the simulator.
+"""
+import time
+from concurrent.futures import wait
+from typing import Dict
+
+import can
+
+from arctos import Arctos
+from benchmarks.common import summarize, quiet
+from simulator import ArctosSimulator
+
+
+def run(cycles: int = 5, time_scale: float = 0.01, channel: str = 'arctos_bench_cycle') -> Dict[str, Dict]:
+    simulator_bus = can.Bus(interface='virtual', channel=channel)
+    simulator = ArctosSimulator(simulator_bus, time_scale=time_scale, home_duration=0.5).start()
+    homing = []
+    moves = []
+    with quiet():
+        arctos = Arctos(can.Bus(interface='virtual', channel=channel))
+        motors = arctos.get_active_motors()
+        for _ in range(cycles):
+            start = time.perf_counter()
+            wait([motor.start_go_home() for motor in motors], timeout=10)
+            homing.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            arctos.move_joints({'x': 90, 'y': 30, 'z': -30, 'a': 45, 'b': 20, 'c': -20})
+            arctos.move_joints({'x': -90, 'y': -30, 'z': 30, 'a': -45, 'b': -20, 'c': 20})
+            moves.append(time.perf_counter() - start)
+        arctos.stop_can_listener()
+    simulator.stop()
+    simulator_bus.shutdown()
+    return {
+        'six_axis_homing': summarize(homing),
+        'six_axis_move_pair': summarize(moves),
+    }
@@ -0,0 +1,98 @@
+"""
+Benchmark of the Arctos receive path on the python-can ``virtual`` interface.
+
+Run from the repository root::
+
+    python -m benchmarks.listener --frames 5000
+"""
+import argparse
+import threading
+import time
+from typing import Dict
+
+import can
+
+from arctos import Arctos
+from benchmarks.common import summarize, quiet
+from can_helper import make_message
+from constants import X_MOTOR_ID, CMD_GET_CURRENT_SPEED
+
+
+class TimedArctos(Arctos):
+    def __init__(self, bus: can.interface.Bus, expected: int) -> None:
+        self.dispatched_at = []
+        self.expected = expected
+        self.done = threading.Event()
+        self.received = threading.Event()
+        super().__init__(bus)
+
+    def on_new_can_message(self, message: can.Message):
+        super().on_new_can_message(message)
+        self.dispatched_at.append(time.perf_counter())
+        self.received.set()
+        if len(self.dispatched_at) >= self.expected:
+            self.done.set()
+
+
+def speed_reply() -> can.Message:
+    return make_message(X_MOTOR_ID, [CMD_GET_CURRENT_SPEED, 0x00, 0x10])
+
+
+def measure_latency(sender: can.interface.Bus, arctos: TimedArctos, samples: int):
+    latencies = []
+    for _ in range(samples):
+        arctos.received.clear()
+        count = len(arctos.dispatched_at)
+        sent_at = time.perf_counter()
+        sender.send(speed_reply())
+        arctos.received.wait(timeout=1)
+        latencies.append(arctos.dispatched_at[count] - sent_at)
+    return latencies
+
+
+def measure_throughput(sender: can.interface.Bus, arctos: TimedArctos, frames: int):
+    arctos.dispatched_at.clear()
+    arctos.expected = frames
+    arctos.done.clear()
+    message = speed_reply()
+    start = time.perf_counter()
+    for _ in range(frames):
+        sender.send(message)
+    arctos.done.wait(timeout=60)
+    return len(arctos.dispatched_at) / (arctos.dispatched_at[-1] - start)
+
+
+def run(frames: int = 5000, samples: int = 500, channel: str = "arctos_bench") -> Dict[str, Dict]:
+    sender = can.Bus(interface="virtual", channel=channel, receive_own_messages=False)
+    receiver = can.Bus(interface="virtual", channel=channel, receive_own_messages=False)
+
+    # Console printing of every frame is part of the dispatch path but would
+    # dominate the numbers, so it is discarded here.
+    with quiet():
+        arctos = TimedArctos(receiver, expected=samples)
+        latencies = measure_latency(sender, arctos, samples)
+        frames_per_second = measure_throughput(sender, arctos, frames)
+        arctos.stop_can_listener()
+    sender.shutdown()
+    return {
+        'listener_dispatch_latency': summarize(latencies),
+        'listener_throughput': {'frames_per_second': frames_per_second, 'count': frames},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Arctos frame dispatch")
+    parser.add_argument("--frames", type=int, default=5000, help="Frames sent for the throughput run")
+    parser.add_argument("--samples", type=int, default=500, help="Frames sent one by one for the latency run")
+    parser.add_argument("--channel", default="arctos_bench", help="Virtual bus channel name")
+    args = parser.parse_args()
+
+    results = run(args.frames, args.samples, args.channel)
+    latency = results['listener_dispatch_latency']
+    print(f"Dispatch latency over {latency['count']} frames:")
+    print(f"\tmean={latency['mean_us']:.1f} us, p50={latency['p50_us']:.1f} us, p99={latency['p99_us']:.1f} us")
+    print(f"Sustained dispatch: {results['listener_throughput']['frames_per_second']:.0f} frames/s over {args.frames} frames")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+Command to final reply latency through Arctos and the simulator.
+"""
+import time
+from typing import Dict
+
+import can
+
+from arctos import Arctos
+from benchmarks.common import summarize, quiet
+from simulator import ArctosSimulator
+
+
+def run(samples: int = 500, channel: str = 'arctos_bench_round_trip') -> Dict[str, Dict]:
+    simulator_bus = can.Bus(interface='virtual', channel=channel)
+    simulator = ArctosSimulator(simulator_bus, ack_delay=0).start()
+    with quiet():
+        arctos = Arctos(can.Bus(interface='virtual', channel=channel))
+        motor = arctos.x_motor()
+        motor.set_zero()
+
+        encoder = []
+        for _ in range(samples):
+            start = time.perf_counter()
+            motor.start_read_encoder().result(timeout=1)
+            encoder.append(time.perf_counter() - start)
+
+        speed = []
+        for _ in range(samples):
+            start = time.perf_counter()
+            motor.send_request(motor.make_message([0x32])).result(timeout=1)
+            speed.append(time.perf_counter() - start)
+
+        # Six requests in flight at once, one per motor
+        burst = []
+        motors = list(arctos.get_active_motors())
+        for _ in range(samples // len(motors)):
+            start = time.perf_counter()
+            futures = [m.start_read_encoder() for m in motors]
+            for future in futures:
+                future.result(timeout=1)
+            burst.append(time.perf_counter() - start)
+        arctos.stop_can_listener()
+    simulator.stop()
+    simulator_bus.shutdown()
+    return {
+        'read_encoder_round_trip': summarize(encoder),
+        'get_current_speed_round_trip': summarize(speed),
+        'read_encoder_six_axes': summarize(burst),
+    }
@@ -0,0 +1,121 @@
+"""
+Burst throughput of the slcan transports against a fake adapter on a pty.
+
+The fake adapter acks every frame like an slcan adapter and answers each
+motor command with a status reply, so a burst of six motion frames costs six
+frames out and twelve lines back. Run alone with::
+
+    python -m benchmarks.slcan
+"""
+import os
+import threading
+import time
+import tty
+from typing import Dict
+
+import can
+from can.interfaces.slcan import slcanBus
+
+from constants import CMD_RELATIVE_TURN, X_MOTOR_ID, C_MOTOR_ID
+from mks_codec import encode_reply, encode_request
+from slcan_batched import BatchedSlcanBus, encode_frame, parse_frame
+
+
+class FakeSlcanAdapter:
+    def __init__(self) -> None:
+        """
+        slcan adapter on the master side of a pty. Open ``port`` as the channel.
+        """
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._slave)
+        self.port = os.ttyname(self._slave)
+        # Serial reads of the adapter, i.e. how many writes the bus needed
+        self.reads = 0
+        self.frames = 0
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True, name='fake slcan')
+        self._thread.start()
+
+    def _answer(self, line: bytes) -> bytes:
+        if not line or line[0] not in b'tT':
+            # Configuration commands (C, O, S6...)
+            return b'\r'
+        self.frames += 1
+        message = parse_frame(line, 0.0)
+        if message is None or not X_MOTOR_ID <= message.arbitration_id <= C_MOTOR_ID or not message.data:
+            return b'z\r'
+        reply = encode_reply(message.arbitration_id, message.data[0], 0x01)
+        return b'z\r' + encode_frame(reply)
+
+    def _run(self) -> None:
+        buffer = b''
+        while self._running:
+            try:
+                data = os.read(self._master, 4096)
+            except OSError:
+                return
+            self.reads += 1
+            buffer += data
+            *lines, buffer = buffer.split(b'\r')
+            answer = b''.join(self._answer(line) for line in lines)
+            if answer:
+                try:
+                    os.write(self._master, answer)
+                except OSError:
+                    return
+
+    def close(self) -> None:
+        self._running = False
+        # Closing the slave side ends the blocking read of the thread (EIO) before the master is closed
+        os.close(self._slave)
+        self._thread.join(timeout=1)
+        os.close(self._master)
+
+
+def _burst_throughput(bus_class, bursts: int) -> Dict[str, float]:
+    adapter = FakeSlcanAdapter()
+    bus = bus_class(adapter.port, bitrate=500000, sleep_after_open=0)
+    motion = [encode_request(can_id, CMD_RELATIVE_TURN, 1000, 200, 1600) for can_id in range(X_MOTOR_ID, C_MOTOR_ID + 1)]
+    batch = getattr(bus, 'batch', None)
+    reads_before = adapter.reads
+    start = time.perf_counter()
+    for _ in range(bursts):
+        if batch is not None:
+            with batch():
+                for message in motion:
+                    bus.send(message)
+        else:
+            for message in motion:
+                bus.send(message)
+        replies = 0
+        while replies < len(motion):
+            message = bus.recv(timeout=1)
+            if message is None:
+                raise can.CanOperationError('Fake adapter did not answer')
+            replies += 1
+    elapsed = time.perf_counter() - start
+    writes = adapter.reads - reads_before
+    bus.shutdown()
+    adapter.close()
+    frames = bursts * len(motion) * 2
+    return {
+        'frames_per_second': frames / elapsed,
+        'burst_us': elapsed / bursts * 1e6,
+        'serial_writes_per_burst': writes / bursts,
+    }
+
+
+def run(bursts: int = 300) -> Dict[str, Dict]:
+    return {
+        'slcan_burst': _burst_throughput(slcanBus, bursts),
+        'slcan_batched_burst': _burst_throughput(BatchedSlcanBus, bursts),
+    }
+
+
+def main():
+    for name, metrics in run().items():
+        print(f"{name}: " + ", ".join(f"{key}={value:.1f}" for key, value in metrics.items()))
+
+
+if __name__ == '__main__':
+    main()
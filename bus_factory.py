@@ -0,0 +1,116 @@
+import argparse
+import json
+from dataclasses import dataclass, field, asdict
+from typing import Dict, List, Optional, Sequence
+
+import can
+
+from constants import X_MOTOR_ID, Y_MOTOR_ID, Z_MOTOR_ID, A_MOTOR_ID, B_MOTOR_ID, C_MOTOR_ID, GRIPPER_ID, LED_ID
+from slcan_batched import BatchedSlcanBus
+
+# CAN ids of the motors, the gripper and the LED board of one arm
+ARCTOS_DEVICE_IDS = (X_MOTOR_ID, Y_MOTOR_ID, Z_MOTOR_ID, A_MOTOR_ID, B_MOTOR_ID, C_MOTOR_ID, GRIPPER_ID, LED_ID)
+
+# Interfaces where python-can installs the filters in the kernel (elsewhere they are applied in Python)
+KERNEL_FILTER_INTERFACES = {'socketcan'}
+
+_STANDARD_ID_MASK = 0x7FF
+
+
+@dataclass
+class BusConfig:
+    interface: str = 'slcan'
+    channel: str = '/dev/ttyACM0'
+    bitrate: int = 500000
+    # Only frames from these ids are received, empty to receive everything
+    device_ids: Sequence[int] = field(default_factory=lambda: list(ARCTOS_DEVICE_IDS))
+    # Use can.ThreadSafeBus, for several threads sending on a bus without an Arctos transmit scheduler
+    thread_safe: bool = False
+    # slcan only: coalesce serial writes and parse reads in bulk (slcan_batched.BatchedSlcanBus)
+    batched: bool = False
+
+    @classmethod
+    def from_dict(cls, values: Dict) -> 'BusConfig':
+        unknown = set(values) - set(cls.__dataclass_fields__)
+        if unknown:
+            raise ValueError(f"Unknown bus config keys: {', '.join(sorted(unknown))}")
+        return cls(**values)
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+def load_bus_config(path: str) -> BusConfig:
+    """
+    Read a bus config from a JSON file, e.g. {"interface": "socketcan", "channel": "can0"}.
+    """
+    with open(path) as f:
+        return BusConfig.from_dict(json.load(f))
+
+
+def acceptance_filters(device_ids: Sequence[int]) -> List[Dict]:
+    """
+    python-can filters accepting exactly the standard frames of the given ids.
+
+    Runs of ids are merged into aligned power of two blocks, so ids 1-8 need
+    4 filters (1, 2-3, 4-7, 8) instead of 8.
+    """
+    filters = []
+    ids = sorted(set(device_ids))
+    index = 0
+    while index < len(ids):
+        can_id = ids[index]
+        size = 1
+        # Grow the block while it stays aligned and every id in it is requested
+        while can_id % (size * 2) == 0 and ids[index:index + size * 2] == list(range(can_id, can_id + size * 2)):
+            size *= 2
+        filters.append({'can_id': can_id, 'can_mask': _STANDARD_ID_MASK & ~(size - 1), 'extended': False})
+        index += size
+    return filters
+
+
+def create_bus(config: Optional[BusConfig] = None) -> can.interface.Bus:
+    """
+    Open the bus described by a config. On socketcan the acceptance filters
+    run in the kernel, so frames of other nodes never wake the process.
+
+    :param config: Bus config, the default is slcan on /dev/ttyACM0.
+    :return: The bus.
+    """
+    if config is None:
+        config = BusConfig()
+    kwargs = {'interface': config.interface, 'channel': config.channel}
+    if config.interface == 'slcan':
+        kwargs['bitrate'] = config.bitrate
+    if config.device_ids:
+        kwargs['can_filters'] = acceptance_filters(config.device_ids)
+    if config.batched:
+        assert config.interface == 'slcan', 'Only slcan buses can be batched'
+        assert not config.thread_safe, 'BatchedSlcanBus locks its writes itself'
+        del kwargs['interface']
+        return BatchedSlcanBus(**kwargs)
+    if config.thread_safe:
+        return can.ThreadSafeBus(**kwargs)
+    return can.Bus(**kwargs)
+
+
+def add_bus_arguments(parser: argparse.ArgumentParser) -> None:
+    """
+    Add the bus options (--interface, --channel, --bitrate, --bus-config) to a command line parser.
+    """
+    defaults = BusConfig()
+    parser.add_argument('--bus-config', help='JSON file with the bus config, overridden by the options below')
+    parser.add_argument('--interface', help=f'python-can interface: socketcan, slcan or virtual (default {defaults.interface})')
+    parser.add_argument('--channel', help=f'Channel, e.g. can0, vcan0 or /dev/ttyACM0 (default {defaults.channel})')
+    parser.add_argument('--bitrate', type=int, help=f'Bitrate of slcan adapters (default {defaults.bitrate})')
+    parser.add_argument('--batched', action='store_true', default=None,
+                        help='Coalesce slcan serial writes and parse reads in bulk')
+
+
+def bus_config_from_args(args: argparse.Namespace) -> BusConfig:
+    config = load_bus_config(args.bus_config) if args.bus_config else BusConfig()
+    for name in ('interface', 'channel', 'bitrate', 'batched'):
+        value = getattr(args, name)
+        if value is not None:
+            setattr(config, name, value)
+    return config
@@ -1,7 +1,12 @@
 from abc import abstractmethod, ABC
+from concurrent.futures import Future
+from typing import Optional
+
 import can
 
-from can_helper import calc_checksum, can_send_message_and_wait_response, can_send_message
+from can_helper import calc_checksum, can_send_message_and_wait_response, can_send_message, can_send_request
+from can_requests import PendingRequests
+from mks_codec import ChecksumError, MessagePool, decode_reply, encode_request
 
 
 class CanDevice(ABC):
@@ -10,16 +15,70 @@ class CanDevice(ABC):
         self.bus = bus
         self.is_active = True
         self.can_wait_for_response = True
+        # Opcode (first data byte) -> handler called with the received message
+        self.message_handlers = {}
+        # Set when another component (e.g. Arctos) owns the receive path of the bus
+        self.requests: Optional[PendingRequests] = None
+        # Set when frames go through a shared priority queue (tx_scheduler.TransmitScheduler)
+        self.tx = None
+        # Reusable frames for commands sent synchronously
+        self.messages = MessagePool(can_id)
 
     def make_message(self, data) -> can.Message:
         data.append(calc_checksum(self.can_id, data))
         return can.Message(arbitration_id=self.can_id, data=data, is_extended_id=False)
 
+    def encode(self, opcode: int, *values: int) -> can.Message:
+        return encode_request(self.can_id, opcode, *values)
+
+    @property
+    def tx_bus(self):
+        """
+        Where frames are sent: the transmit scheduler when there is one, else the bus.
+        """
+        return self.tx if self.tx is not None else self.bus
+
     def send_message(self, message: can.Message, timeout=0.5):
         if self.can_wait_for_response:
-            can_send_message_and_wait_response(self.bus, message, timeout=timeout)
+            # Without a pending request table the replies are read from the bus itself
+            bus = self.tx_bus if self.requests is not None else self.bus
+            replies = can_send_message_and_wait_response(bus, message, timeout=timeout, requests=self.requests)
+            if self.requests is None:
+                # No receive path is running: replies are not dispatched to the device
+                for reply in replies:
+                    self.handle_message(reply)
         else:
-            can_send_message(self.bus, message)
+            can_send_message(self.tx_bus, message)
+
+    def send_request(self, message: can.Message, timeout: Optional[float] = None) -> Future:
+        """
+        Send a command without blocking.
+
+        :param message: Command to send.
+        :param timeout: Seconds until the future fails with TimeoutError (see PendingRequests).
+        :return: Future resolved with the replies once the final one is received.
+        """
+        assert self.requests is not None, 'No receive path for replies. Attach the device to Arctos first'
+        return can_send_request(self.tx_bus, message, self.requests, timeout)
+
+    def handle_message(self, message: can.Message) -> bool:
+        """
+        Decode a reply and pass the record to the handler of its opcode.
+
+        :return: True when a handler was called.
+        """
+        handler = self.message_handlers.get(message.data[0]) if message.data else None
+        if handler is None:
+            return False
+        try:
+            reply = decode_reply(message)
+        except ChecksumError as e:
+            print(f"Error: {e}")
+            return False
+        if reply is None:
+            return False
+        handler(reply)
+        return True
 
     @abstractmethod
     def on_can_message(self, message: can.Message):
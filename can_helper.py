@@ -1,148 +1,172 @@
 import can
 import time
-from typing import List
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Callable, Dict, List, Optional
 
+from can_requests import PendingRequests
 from constants import CMD_READ_ENCODER, CMD_GO_HOME, CMD_SET_ENABLE, CMD_REMAP, CMD_RELATIVE_TURN, CMD_GET_CURRENT_SPEED
+from mks_codec import ChecksumError, EncoderReply, SpeedReply, StatusReply, decode_reply
+
+# Console trace of every sent and received frame. Turn it off when traffic is
+# recorded (can_recorder.CanRecorder) or the rate is too high for the console.
+_message_trace = True
+
+
+def set_message_trace(enabled: bool) -> None:
+    global _message_trace
+    _message_trace = enabled
+
+
+def is_message_trace() -> bool:
+    return _message_trace
 
 
 def can_send_message(bus: can.interface.Bus, message: can.Message) -> None:
     bus.send(message)
+    if not _message_trace:
+        return
     data_bytes = ", ".join([f"0x{byte:02X}" for byte in message.data])
     print(
         f"Message sent (can_send_message): arbitration_id=0x{message.arbitration_id:X}, data=[{data_bytes}], is_extended_id=False"
     )
 
 
-def can_send_message_and_wait_response(bus: can.interface.Bus, message: can.Message, timeout = 0.5) -> List:
-    received_responses = []
+def can_send_request(bus: can.interface.Bus,
+                     message: can.Message,
+                     requests: PendingRequests,
+                     timeout: Optional[float] = None) -> Future:
+    """
+    Send a command and return a future resolved with its replies.
+
+    :param bus: CAN bus to send the command on.
+    :param message: Command to send.
+    :param requests: Pending request table fed by the receive path of the bus.
+    :param timeout: Seconds until the future fails with TimeoutError, when the table has a timer wheel.
+    :return: Future resolved with the list of replies for the command.
+    """
+    future = requests.add(message.arbitration_id, message.data[0], timeout, message)
+    try:
+        can_send_message(bus, message)
+    except Exception:
+        future.cancel()
+        raise
+    return future
 
-    command = message.data[0]
-    bus.send(message)
-    data_bytes = ", ".join([f"0x{byte:02X}" for byte in message.data])
-    print(
-        f"Message sent (can_send_message_and_wait_response): arbitration_id=0x{message.arbitration_id:X}, data=[{data_bytes}], is_extended_id=False"
-    )
 
+def can_send_message_and_wait_response(bus: can.interface.Bus,
+                                       message: can.Message,
+                                       timeout=0.5,
+                                       requests: Optional[PendingRequests] = None) -> List:
+    """
+    Send a command and block until its final reply or the timeout.
+
+    :param bus: CAN bus to send the command on.
+    :param message: Command to send.
+    :param timeout: Max time in seconds to wait for the final reply.
+    :param requests: Pending request table fed by a running receive path (e.g. Arctos).
+        Without it the bus is read here until the reply arrives, so nothing else
+        may read the bus at the same time.
+    :return: Replies received for the command.
+    """
     if timeout == 0:
-        return received_responses
+        can_send_message(bus, message)
+        return []
+
+    if requests is not None:
+        future = can_send_request(bus, message, requests, timeout)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            print("Timeout waiting for responses.")
+            return []
 
-    start_time = time.time()
-    while True:
-        received_msg = bus.recv(timeout=min(timeout, 1))
-        if received_msg is not None:
+    # No receive path is running: read the bus until our reply arrives
+    requests = PendingRequests()
+    future = can_send_request(bus, message, requests)
+    deadline = time.monotonic() + timeout
+    while not future.done():
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            future.cancel()
+            print("Timeout waiting for responses.")
+            return []
+        received_msg = bus.recv(timeout=min(remaining, 1))
+        if received_msg is None:
+            continue
+        if _message_trace:
             received_data_bytes = ", ".join(
                 [f"0x{byte:02X}" for byte in received_msg.data]
             )
             print(
                 f"Received: arbitration_id=0x{received_msg.arbitration_id:X}, data=[{received_data_bytes}], is_extended_id=False"
             )
-            received_responses.append(received_msg)
-            if message.arbitration_id == received_msg.arbitration_id:
-                if received_msg.data[0] == message.data[0]:
-                    if command == CMD_READ_ENCODER:
-                        carry_bytes = received_msg.data[1:5]
-                        carry = int.from_bytes(carry_bytes, byteorder='big', signed=True)
-                        rot = carry
-                        value_bytes = received_msg.data[5:7]
-                        value = int.from_bytes(value_bytes, byteorder='big', signed=False)
-                        max_value = 0x3FFF
-                        degrees = 360 * (value / max_value)
-                        print(f'Got encoder value: carry={carry}, value={value} -> degrees: {degrees}, rotation: {rot}')
-                        break
-                    if command == CMD_GO_HOME:
-                        status = received_msg.data[1]
-                        if status == 0x01:
-                            print('Home started')
-                        elif status == 0x02:
-                            print('Home found')
-                            break
-                        elif status == 0x00:
-                            print('Home failed')
-                            break
-                    if command == CMD_SET_ENABLE:
-                        status = received_msg.data[1]
-                        if status == 0x01:
-                            print('Enable success')
-                        elif status == 0x00:
-                            print('Enable failed')
-                            break
-                    if command == CMD_REMAP:
-                        status = received_msg.data[1]
-                        if status == 0x01:
-                            print('Remap success')
-                        elif status == 0x00:
-                            print('Remap failed')
-                            break
-                    if command == CMD_RELATIVE_TURN:
-                        status = received_msg.data[1]
-                        if status == 0x01:
-                            print('Motor started')
-                        elif status == 0x02:
-                            print('Motor stopped')
-                            break
-                        elif status == 0x00:
-                            print('Motor failed')
-                            break
-                        elif status == 0x03:
-                            print('Motor found endstop')
-                            break
-                else:
-                    print('Got response for another message')
+            if received_msg.arbitration_id == message.arbitration_id:
+                print_motor_message(received_msg)
             else:
                 print('Got message from another device')
+        requests.on_message_received(received_msg)
 
-        if time.time() - start_time > timeout:
-            print("Timeout waiting for responses.")
-            break
+    if _message_trace:
+        print('')
+    return future.result()
+
+
+def _print_encoder(reply: EncoderReply) -> None:
+    degrees = 360 * (reply.value / ENCODER_COUNTS)
+    print(f'Got encoder value: carry={reply.carry}, value={reply.value} -> degrees: {degrees}, rotation: {reply.carry}')
+
+
+def _print_current_speed(reply: SpeedReply) -> None:
+    print(f'Got current speed: {reply.speed}')
+
+
+def _status_printer(statuses: Dict[int, str]) -> Callable[[StatusReply], None]:
+    def print_status(reply: StatusReply) -> None:
+        text = statuses.get(reply.status)
+        if text:
+            print(text)
+    return print_status
+
+
+# Opcode -> function printing a human readable form of a decoded motor reply
+_motor_message_printers = {
+    CMD_READ_ENCODER: _print_encoder,
+    CMD_GO_HOME: _status_printer({0x01: 'Home started', 0x02: 'Home found', 0x00: 'Home failed'}),
+    CMD_SET_ENABLE: _status_printer({0x01: 'Enable success', 0x00: 'Enable failed'}),
+    CMD_REMAP: _status_printer({0x01: 'Remap success', 0x00: 'Remap failed'}),
+    CMD_RELATIVE_TURN: _status_printer({
+        0x01: 'Motor started',
+        0x02: 'Motor stopped',
+        0x00: 'Motor failed',
+        0x03: 'Motor found endstop',
+    }),
+    CMD_GET_CURRENT_SPEED: _print_current_speed,
+}
 
-    print('')
-    return received_responses
 
 def print_motor_message(message: can.Message) -> None:
-    command = message.data[0]
-    if command == CMD_READ_ENCODER:
-        carry_bytes = message.data[1:5]
-        carry = int.from_bytes(carry_bytes, byteorder='big', signed=True)
-        rot = carry
-        value_bytes = message.data[5:7]
-        value = int.from_bytes(value_bytes, byteorder='big', signed=False)
-        max_value = 0x3FFF
-        degrees = 360 * (value / max_value)
-        print(f'Got encoder value: carry={carry}, value={value} -> degrees: {degrees}, rotation: {rot}')
-    if command == CMD_GO_HOME:
-        status = message.data[1]
-        if status == 0x01:
-            print('Home started')
-        elif status == 0x02:
-            print('Home found')
-        elif status == 0x00:
-            print('Home failed')
-    if command == CMD_SET_ENABLE:
-        status = message.data[1]
-        if status == 0x01:
-            print('Enable success')
-        elif status == 0x00:
-            print('Enable failed')
-    if command == CMD_REMAP:
-        status = message.data[1]
-        if status == 0x01:
-            print('Remap success')
-        elif status == 0x00:
-            print('Remap failed')
-    if command == CMD_RELATIVE_TURN:
-        status = message.data[1]
-        if status == 0x01:
-            print('Motor started')
-        elif status == 0x02:
-            print('Motor stopped')
-        elif status == 0x00:
-            print('Motor failed')
-        elif status == 0x03:
-            print('Motor found endstop')
-    if command == CMD_GET_CURRENT_SPEED:
-        speed_bytes = message.data[1:2]
-        current_speed = int.from_bytes(speed_bytes, byteorder='big', signed=True)
-        print(f'Got current speed: {current_speed}')
+    printer = _motor_message_printers.get(message.data[0]) if message.data else None
+    if printer is None:
+        return
+    try:
+        reply = decode_reply(message)
+    except ChecksumError as e:
+        print(f'Error: {e}')
+        return
+    if reply is not None:
+        printer(reply)
+
+
+def frame_bits(dlc: int, is_extended_id: bool = False) -> int:
+    """
+    Worst case number of bits on the wire for a data frame, stuff bits and interframe space included.
+    """
+    if is_extended_id:
+        stuffed = 54 + 8 * dlc
+        return stuffed + (stuffed - 1) // 4 + 13
+    stuffed = 34 + 8 * dlc
+    return stuffed + (stuffed - 1) // 4 + 13
 
 
 def calc_checksum(can_id, data) -> int:
@@ -0,0 +1,189 @@
+"""
+Binary recording of the CAN traffic of an arm.
+
+Every frame is one fixed-size record appended to a memory-mapped file, so
+recording costs two ``struct.pack_into`` calls per frame and can stay on
+while the arm runs. Files are rotated after ``max_records`` records and only
+the newest ``max_files`` files are kept.
+
+File layout (little endian)::
+
+    header: magic (8s) version (H) record size (H) reserved (I) record count (Q)
+    record: timestamp (d) arbitration id (I) dlc (B) direction (B) flags (B) pad (x) data (8s)
+"""
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+from typing import Iterator, List, Optional
+
+import can
+
+MAGIC = b'ARCTOSCN'
+VERSION = 1
+HEADER = struct.Struct('<8sHHIQ')
+RECORD = struct.Struct('<dIBBBx8s')
+# Offset of the record count in the header
+_COUNT_OFFSET = HEADER.size - 8
+
+DIRECTION_RX = 0
+DIRECTION_TX = 1
+
+FLAG_EXTENDED_ID = 0x01
+
+LOG_SUFFIX = '.canlog'
+
+
+def log_files(directory: str, prefix: str = 'arctos') -> List[str]:
+    """
+    Paths of the log files of a recording, oldest first.
+    """
+    pattern = re.compile(re.escape(prefix) + r'-(\d+)' + re.escape(LOG_SUFFIX) + '$')
+    indexed = []
+    for name in os.listdir(directory):
+        match = pattern.match(name)
+        if match:
+            indexed.append((int(match.group(1)), os.path.join(directory, name)))
+    return [path for _, path in sorted(indexed)]
+
+
+def read_header(data) -> int:
+    """
+    Check the header of a log file.
+
+    :param data: File content (bytes, mmap...).
+    :return: Number of records in the file.
+    """
+    magic, version, record_size, _, count = HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION or record_size != RECORD.size:
+        raise ValueError('Not an Arctos CAN log')
+    return count
+
+
+def read_log(path: str) -> Iterator[can.Message]:
+    """
+    Frames of a log file in recording order. ``is_rx`` tells the direction.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    count = read_header(data)
+    for timestamp, arbitration_id, dlc, direction, flags, payload in RECORD.iter_unpack(
+            memoryview(data)[HEADER.size:HEADER.size + count * RECORD.size]):
+        yield can.Message(timestamp=timestamp,
+                          arbitration_id=arbitration_id,
+                          is_extended_id=bool(flags & FLAG_EXTENDED_ID),
+                          is_rx=direction == DIRECTION_RX,
+                          dlc=dlc,
+                          data=payload[:dlc])
+
+
+class CanRecorder:
+    def __init__(self,
+                 directory: str,
+                 prefix: str = 'arctos',
+                 max_records: int = 1 << 20,
+                 max_files: int = 8) -> None:
+        """
+        Append-only recorder of sent and received frames.
+
+        :param directory: Directory of the log files, created if missing.
+        :param prefix: File name prefix, files are named <prefix>-<index>.canlog.
+        :param max_records: Records per file before rotating.
+        :param max_files: Number of files kept, the oldest are deleted.
+        """
+        assert max_records > 0, 'A file must hold at least one record'
+        assert max_files > 0, 'At least one file must be kept'
+        self.directory = directory
+        self.prefix = prefix
+        self.max_records = max_records
+        self.max_files = max_files
+        os.makedirs(directory, exist_ok=True)
+        existing = log_files(directory, prefix)
+        # Never overwrite a previous recording
+        self._index = self._file_index(existing[-1]) + 1 if existing else 0
+        self._lock = threading.Lock()
+        self._file = None
+        self._map: Optional[mmap.mmap] = None
+        self._count = 0
+        self.path: Optional[str] = None
+        self._attached = []
+        self._open_next()
+
+    def _file_index(self, path: str) -> int:
+        return int(os.path.basename(path)[len(self.prefix) + 1:-len(LOG_SUFFIX)])
+
+    def _open_next(self) -> None:
+        self._close_file()
+        self.path = os.path.join(self.directory, f'{self.prefix}-{self._index:05d}{LOG_SUFFIX}')
+        self._index += 1
+        self._file = open(self.path, 'w+b')
+        self._file.truncate(HEADER.size + self.max_records * RECORD.size)
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        HEADER.pack_into(self._map, 0, MAGIC, VERSION, RECORD.size, 0, 0)
+        self._count = 0
+        for path in log_files(self.directory, self.prefix)[:-self.max_files]:
+            os.remove(path)
+
+    def _close_file(self) -> None:
+        if self._map is None:
+            return
+        self._map.flush()
+        self._map.close()
+        self._map = None
+        # Drop the unused preallocated records
+        self._file.truncate(HEADER.size + self._count * RECORD.size)
+        self._file.close()
+        self._file = None
+
+    def record(self, message: can.Message, direction: int, timestamp: Optional[float] = None) -> None:
+        """
+        Append a frame.
+
+        :param message: Frame sent or received.
+        :param direction: DIRECTION_RX or DIRECTION_TX.
+        :param timestamp: Time of the frame, defaults to message.timestamp or now when it has none.
+        """
+        if timestamp is None:
+            timestamp = message.timestamp or time.time()
+        flags = FLAG_EXTENDED_ID if message.is_extended_id else 0
+        with self._lock:
+            if self._map is None:
+                return
+            if self._count == self.max_records:
+                self._open_next()
+            RECORD.pack_into(self._map, HEADER.size + self._count * RECORD.size,
+                             timestamp, message.arbitration_id, message.dlc, direction, flags, bytes(message.data))
+            self._count += 1
+            struct.pack_into('<Q', self._map, _COUNT_OFFSET, self._count)
+
+    def on_rx(self, message: can.Message) -> None:
+        self.record(message, DIRECTION_RX)
+
+    def on_tx(self, message: can.Message) -> None:
+        # Frames built for sending carry no timestamp
+        self.record(message, DIRECTION_TX, time.time())
+
+    def attach(self, arctos) -> 'CanRecorder':
+        """
+        Record every frame received and sent by an Arctos.
+        """
+        arctos.add_message_listener(self.on_rx)
+        arctos.tx.add_sent_listener(self.on_tx)
+        self._attached.append(arctos)
+        return self
+
+    def close(self) -> None:
+        for arctos in self._attached:
+            arctos.remove_message_listener(self.on_rx)
+            arctos.tx.remove_sent_listener(self.on_tx)
+        self._attached = []
+        with self._lock:
+            self._close_file()
+
+    def __enter__(self) -> 'CanRecorder':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
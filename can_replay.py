@@ -0,0 +1,97 @@
+"""
+Replay of recordings made with :class:`can_recorder.CanRecorder`.
+
+The received frames of a recording (the motor replies) are sent again on a
+bus, so an :class:`arctos.Arctos` on the same ``virtual``/``vcan`` channel
+processes them through its normal listener path::
+
+    python3 can_replay.py logs --channel vcan0 --speed 0
+"""
+import argparse
+import itertools
+import time
+from typing import Iterable, Iterator
+
+import can
+
+from can_recorder import log_files, read_log
+
+
+def read_recording(directory: str, prefix: str = 'arctos') -> Iterator[can.Message]:
+    """
+    Frames of all the files of a recording, oldest first.
+    """
+    return itertools.chain.from_iterable(read_log(path) for path in log_files(directory, prefix))
+
+
+def replay(bus: can.interface.Bus,
+           frames: Iterable[can.Message],
+           speed: float = 1.0,
+           include_tx: bool = False) -> int:
+    """
+    Send recorded frames on a bus.
+
+    :param bus: Bus to send the frames on.
+    :param frames: Recorded frames, e.g. from read_recording.
+    :param speed: Playback speed relative to the recorded timing, 0 to send as fast as possible.
+    :param include_tx: Also send the frames the arm sent during the recording.
+    :return: Number of frames sent.
+    """
+    assert speed >= 0, 'Speed must not be negative'
+    start = None
+    first_timestamp = 0.0
+    count = 0
+    for message in frames:
+        if not message.is_rx and not include_tx:
+            continue
+        if speed > 0:
+            if start is None:
+                start = time.monotonic()
+                first_timestamp = message.timestamp
+            delay = start + (message.timestamp - first_timestamp) / speed - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        bus.send(message)
+        count += 1
+    return count
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Replay a recorded Arctos CAN session')
+    parser.add_argument('directory', help='Directory of the recording')
+    parser.add_argument('--prefix', default='arctos', help='File name prefix of the recording')
+    parser.add_argument('--interface', default='socketcan', help='python-can interface')
+    parser.add_argument('--channel', default='vcan0', help='python-can channel')
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help='Playback speed relative to the recording, 0 for as fast as possible')
+    parser.add_argument('--include-tx', action='store_true', help='Also send the frames sent by the arm')
+    parser.add_argument('--arctos', action='store_true',
+                        help='Feed an Arctos in this process (e.g. with --interface virtual) and report its dispatch rate')
+    args = parser.parse_args()
+
+    bus = can.Bus(interface=args.interface, channel=args.channel)
+    arctos = None
+    if args.arctos:
+        from arctos import Arctos
+        from can_helper import set_message_trace
+        set_message_trace(False)
+        arctos = Arctos(can.Bus(interface=args.interface, channel=args.channel))
+        received = []
+        arctos.add_message_listener(received.append)
+    start = time.monotonic()
+    count = replay(bus, read_recording(args.directory, args.prefix), args.speed, args.include_tx)
+    print(f"Replayed {count} frames in {time.monotonic() - start:.3f} s")
+    if arctos is not None:
+        # Let the listener drain what is still queued
+        deadline = time.monotonic() + 2
+        while len(received) < count and time.monotonic() < deadline:
+            time.sleep(0.01)
+        elapsed = time.monotonic() - start
+        print(f"Arctos dispatched {len(received)} frames, {len(received) / elapsed:.0f} frames/s")
+        print(arctos)
+        arctos.stop_can_listener()
+    bus.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+import threading
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+import can
+
+from constants import CMD_GO_HOME, CMD_RELATIVE_TURN, CMD_ABSOLUTE_TURN
+from timer_wheel import Timer, TimerWheel
+
+
+def _status_in(*statuses: int) -> Callable[[can.Message], bool]:
+    return lambda message: len(message.data) > 1 and message.data[1] in statuses
+
+
+# Opcode -> predicate telling whether a reply completes the request.
+# Commands missing here complete on their first reply.
+_final_reply_predicates = {
+    # 0x01 means "started", the request ends on found (0x02) or failed (0x00)
+    CMD_GO_HOME: _status_in(0x00, 0x02),
+    # 0x01 means "started", the request ends on stopped, endstop or failed
+    CMD_RELATIVE_TURN: _status_in(0x00, 0x02, 0x03),
+    CMD_ABSOLUTE_TURN: _status_in(0x00, 0x02, 0x03),
+}
+
+
+def is_final_reply(message: can.Message) -> bool:
+    predicate = _final_reply_predicates.get(message.data[0])
+    return predicate is None or predicate(message)
+
+
+class PendingRequest:
+    def __init__(self, can_id: int, opcode: int, message: Optional[can.Message] = None) -> None:
+        self.can_id = can_id
+        self.opcode = opcode
+        # Command frame, to fail the request when the frame is not sent
+        self.message = message
+        self.future: Future = Future()
+        # Every reply received for the request, the final one included
+        self.replies: List[can.Message] = []
+        # Deadline of the final reply, cancelled once the request is done
+        self.timer: Optional[Timer] = None
+
+
+class PendingRequests(can.Listener):
+    def __init__(self, timers: Optional[TimerWheel] = None) -> None:
+        """
+        Table of commands waiting for their reply, keyed by (can_id, opcode).
+
+        Replies must be fed through :meth:`on_message_received` by the single
+        receive path of the bus. Requests sharing a key are answered in the
+        order they were added.
+
+        :param timers: Timer wheel failing requests added with a timeout. Without
+            it timeouts are ignored and waiting callers cancel their requests.
+        """
+        self.timers = timers
+        self._lock = threading.Lock()
+        self._pending: Dict[Tuple[int, int], Deque[PendingRequest]] = {}
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(len(requests) for requests in self._pending.values())
+
+    def add(self,
+            can_id: int,
+            opcode: int,
+            timeout: Optional[float] = None,
+            message: Optional[can.Message] = None) -> Future:
+        """
+        Register a request. Must be called before the command is sent.
+
+        :param can_id: CAN id of the device the command is sent to.
+        :param opcode: Command byte, replies echo it as their first byte.
+        :param timeout: Seconds until the request fails with TimeoutError when its
+            final reply has not arrived. Needs a timer wheel.
+        :param message: Command frame, see :meth:`fail_request`.
+        :return: Future resolved with the list of replies.
+        """
+        request = PendingRequest(can_id, opcode, message)
+        with self._lock:
+            self._pending.setdefault((can_id, opcode), deque()).append(request)
+        request.future.add_done_callback(lambda future: self._discard(request) if future.cancelled() else None)
+        if timeout is not None and self.timers is not None:
+            request.timer = self.timers.schedule(timeout, lambda: self._expire(request, timeout))
+        return request.future
+
+    def _expire(self, request: PendingRequest, timeout: float) -> None:
+        # The final reply may be completing the request on the receive path: only
+        # the side that removes the request from the table completes its future
+        if not self._remove(request):
+            return
+        if request.future.set_running_or_notify_cancel():
+            request.future.set_exception(TimeoutError(
+                f"Device {request.can_id}: no final reply to 0x{request.opcode:02X} within {timeout} s"))
+
+    def _discard(self, request: PendingRequest) -> None:
+        if request.timer is not None:
+            request.timer.cancel()
+        self._remove(request)
+
+    def _remove(self, request: PendingRequest) -> bool:
+        """
+        :return: False when the request was already removed (answered, expired or failed).
+        """
+        key = (request.can_id, request.opcode)
+        with self._lock:
+            requests = self._pending.get(key)
+            if not requests or request not in requests:
+                return False
+            requests.remove(request)
+            if not requests:
+                del self._pending[key]
+            return True
+
+    def on_message_received(self, message: can.Message) -> None:
+        if not message.data:
+            return
+        key = (message.arbitration_id, message.data[0])
+        with self._lock:
+            requests = self._pending.get(key)
+            if not requests:
+                return
+            request = requests[0]
+            request.replies.append(message)
+            if not is_final_reply(message):
+                return
+            requests.popleft()
+            if not requests:
+                del self._pending[key]
+        if request.timer is not None:
+            request.timer.cancel()
+        if request.future.set_running_or_notify_cancel():
+            request.future.set_result(request.replies)
+
+    def fail_request(self, message: can.Message, exc: Exception) -> bool:
+        """
+        Fail the request of a command frame that was not sent (send error, dropped
+        by the transmit scheduler), instead of letting it time out.
+
+        :return: False when no pending request was added with this frame.
+        """
+        if not message.data:
+            return False
+        key = (message.arbitration_id, message.data[0])
+        with self._lock:
+            requests = self._pending.get(key)
+            # Newest first: a pooled frame may also belong to an older request already sent
+            request = next((request for request in reversed(requests) if request.message is message), None) \
+                if requests else None
+            if request is None:
+                return False
+            requests.remove(request)
+            if not requests:
+                del self._pending[key]
+        if request.timer is not None:
+            request.timer.cancel()
+        if request.future.set_running_or_notify_cancel():
+            request.future.set_exception(exc)
+        return True
+
+    def fail_all(self, exc: Exception) -> None:
+        """
+        Fail every pending request, e.g. when the bus is closed.
+        """
+        with self._lock:
+            pending = [request for requests in self._pending.values() for request in requests]
+            self._pending.clear()
+        for request in pending:
+            if request.timer is not None:
+                request.timer.cancel()
+            if request.future.set_running_or_notify_cancel():
+                request.future.set_exception(exc)
@@ -22,4 +22,9 @@ CMD_REMAP = 0x9E
 CMD_MOTOR_STATUS = 0xF1
 CMD_RELATIVE_TURN = 0xF4
 CMD_RUN_MOTOR = 0xF6
-CMD_GET_CURRENT_SPEED = 0x32
\ No newline at end of file
+CMD_GET_CURRENT_SPEED = 0x32
+CMD_ABSOLUTE_TURN = 0xF5
+CMD_EMERGENCY_STOP = 0xF7
+CMD_SET_WORK_CURRENT = 0x83
+CMD_SET_SUBDIVISION = 0x84
+CMD_SET_HOME_PARAMS = 0x90
@@ -0,0 +1,151 @@
+import time
+from concurrent.futures import Future, wait, FIRST_COMPLETED
+from typing import Dict, List, Optional, Sequence
+
+from arctos import Arctos
+from base_motor import MotorStatus, estimate_turn_duration
+
+# Axis -> axes homed before it. Z only homes once Y is back, so the arm does not
+# sweep the forearm through the base. The B/C wrist has no endstops and is not homed.
+DEFAULT_HOMING_ORDER: Dict[str, List[str]] = {
+    'x': [],
+    'y': [],
+    'z': ['y'],
+    'a': [],
+}
+
+# Axis -> max seconds between the go home command and the home status
+DEFAULT_HOMING_TIMEOUTS: Dict[str, float] = {
+    'x': 30,
+    'y': 60,
+    'z': 60,
+    'a': 30,
+}
+
+HOME_FOUND = 0x02
+HOME_FAILED = 0x00
+
+
+class HomingOrchestrator:
+    def __init__(self,
+                 arctos: Arctos,
+                 order: Optional[Dict[str, List[str]]] = None,
+                 timeouts: Optional[Dict[str, float]] = None,
+                 go_zero: bool = True,
+                 zero_speed: int = 1000,
+                 zero_acc: int = 200) -> None:
+        """
+        Home the axes of an arm in dependency order, independent axes in parallel.
+
+        An axis starts as soon as the axes it depends on are homed (and back at
+        their zero point), so homing takes as long as the slowest chain.
+
+        :param arctos: Arm to home.
+        :param order: Axis -> axes to home first, DEFAULT_HOMING_ORDER by default.
+        :param timeouts: Axis -> max seconds to find home, DEFAULT_HOMING_TIMEOUTS by default (30 s for others).
+        :param go_zero: Turn each axis to its zero point once homed.
+        :param zero_speed: Speed of the zero point move.
+        :param zero_acc: Acceleration of the zero point move.
+        """
+        self.arctos = arctos
+        self.order = DEFAULT_HOMING_ORDER if order is None else order
+        self.timeouts = DEFAULT_HOMING_TIMEOUTS if timeouts is None else timeouts
+        self.go_zero = go_zero
+        self.zero_speed = zero_speed
+        self.zero_acc = zero_acc
+        for axis, dependencies in self.order.items():
+            for dependency in dependencies:
+                assert dependency in self.order, f'Axis {axis} depends on {dependency}, which is not homed'
+        self._check_acyclic()
+
+    def _check_acyclic(self) -> None:
+        done = set()
+        remaining = dict(self.order)
+        while remaining:
+            ready = [axis for axis, dependencies in remaining.items() if all(d in done for d in dependencies)]
+            assert ready, f"Homing order has a cycle between {', '.join(sorted(remaining))}"
+            for axis in ready:
+                done.add(axis)
+                del remaining[axis]
+
+    def default_axes(self) -> List[str]:
+        """
+        Active axes that have a homing order entry.
+        """
+        return [axis for axis in self.arctos.get_active_axes() if axis in self.order]
+
+    def run(self, axes: Optional[Sequence[str]] = None) -> Dict[str, Optional[int]]:
+        """
+        Home the axes and wait until every chain is done.
+
+        :param axes: Axes to home, default_axes() by default. Dependencies left out are taken as homed.
+        :return: Axis -> 0x02 when homed, 0x00 when homing failed, None on timeout or
+            when an axis it depends on was not homed.
+        """
+        axes = list(self.default_axes() if axes is None else axes)
+
+        results: Dict[str, Optional[int]] = {}
+        waiting = set(axes)
+        # Future -> (axis, stage, deadline)
+        running: Dict[Future, tuple] = {}
+        start = time.monotonic()
+
+        def start_ready() -> None:
+            for axis in sorted(waiting):
+                dependencies = [d for d in self.order.get(axis, []) if d in axes]
+                if any(d in results and results[d] != HOME_FOUND for d in dependencies):
+                    print(f"Homing {axis} skipped: {', '.join(dependencies)} not homed")
+                    results[axis] = None
+                    waiting.discard(axis)
+                elif all(results.get(d) == HOME_FOUND for d in dependencies):
+                    waiting.discard(axis)
+                    motor = self.arctos.get_motor_by_axis(axis)
+                    deadline = time.monotonic() + self.timeouts.get(axis, 30)
+                    running[motor.start_go_home()] = (axis, 'home', deadline)
+            if waiting and not running:
+                # Nothing left to unblock the remaining axes
+                for axis in waiting:
+                    results[axis] = None
+                waiting.clear()
+
+        start_ready()
+        while running:
+            now = time.monotonic()
+            timeout = max(0.0, min(deadline for _, _, deadline in running.values()) - now)
+            done, _ = wait(list(running), timeout=timeout, return_when=FIRST_COMPLETED)
+            now = time.monotonic()
+            for future in list(running):
+                axis, stage, deadline = running[future]
+                if future not in done and now < deadline:
+                    continue
+                del running[future]
+                motor = self.arctos.get_motor_by_axis(axis)
+                if future not in done:
+                    future.cancel()
+                    motor.status = MotorStatus.ERROR
+                    print(f"Homing {axis}: timeout waiting for {stage}")
+                    results[axis] = None
+                    continue
+                status = self._final_status(future)
+                if stage == 'home' and status == HOME_FOUND and self.go_zero and motor.zero_point != 0:
+                    duration = estimate_turn_duration(abs(motor.zero_point * motor.ratio), self.zero_speed, self.zero_acc)
+                    running[motor.start_turn(motor.zero_point, speed=self.zero_speed, acc=self.zero_acc)] = \
+                        (axis, 'zero', now + 2 * duration + 1)
+                    continue
+                if stage == 'zero':
+                    # The zero move ends with 0x02 (stopped) like a found home
+                    status = HOME_FOUND if status == HOME_FOUND else HOME_FAILED
+                results[axis] = status
+                print(f"Homing {axis}: {'done' if status == HOME_FOUND else 'failed'} "
+                      f"after {now - start:.2f} s")
+            start_ready()
+        return results
+
+    @staticmethod
+    def _final_status(future: Future) -> Optional[int]:
+        try:
+            replies = future.result()
+        except Exception as e:
+            print(f"Homing error: {e}")
+            return HOME_FAILED
+        return replies[-1].data[1] if replies and len(replies[-1].data) > 1 else HOME_FAILED
@@ -0,0 +1,317 @@
+"""
+Gamepad jogging in speed mode.
+
+An :class:`InputSource` reports the gamepad state when it changes (pygame
+events, or a script in tests). :class:`JogController` turns the state into a
+signed speed per motor, quantized so stick noise does not produce traffic,
+and sends a ``CMD_RUN_MOTOR`` frame only for motors whose speed changed.
+"""
+import time
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple, Union
+
+import can
+
+from arctos import Arctos
+from constants import CMD_RUN_MOTOR
+from swith_pro_controller import Axis, Button, DPad
+
+# Stick -> motor, direction and speed in RPM at full deflection. Sticks report -1 at the top.
+default_stick_motor_map = {
+    Axis.LEFT_STICK_X: {'motor': 'x', 'direction': 1, 'speed': 100},
+    Axis.LEFT_STICK_Y: {'motor': 'y', 'direction': -1, 'speed': 300},
+    Axis.RIGHT_STICK_Y: {'motor': 'z', 'direction': -1, 'speed': 300},
+    Axis.RIGHT_STICK_X: {'motor': 'a', 'direction': 1, 'speed': 300},
+}
+
+
+class InputState:
+    def __init__(self) -> None:
+        """
+        Gamepad state: stick positions and held buttons/D-pad directions.
+        """
+        self.axes: Dict[Axis, float] = {axis: 0.0 for axis in Axis}
+        self.held: Set[Union[Button, DPad]] = set()
+        # time.monotonic() of the input change that produced this state
+        self.timestamp = time.monotonic()
+
+
+class InputSource(ABC):
+    # Set when the source has no more input (window closed, script done)
+    closed = False
+
+    @abstractmethod
+    def poll(self, timeout: float) -> bool:
+        """
+        Wait for an input change.
+
+        :param timeout: Max wait in seconds.
+        :return: True when the state changed.
+        """
+        ...
+
+    @abstractmethod
+    def state(self) -> InputState:
+        ...
+
+    def close(self) -> None:
+        self.closed = True
+
+
+class PygameInputSource(InputSource):
+    def __init__(self, joystick_index: int = 0) -> None:
+        """
+        First gamepad seen by pygame. Blocks on pygame events instead of polling.
+        """
+        import pygame
+        self._pygame = pygame
+        pygame.init()
+        pygame.joystick.init()
+        if pygame.joystick.get_count() <= joystick_index:
+            raise RuntimeError('No gamepad found')
+        self.joystick = pygame.joystick.Joystick(joystick_index)
+        self.joystick.init()
+        print(f"Connected to: {self.joystick.get_name()}")
+        self._state = InputState()
+        self._events = {pygame.JOYAXISMOTION, pygame.JOYBUTTONDOWN, pygame.JOYBUTTONUP, pygame.JOYHATMOTION,
+                        pygame.QUIT}
+
+    def poll(self, timeout: float) -> bool:
+        pygame = self._pygame
+        event = pygame.event.wait(int(timeout * 1000))
+        if event.type == pygame.NOEVENT:
+            return False
+        events = [event, *pygame.event.get()]
+        if any(e.type == pygame.QUIT for e in events):
+            self.close()
+            return False
+        if not any(e.type in self._events for e in events):
+            return False
+        state = self._state
+        for axis in Axis:
+            state.axes[axis] = self.joystick.get_axis(axis.value)
+        held = {button for button in Button if self.joystick.get_button(button.value)}
+        hat = self.joystick.get_hat(0)
+        held.update(direction for direction in DPad if direction.value == hat)
+        state.held = held
+        state.timestamp = time.monotonic()
+        return True
+
+    def state(self) -> InputState:
+        return self._state
+
+    def close(self) -> None:
+        super().close()
+        self._pygame.quit()
+
+
+class ScriptedInputSource(InputSource):
+    def __init__(self, steps: Iterable[Tuple[float, Dict[Union[Axis, Button, DPad], Union[float, bool]]]]) -> None:
+        """
+        Replays input changes, for tests and demos without a gamepad.
+
+        :param steps: (seconds after the previous step, {Axis: position, Button or DPad: held}).
+        """
+        self._steps = list(steps)
+        self._state = InputState()
+        self._next_time: Optional[float] = None
+
+    def poll(self, timeout: float) -> bool:
+        if not self._steps:
+            self.close()
+            return False
+        now = time.monotonic()
+        if self._next_time is None:
+            self._next_time = now + self._steps[0][0]
+        delay = self._next_time - now
+        if delay > timeout:
+            time.sleep(timeout)
+            return False
+        if delay > 0:
+            time.sleep(delay)
+        _, changes = self._steps.pop(0)
+        state = self._state
+        for key, value in changes.items():
+            if isinstance(key, Axis):
+                state.axes[key] = value
+            elif value:
+                state.held.add(key)
+            else:
+                state.held.discard(key)
+        state.timestamp = time.monotonic()
+        if self._steps:
+            self._next_time = state.timestamp + self._steps[0][0]
+        return True
+
+    def state(self) -> InputState:
+        return self._state
+
+
+def quantize(value: float, levels: int, deadzone: float, previous: int = 0, hysteresis: float = 0.25) -> int:
+    """
+    Stick position in [-1, 1] as a signed step in [-levels, levels], 0 inside the deadzone.
+
+    :param previous: Step of the previous position. It is kept until the stick moves
+        more than half a step plus hysteresis away, so noise around a step boundary
+        does not flip between two steps.
+    """
+    magnitude = abs(value)
+    if magnitude < deadzone:
+        return 0
+    position = min(1.0, (magnitude - deadzone) / (1 - deadzone)) * levels * (1 if value > 0 else -1)
+    if abs(position - previous) < 0.5 + hysteresis:
+        return previous
+    return int(round(position))
+
+
+class JogController:
+    def __init__(self,
+                 arctos: Arctos,
+                 source: InputSource,
+                 stick_map: Optional[Dict] = None,
+                 button_map: Optional[Dict] = None,
+                 dpad_map: Optional[Dict] = None,
+                 levels: int = 8,
+                 deadzone: float = 0.1,
+                 acc: int = 100,
+                 wrist_speed: int = 100,
+                 wrist_acc: int = 200,
+                 actions: Optional[Dict[Union[Button, DPad], Callable[[], None]]] = None) -> None:
+        """
+        Drive the motors in speed mode from an input source.
+
+        :param arctos: Arm to jog.
+        :param source: Input source.
+        :param stick_map: Axis -> {'motor', 'direction', 'speed'}, default_stick_motor_map by default.
+        :param button_map: Button -> {'motor', 'direction', 'speed', 'acc'} (see test_pro.button_motor_map).
+        :param dpad_map: D-pad direction -> {'axis': 'b' (pitch) or 'c' (roll), 'direction'} for the wrist.
+        :param levels: Speed steps per stick direction.
+        :param deadzone: Stick deflection ignored around the center.
+        :param acc: Acceleration of stick jogging.
+        :param wrist_speed: Speed of the wrist motors in RPM.
+        :param wrist_acc: Acceleration of the wrist motors.
+        :param actions: Button or D-pad direction -> function called when it is pressed.
+        """
+        self.arctos = arctos
+        self.source = source
+        self.stick_map = default_stick_motor_map if stick_map is None else stick_map
+        self.button_map = button_map or {}
+        self.dpad_map = dpad_map or {}
+        self.levels = levels
+        self.deadzone = deadzone
+        self.acc = acc
+        self.wrist_speed = wrist_speed
+        self.wrist_acc = wrist_acc
+        self.actions = actions or {}
+        # Motor axis -> speed last sent
+        self.sent: Dict[str, int] = {}
+        # Stick -> quantized step of its last position
+        self._steps: Dict[Axis, int] = {}
+        self._held: Set[Union[Button, DPad]] = set()
+        # Seconds from input change to the frame written to the bus, per speed frame
+        self.latencies: List[float] = []
+        self.frames = 0
+        # CAN id -> input timestamp of the speed frame queued for the motor, until it is sent
+        self._unsent: Dict[int, float] = {}
+        self.arctos.tx.add_sent_listener(self._on_sent)
+
+    def target_speeds(self, state: InputState) -> Dict[str, Tuple[int, int]]:
+        """
+        Signed speed and acceleration per motor for an input state.
+        """
+        speeds: Dict[str, Tuple[int, int]] = {}
+
+        def add(axis: str, speed: float, acc: int) -> None:
+            current, _ = speeds.get(axis, (0, acc))
+            speeds[axis] = (current + speed, acc)
+
+        for stick, mapping in self.stick_map.items():
+            step = quantize(state.axes.get(stick, 0.0), self.levels, self.deadzone, self._steps.get(stick, 0))
+            self._steps[stick] = step
+            add(mapping['motor'], step / self.levels * mapping['direction'] * mapping['speed'], self.acc)
+        for button, mapping in self.button_map.items():
+            if button in state.held:
+                add(mapping['motor'], mapping['direction'] * mapping['speed'], mapping['acc'])
+        # Wrist: b = -pitch - roll, c = pitch - roll
+        pitch = sum(m['direction'] for d, m in self.dpad_map.items() if d in state.held and m['axis'] == 'b')
+        roll = sum(m['direction'] for d, m in self.dpad_map.items() if d in state.held and m['axis'] == 'c')
+        if self.dpad_map:
+            add('b', max(-1, min(1, -pitch - roll)) * self.wrist_speed, self.wrist_acc)
+            add('c', max(-1, min(1, pitch - roll)) * self.wrist_speed, self.wrist_acc)
+        return {axis: (int(round(speed)), acc) for axis, (speed, acc) in speeds.items()}
+
+    def update(self, state: InputState) -> int:
+        """
+        Send the frames for a new input state.
+
+        :return: Number of frames sent.
+        """
+        for pressed in state.held - self._held:
+            action = self.actions.get(pressed)
+            if action is not None:
+                action()
+        self._held = set(state.held)
+
+        frames = 0
+        for axis, (speed, acc) in self.target_speeds(state).items():
+            if self.sent.get(axis, 0) == speed:
+                continue
+            motor = self.arctos.get_motor_by_axis(axis)
+            # Set before queuing: the frame may be sent before jog_speed returns
+            self._unsent[motor.can_id] = state.timestamp
+            if motor.jog_speed(speed, acc):
+                self.sent[axis] = speed
+                frames += 1
+            else:
+                self._unsent.pop(motor.can_id, None)
+                print(f"Motor {motor.can_id} is not ready. Status: {motor.status}")
+        self.frames += frames
+        return frames
+
+    def _on_sent(self, message: can.Message) -> None:
+        # Runs on the transmit path
+        if not message.data or message.data[0] != CMD_RUN_MOTOR:
+            return
+        timestamp = self._unsent.pop(message.arbitration_id, None)
+        if timestamp is not None:
+            self.latencies.append(time.monotonic() - timestamp)
+
+    def stop(self) -> None:
+        """
+        Stop every motor this controller set in motion.
+        """
+        for axis, speed in self.sent.items():
+            if speed:
+                self.arctos.get_motor_by_axis(axis).jog_speed(0, self.acc)
+        self.sent = {}
+
+    def close(self) -> None:
+        """
+        Stop measuring latencies. The controller is not used afterwards.
+        """
+        self.arctos.tx.remove_sent_listener(self._on_sent)
+
+    def run(self, poll_timeout: float = 0.1) -> None:
+        """
+        Jog until the source closes.
+        """
+        try:
+            while not self.source.closed:
+                if self.source.poll(poll_timeout):
+                    self.update(self.source.state())
+        finally:
+            self.stop()
+
+
+def latency_percentiles(latencies: Sequence[float]) -> Dict[str, float]:
+    """
+    p50/p99/max of input to bus latencies, in milliseconds.
+    """
+    ordered = sorted(latencies)
+    if not ordered:
+        return {}
+    return {
+        'p50_ms': ordered[len(ordered) // 2] * 1e3,
+        'p99_ms': ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1e3,
+        'max_ms': ordered[-1] * 1e3,
+    }
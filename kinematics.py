@@ -0,0 +1,301 @@
+from functools import lru_cache
+from typing import Tuple
+
+import numpy as np
+
+# Denavit-Hartenberg table of the Arctos arm, one row per joint:
+# (d [mm], a [mm], alpha [deg], theta offset [deg]).
+# With every joint at 0 the upper arm points up and the forearm forward.
+ARCTOS_DH = np.array([
+    [287.87, 20.174, -90.0, 0.0],
+    [0.0, 260.986, 0.0, -90.0],
+    [0.0, 19.219, -90.0, 0.0],
+    [260.753, 0.0, 90.0, 0.0],
+    [0.0, 0.0, -90.0, 0.0],
+    [74.745, 0.0, 0.0, 0.0],
+])
+
+MOTOR_AXES = ['x', 'y', 'z', 'a', 'b', 'c']
+
+# Digits kept from pose matrices when building LRU cache keys
+IK_CACHE_DECIMALS = 6
+
+
+def joints_to_motors(joints) -> np.ndarray:
+    """
+    Convert joint angles to motor axis angles (x, y, z, a, b, c), both in degrees.
+
+    Joints 1-4 are driven by the X, Y, Z and A motors. Wrist pitch (joint 5)
+    and roll (joint 6) are driven together by the B/C differential: moving B
+    and C in opposite directions pitches the wrist, in the same direction
+    rolls it.
+
+    :param joints: Joint angles, shape (..., 6).
+    :return: Motor axis angles, shape (..., 6).
+    """
+    joints = np.asarray(joints, dtype=float)
+    motors = joints.copy()
+    pitch = joints[..., 4]
+    roll = joints[..., 5]
+    motors[..., 4] = -pitch - roll
+    motors[..., 5] = pitch - roll
+    return motors
+
+
+def motors_to_joints(motors) -> np.ndarray:
+    """
+    Convert motor axis angles (x, y, z, a, b, c) to joint angles, inverse of joints_to_motors.
+    """
+    motors = np.asarray(motors, dtype=float)
+    joints = motors.copy()
+    b = motors[..., 4]
+    c = motors[..., 5]
+    joints[..., 4] = (c - b) / 2
+    joints[..., 5] = -(b + c) / 2
+    return joints
+
+
+def _dh_transforms(theta, d, a, alpha) -> np.ndarray:
+    """
+    Stack of DH transforms Rz(theta) Tz(d) Tx(a) Rx(alpha), angles in radians, shape (..., 4, 4).
+    """
+    ct, st = np.cos(theta), np.sin(theta)
+    ca, sa = np.cos(alpha), np.sin(alpha)
+    transforms = np.zeros(np.shape(theta) + (4, 4))
+    transforms[..., 0, 0] = ct
+    transforms[..., 0, 1] = -st * ca
+    transforms[..., 0, 2] = st * sa
+    transforms[..., 0, 3] = a * ct
+    transforms[..., 1, 0] = st
+    transforms[..., 1, 1] = ct * ca
+    transforms[..., 1, 2] = -ct * sa
+    transforms[..., 1, 3] = a * st
+    transforms[..., 2, 1] = sa
+    transforms[..., 2, 2] = ca
+    transforms[..., 2, 3] = d
+    transforms[..., 3, 3] = 1.0
+    return transforms
+
+
+def forward_kinematics(joints, dh: np.ndarray = ARCTOS_DH, up_to: int = 6) -> np.ndarray:
+    """
+    Flange poses for a batch of joint vectors.
+
+    :param joints: Joint angles in degrees, shape (6,) or (N, 6).
+    :param dh: DH table, see ARCTOS_DH.
+    :param up_to: Number of joints to chain, e.g. 3 for the frame of the wrist.
+    :return: Homogeneous transforms in mm, shape (4, 4) or (N, 4, 4).
+    """
+    joints = np.asarray(joints, dtype=float)
+    single = joints.ndim == 1
+    joints = np.atleast_2d(joints)
+    theta = np.radians(joints[:, :up_to] + dh[:up_to, 3])
+    transforms = _dh_transforms(theta, dh[:up_to, 0], dh[:up_to, 1], np.radians(dh[:up_to, 2]))
+    poses = transforms[:, 0]
+    for joint in range(1, up_to):
+        poses = poses @ transforms[:, joint]
+    return poses[0] if single else poses
+
+
+def _wrap(angles) -> np.ndarray:
+    """
+    Angles in degrees wrapped to [-180, 180).
+    """
+    return (np.asarray(angles) + 180.0) % 360.0 - 180.0
+
+
+def ik_solutions(poses, dh: np.ndarray = ARCTOS_DH) -> np.ndarray:
+    """
+    Every closed form joint solution of a batch of flange poses.
+
+    The wrist center gives joints 1-3, the remaining rotation gives the wrist
+    joints 4-6. Solutions are ordered by branch: shoulder (front, back) x
+    elbow (up, down) x wrist (not flipped, flipped), so index 0 is front
+    shoulder, elbow up, wrist not flipped. A non flipped wrist has joint 5 >= 0.
+
+    :param poses: Homogeneous transforms in mm, shape (4, 4) or (N, 4, 4).
+    :param dh: DH table, see ARCTOS_DH.
+    :return: Joint angles in degrees wrapped to [-180, 180), shape (8, 6) or (N, 8, 6).
+        Solutions of a branch that cannot reach the pose are NaN.
+    """
+    poses = np.asarray(poses, dtype=float)
+    single = poses.ndim == 2
+    poses = poses.reshape(-1, 4, 4)
+    count = poses.shape[0]
+    d1, a1 = dh[0, 0], dh[0, 1]
+    a2 = dh[1, 1]
+    a3 = dh[2, 1]
+    d4 = dh[3, 0]
+    d6 = dh[5, 0]
+
+    rotation = poses[:, :3, :3]
+    wrist = poses[:, :3, 3] - d6 * rotation[:, :, 2]
+    # Shoulder front: the arm leans towards the wrist center, back: away from it, base turned half a turn
+    front = np.arctan2(wrist[:, 1], wrist[:, 0])
+    distance = np.hypot(wrist[:, 0], wrist[:, 1])
+    theta1 = np.stack([front, front + np.pi], axis=1)[:, :, None]
+    r = np.stack([distance - a1, -distance - a1], axis=1)[:, :, None]
+    s = (wrist[:, 2] - d1)[:, None, None]
+
+    # Planar two link problem: upper arm a2, forearm from joint 3 to the wrist center
+    forearm = np.hypot(a3, d4)
+    gamma = np.arctan2(d4, a3)
+    cos_delta = (r * r + s * s - a2 * a2 - forearm * forearm) / (2 * a2 * forearm)
+    with np.errstate(invalid='ignore'):
+        # Elbow up, then down
+        delta = np.arccos(cos_delta) * np.array([-1.0, 1.0])
+    beta2 = np.arctan2(s, r) - np.arctan2(forearm * np.sin(delta), a2 + forearm * np.cos(delta))
+    theta2 = -beta2
+    theta3 = -(delta + beta2 + gamma) - theta2
+
+    # Shape (N, 4, 3): shoulder x elbow, joints 1-3
+    arm = np.stack(np.broadcast_arrays(theta1, theta2, theta3), axis=-1).reshape(count, 4, 3)
+    arm = np.degrees(arm) - dh[:3, 3]
+
+    # Wrist: R36 = Rz(theta4) Ry(-theta5) Rz(theta6), solved as ZYZ angles
+    r03 = forward_kinematics(np.nan_to_num(np.pad(arm.reshape(-1, 3), ((0, 0), (0, 3)))), dh, up_to=3)[:, :3, :3]
+    r36 = np.swapaxes(r03, 1, 2) @ np.repeat(rotation, 4, axis=0)
+    sin_b = np.hypot(r36[:, 0, 2], r36[:, 1, 2])
+    b = np.arctan2(sin_b, r36[:, 2, 2])
+    singular = sin_b < 1e-9
+    theta4 = np.where(singular, 0.0, np.arctan2(r36[:, 1, 2], r36[:, 0, 2]))
+    theta6 = np.where(
+        singular,
+        np.arctan2(r36[:, 1, 0], r36[:, 0, 0]),
+        np.arctan2(r36[:, 2, 1], -r36[:, 2, 0]),
+    )
+    # Not flipped: theta5 = b >= 0. Flipped: theta5 = -b, joints 4 and 6 turned half a turn
+    # (both are the same solution when the wrist is straight)
+    half = np.where(singular, 0.0, np.pi)
+    wrist_joints = np.stack([
+        np.stack([theta4 + half, b, theta6 + half], axis=-1),
+        np.stack([theta4, -b, theta6], axis=-1),
+    ], axis=1)
+    wrist_joints = np.degrees(wrist_joints) - dh[3:, 3]
+
+    solutions = np.empty((count, 4, 2, 6))
+    solutions[..., :3] = arm.reshape(count, 4, 1, 3)
+    solutions[..., 3:] = wrist_joints.reshape(count, 4, 2, 3)
+    solutions = solutions.reshape(count, 8, 6)
+    solutions[np.isnan(solutions).any(axis=2)] = np.nan
+    solutions = _wrap(solutions)
+    return solutions[0] if single else solutions
+
+
+def closest_solution(solutions, seed) -> np.ndarray:
+    """
+    Pick the solution nearest to seed joints, e.g. the previous point of a path.
+
+    :param solutions: Shape (8, 6) or (N, 8, 6), see ik_solutions.
+    :param seed: Joint angles in degrees, shape (6,) or (N, 6).
+    :return: Joint angles in degrees, shape (6,) or (N, 6), each within half a turn of
+        the seed so that joints do not jump by a full turn. Rows without any solution are NaN.
+    """
+    solutions = np.asarray(solutions, dtype=float)
+    single = solutions.ndim == 2
+    solutions = solutions.reshape(-1, 8, 6)
+    seed = np.broadcast_to(np.asarray(seed, dtype=float), (solutions.shape[0], 6))
+    steps = _wrap(solutions - seed[:, None, :])
+    cost = np.sum(steps * steps, axis=2)
+    cost[np.isnan(cost)] = np.inf
+    best = np.argmin(cost, axis=1)
+    joints = seed + steps[np.arange(len(best)), best]
+    # A straight wrist only fixes joints 4 + 6: keep joint 4 where the seed has it
+    straight = np.abs(joints[:, 4]) < 1e-6
+    joints[straight, 5] += joints[straight, 3] - seed[straight, 3]
+    joints[straight, 3] = seed[straight, 3]
+    return joints[0] if single else joints
+
+
+def inverse_kinematics(poses, dh: np.ndarray = ARCTOS_DH, seed=None) -> np.ndarray:
+    """
+    Joint angles reaching a batch of flange poses.
+
+    Without seed the solution is front shoulder, elbow up, wrist not flipped
+    (joint 5 >= 0), or back shoulder when the front one cannot reach the pose.
+    With seed it is the solution nearest to the seed joints, see closest_solution.
+
+    :param poses: Homogeneous transforms in mm, shape (4, 4) or (N, 4, 4).
+    :param dh: DH table, see ARCTOS_DH.
+    :param seed: Joint angles in degrees, shape (6,) or (N, 6), e.g. the current joints.
+    :return: Joint angles in degrees, shape (6,) or (N, 6). Rows of unreachable poses are NaN.
+    """
+    solutions = ik_solutions(poses, dh)
+    if seed is not None:
+        return closest_solution(solutions, seed)
+    single = solutions.ndim == 2
+    solutions = solutions.reshape(-1, 8, 6)
+    front = solutions[:, 0]
+    joints = np.where(np.isnan(front[:, :1]), solutions[:, 4], front)
+    return joints[0] if single else joints
+
+
+@lru_cache(maxsize=4096)
+def _inverse_kinematics_cached(pose_key: Tuple[float, ...]) -> Tuple[float, ...]:
+    pose = np.array(pose_key).reshape(4, 4)
+    return tuple(inverse_kinematics(pose))
+
+
+def inverse_kinematics_cached(pose) -> np.ndarray:
+    """
+    Single pose inverse kinematics through an LRU cache, for targets that repeat.
+
+    :param pose: Homogeneous transform in mm, shape (4, 4).
+    :return: Joint angles in degrees, shape (6,).
+    """
+    pose_key = tuple(np.round(np.asarray(pose, dtype=float), IK_CACHE_DECIMALS).ravel())
+    return np.array(_inverse_kinematics_cached(pose_key))
+
+
+def pose_from_xyz_rpy(xyz, rpy) -> np.ndarray:
+    """
+    Homogeneous transforms from positions and roll/pitch/yaw angles.
+
+    :param xyz: Positions in mm, shape (3,) or (N, 3).
+    :param rpy: Roll, pitch, yaw in degrees (R = Rz(yaw) Ry(pitch) Rx(roll)), shape (3,) or (N, 3).
+    :return: Shape (4, 4) or (N, 4, 4).
+    """
+    xyz = np.asarray(xyz, dtype=float)
+    single = xyz.ndim == 1
+    xyz = np.atleast_2d(xyz)
+    roll, pitch, yaw = np.radians(np.atleast_2d(rpy)).T
+    cr, sr = np.cos(roll), np.sin(roll)
+    cp, sp = np.cos(pitch), np.sin(pitch)
+    cy, sy = np.cos(yaw), np.sin(yaw)
+    poses = np.zeros((xyz.shape[0], 4, 4))
+    poses[:, 0, 0] = cy * cp
+    poses[:, 0, 1] = cy * sp * sr - sy * cr
+    poses[:, 0, 2] = cy * sp * cr + sy * sr
+    poses[:, 1, 0] = sy * cp
+    poses[:, 1, 1] = sy * sp * sr + cy * cr
+    poses[:, 1, 2] = sy * sp * cr - cy * sr
+    poses[:, 2, 0] = -sp
+    poses[:, 2, 1] = cp * sr
+    poses[:, 2, 2] = cp * cr
+    poses[:, :3, 3] = xyz
+    poses[:, 3, 3] = 1.0
+    return poses[0] if single else poses
+
+
+def cartesian_path_to_motors(poses, dh: np.ndarray = ARCTOS_DH, seed=None) -> np.ndarray:
+    """
+    Motor axis waypoints (x, y, z, a, b, c) for a Cartesian path, ready for trajectory_planner.plan_trajectory.
+
+    Each waypoint takes the solution nearest to the previous one, so the joints
+    stay on one branch along the path instead of jumping between solutions.
+
+    :param poses: Homogeneous transforms in mm, shape (N, 4, 4).
+    :param dh: DH table, see ARCTOS_DH.
+    :param seed: Joint angles in degrees at the start of the path, shape (6,). The
+        default branch of inverse_kinematics when None.
+    :return: Motor axis angles in degrees, shape (N, 6). Rows of unreachable poses are NaN.
+    """
+    solutions = ik_solutions(np.asarray(poses, dtype=float).reshape(-1, 4, 4), dh)
+    joints = np.full((solutions.shape[0], 6), np.nan)
+    previous = seed
+    for index, candidates in enumerate(solutions):
+        joints[index] = inverse_kinematics(poses[index], dh) if previous is None \
+            else closest_solution(candidates, previous)
+        if not np.isnan(joints[index, 0]):
+            previous = joints[index]
+    return joints_to_motors(joints)
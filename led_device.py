@@ -1,4 +1,7 @@
+import threading
+import time
 from enum import Enum
+from typing import Callable, Optional
 
 import can
 from can_device import CanDevice
@@ -29,6 +32,8 @@ class LedDevice(CanDevice):
         self.num_leds = 11
         for i in range(0, self.num_leds):
             self.leds.append(Color.BLACK)
+        # Colors of the last frame sent, None before the first one
+        self.shown = None
 
     def on_can_message(self, message: can.Message):
         pass
@@ -41,6 +46,7 @@ class LedDevice(CanDevice):
             packed_byte = (first << 4) | second
             data.append(packed_byte)
         message = self.make_message(data)
+        self.shown = tuple(self.leds)
         self.send_message(message, timeout=0)
 
     def set_all_leds(self, color: Color):
@@ -69,4 +75,76 @@ class LedDevice(CanDevice):
             if self.leds[led_id] != color:
                 is_led_changed = True
                 self.set_led(led_id, color, send_to_device=False)
-        return is_led_changed
\ No newline at end of file
+        return is_led_changed
+
+
+class LedRenderer:
+    def __init__(self, led: LedDevice, rate: float = 10) -> None:
+        """
+        Send the LED state from a background thread, or from the owner's I/O loop through :meth:`pump`.
+
+        Callers only change ``led.leds`` and call :meth:`invalidate`. The
+        renderer sends at most ``rate`` frames per second, only when the
+        colors differ from the last frame sent, and always ends on the
+        latest state.
+
+        :param led: LED device to render.
+        :param rate: Maximum frames per second.
+        """
+        assert rate > 0, 'Rate must be positive'
+        self.led = led
+        self.interval = 1 / rate
+        # Called by invalidate, set by an I/O loop calling pump instead of the thread
+        self.wakeup: Optional[Callable[[], None]] = None
+        self._changed = threading.Event()
+        self._next_time = time.monotonic()
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> 'LedRenderer':
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True, name='arctos led')
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._running = False
+        self._changed.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+
+    def invalidate(self) -> None:
+        """
+        Signal that ``led.leds`` may have changed.
+        """
+        self._changed.set()
+        if self.wakeup is not None:
+            self.wakeup()
+
+    def pump(self) -> float:
+        """
+        Send the state if it changed and the rate allows it.
+
+        :return: Seconds until a pending change may be sent, inf when nothing is pending.
+        """
+        if not self._changed.is_set():
+            return float('inf')
+        delay = self._next_time - time.monotonic()
+        if delay > 0:
+            return delay
+        # Cleared before reading the state, so a change made while sending triggers another frame
+        self._changed.clear()
+        if tuple(self.led.leds) != self.led.shown:
+            self.led.show()
+            self._next_time = time.monotonic() + self.interval
+        return float('inf')
+
+    def _run(self) -> None:
+        while True:
+            self._changed.wait()
+            if not self._running:
+                return
+            delay = self.pump()
+            if delay != float('inf'):
+                time.sleep(delay)
@@ -0,0 +1,225 @@
+"""
+Indexed queries over :mod:`can_recorder` log files.
+
+The files are memory-mapped as NumPy record arrays. The index sorts the
+record positions by (arbitration id, opcode, direction) and keeps the time
+range of each block of records, so a query only touches the records of one
+key inside the blocks overlapping the requested time range. The decoders
+work on whole arrays of records and return the same values as
+:func:`mks_codec.decode_reply`.
+"""
+import argparse
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from can_recorder import HEADER, RECORD, DIRECTION_RX, log_files, read_header
+from constants import CMD_READ_ENCODER
+from mks_codec import ENCODER_COUNTS
+
+# NumPy view of can_recorder.RECORD
+RECORD_DTYPE = np.dtype([
+    ('timestamp', '<f8'),
+    ('arbitration_id', '<u4'),
+    ('dlc', 'u1'),
+    ('direction', 'u1'),
+    ('flags', 'u1'),
+    ('pad', 'u1'),
+    ('data', 'u1', (8,)),
+])
+assert RECORD_DTYPE.itemsize == RECORD.size
+
+
+def load_records(path: str) -> np.ndarray:
+    """
+    Records of a log file, memory-mapped read only.
+    """
+    with open(path, 'rb') as f:
+        count = read_header(f.read(HEADER.size))
+    if count == 0:
+        return np.zeros(0, dtype=RECORD_DTYPE)
+    return np.memmap(path, dtype=RECORD_DTYPE, mode='r', offset=HEADER.size, shape=(count,))
+
+
+def valid_checksums(records: np.ndarray) -> np.ndarray:
+    """
+    Mask of the records whose crc byte matches (can_id + data bytes) & 0xFF.
+    """
+    data = records['data'].astype(np.uint32)
+    dlc = records['dlc'].astype(np.int64)
+    columns = np.arange(8)
+    payload = np.where(columns < (dlc - 1)[:, None], data, 0).sum(axis=1)
+    crc = data[np.arange(len(records)), np.maximum(dlc - 1, 0)]
+    return (dlc > 0) & ((records['arbitration_id'] + payload) & 0xFF == crc)
+
+
+def _big_endian(data: np.ndarray, first: int, size: int, signed: bool) -> np.ndarray:
+    columns = np.ascontiguousarray(data[:, first:first + size])
+    return columns.view(f'>{"i" if signed else "u"}{size}')[:, 0].astype(np.int64)
+
+
+def decode_encoder(records: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Carry and value of encoder replies (mks_codec.EncoderReply).
+    """
+    data = records['data']
+    return _big_endian(data, 1, 4, True), _big_endian(data, 5, 2, False)
+
+
+def encoder_counts(records: np.ndarray) -> np.ndarray:
+    carry, value = decode_encoder(records)
+    return carry * ENCODER_COUNTS + value
+
+
+def encoder_degrees(records: np.ndarray, ratio: float = 1.0, offset: float = 0.0) -> np.ndarray:
+    """
+    Joint degrees of encoder replies, as computed by BaseMotor from the encoder.
+
+    :param records: Encoder replies of one motor.
+    :param ratio: Gear ratio of the motor.
+    :param offset: Joint degrees at encoder 0 (BaseMotor.encoder_offset).
+    """
+    return encoder_counts(records) * (360 / ENCODER_COUNTS / ratio) + offset
+
+
+def decode_speed(records: np.ndarray) -> np.ndarray:
+    """
+    Speed in RPM of current speed replies (mks_codec.SpeedReply).
+    """
+    return _big_endian(records['data'], 1, 2, True)
+
+
+def decode_status(records: np.ndarray) -> np.ndarray:
+    """
+    Status byte of status replies (mks_codec.StatusReply).
+    """
+    return records['data'][:, 1].astype(np.int64)
+
+
+class LogIndex:
+    def __init__(self, path: str, block_size: int = 4096) -> None:
+        """
+        Index of a log file.
+
+        :param path: Log file.
+        :param block_size: Records per time block.
+        """
+        self.path = path
+        self.records = load_records(path)
+        self.block_size = block_size
+        timestamps = np.asarray(self.records['timestamp'])
+        # Recording order is nearly but not strictly time order (TX and RX clocks),
+        # so every block keeps its own time range
+        blocks = max(1, -(-len(timestamps) // block_size))
+        padded = np.full(blocks * block_size, np.nan)
+        padded[:len(timestamps)] = timestamps
+        padded = padded.reshape(blocks, block_size)
+        self.block_start = np.nanmin(padded, axis=1) if len(timestamps) else np.zeros(0)
+        self.block_end = np.nanmax(padded, axis=1) if len(timestamps) else np.zeros(0)
+
+        keys = self._keys(self.records)
+        order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[order]
+        unique, first = np.unique(sorted_keys, return_index=True)
+        bounds = np.append(first, len(order))
+        # Key -> positions of its records in recording order
+        self._positions: Dict[int, np.ndarray] = {
+            int(key): order[bounds[i]:bounds[i + 1]] for i, key in enumerate(unique)
+        }
+
+    @staticmethod
+    def _keys(records: np.ndarray) -> np.ndarray:
+        opcodes = np.where(records['dlc'] > 0, records['data'][:, 0], 0).astype(np.int64)
+        return (records['arbitration_id'].astype(np.int64) << 16) | (opcodes << 8) | records['direction']
+
+    def keys(self) -> List[Tuple[int, int, int]]:
+        """
+        (arbitration id, opcode, direction) of the frames in the file.
+        """
+        return [(key >> 16, (key >> 8) & 0xFF, key & 0xFF) for key in self._positions]
+
+    def _record_range(self, start: Optional[float], end: Optional[float]) -> Tuple[int, int]:
+        overlapping = np.ones(len(self.block_start), dtype=bool)
+        if start is not None:
+            overlapping &= self.block_end >= start
+        if end is not None:
+            overlapping &= self.block_start <= end
+        blocks = np.flatnonzero(overlapping)
+        if len(blocks) == 0:
+            return 0, 0
+        return int(blocks[0]) * self.block_size, (int(blocks[-1]) + 1) * self.block_size
+
+    def query(self,
+              arbitration_id: int,
+              opcode: int,
+              start: Optional[float] = None,
+              end: Optional[float] = None,
+              direction: int = DIRECTION_RX,
+              check_crc: bool = True) -> np.ndarray:
+        """
+        Records of one id and opcode within [start, end].
+
+        :param arbitration_id: CAN id of the device.
+        :param opcode: First data byte.
+        :param start: First timestamp, None for the beginning of the file.
+        :param end: Last timestamp, None for the end of the file.
+        :param direction: can_recorder.DIRECTION_RX (replies) or DIRECTION_TX (commands).
+        :param check_crc: Drop records with a wrong checksum.
+        :return: Records in recording order.
+        """
+        positions = self._positions.get((arbitration_id << 16) | (opcode << 8) | direction)
+        if positions is None:
+            return np.zeros(0, dtype=RECORD_DTYPE)
+        first, last = self._record_range(start, end)
+        positions = positions[np.searchsorted(positions, first):np.searchsorted(positions, last)]
+        records = self.records[positions]
+        mask = np.ones(len(records), dtype=bool)
+        if start is not None:
+            mask &= records['timestamp'] >= start
+        if end is not None:
+            mask &= records['timestamp'] <= end
+        if check_crc:
+            mask &= valid_checksums(records)
+        return records[mask]
+
+
+class RecordingIndex:
+    def __init__(self, directory: str, prefix: str = 'arctos', block_size: int = 4096) -> None:
+        """
+        Index of all the files of a recording.
+        """
+        self.files = [LogIndex(path, block_size) for path in log_files(directory, prefix)]
+
+    def query(self, arbitration_id: int, opcode: int, start: Optional[float] = None, end: Optional[float] = None,
+              direction: int = DIRECTION_RX, check_crc: bool = True) -> np.ndarray:
+        """
+        Records of one id and opcode within [start, end] over all files, see LogIndex.query.
+        """
+        parts = [index.query(arbitration_id, opcode, start, end, direction, check_crc) for index in self.files]
+        if not parts:
+            return np.zeros(0, dtype=RECORD_DTYPE)
+        return np.concatenate(parts)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Extract the encoder positions of a motor from a recording')
+    parser.add_argument('directory', help='Directory of the recording')
+    parser.add_argument('motor_id', type=int, help='CAN id of the motor')
+    parser.add_argument('--prefix', default='arctos')
+    parser.add_argument('--start', type=float, help='First timestamp')
+    parser.add_argument('--end', type=float, help='Last timestamp')
+    parser.add_argument('--ratio', type=float, default=1.0, help='Gear ratio, for joint degrees')
+    args = parser.parse_args()
+
+    start_time = time.monotonic()
+    index = RecordingIndex(args.directory, args.prefix)
+    records = index.query(args.motor_id, CMD_READ_ENCODER, args.start, args.end)
+    degrees = encoder_degrees(records, args.ratio)
+    print(f"{len(records)} encoder replies in {time.monotonic() - start_time:.3f} s")
+    for timestamp, value in zip(records['timestamp'], degrees):
+        print(f"{timestamp:.6f} {value:.3f}")
+
+
+if __name__ == '__main__':
+    main()
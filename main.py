@@ -1,20 +1,23 @@
 import argparse
 import can
-from time import sleep, time
+from time import sleep
 
 from arctos import Arctos
+from bus_factory import BusConfig, add_bus_arguments, bus_config_from_args, create_bus
 from motors import XMotor, YMotor, ZMotor, AMotor, BMotor, CMotor
+from position_snapshot import DEFAULT_SNAPSHOT_PATH
 
 
-def run_fn(fn):
-    bus = can.interface.Bus(interface="slcan", channel="/dev/ttyACM0", bitrate=500000)
+def run_fn(fn, config: BusConfig = None):
+    bus = create_bus(config)
     fn(bus)
     bus.shutdown()
 
-def run_threaded_fn(fn):
-    bus = can.ThreadSafeBus(interface="slcan", channel="/dev/ttyACM0", bitrate=500000)
-    fn(bus)
-    bus.shutdown()
+def run_threaded_fn(fn, config: BusConfig = None):
+    config = config or BusConfig()
+    # The batched slcan bus locks its writes itself
+    config.thread_safe = not config.batched
+    run_fn(fn, config)
 
 def read_encoders(bus: can.interface.Bus):
     print("Reading encoders")
@@ -27,59 +30,39 @@ def read_encoders(bus: can.interface.Bus):
     z_motor.read_encoder()
     print("Encoders read")
 
-def go_home(bus: can.interface.Bus):
+def home_arm(bus: can.interface.Bus) -> Arctos:
     print("Going home")
-    arctos = Arctos(bus)
+    # Homing is skipped for axes whose snapshot position the encoders confirm
+    arctos = Arctos(bus, snapshot_path=DEFAULT_SNAPSHOT_PATH)
     arctos.b_motor().set_active(False)
     arctos.c_motor().set_active(False)
-    arctos.go_home()
-    print("Home sent")
-
-    for i in range(40):
-        # Measure speed
-        for active_motor in arctos.get_active_motors():
-            active_motor.get_current_speed()
-        t1 = time()
-        while time() - t1 < 2:
-            has_all_motor_speeds = True
-            for active_motor in arctos.get_active_motors():
-                has_all_motor_speeds = has_all_motor_speeds and active_motor.current_speed is not None
-            if has_all_motor_speeds:
-                break
-            sleep(0.1)
-        print(f"Waiting {i} / 40")
-        print(arctos)
-        # is_ready = True
-        # for active_motor in arctos.get_active_motors():
-        #     is_ready = is_ready and active_motor.is_ready()
-        #     is_ready = is_ready and active_motor.position == 0
-        # if is_ready:
-        #     print("All motors are ready")
-        #     break
-        sleep(0.5)
+    results = arctos.warm_start()
+    print(f"Home done: {results}")
+    print(arctos)
+    return arctos
 
-def say_hello(bus: can.interface.Bus):
-    x_motor = XMotor(bus)
-    y_motor = YMotor(bus)
-    z_motor = ZMotor(bus)
-
-    go_home(bus)
+def go_home(bus: can.interface.Bus):
+    arctos = home_arm(bus)
+    # Saves the position snapshot for the next warm start, before the bus is shut down
+    arctos.stop_can_listener()
 
-    x_motor.make_turn(90)
-    y_motor.make_turn(90)
-    x_motor.make_turn(45)
-    x_motor.make_turn(-90)
-    x_motor.make_turn(45)
-    y_motor.make_turn(-90)
-    x_motor.make_turn(-90)
-    y_motor.make_turn(40)
-    y_motor.make_turn(-40)
+def say_hello(bus: can.interface.Bus):
+    with home_arm(bus) as arctos:
+        arctos.move_joints({'x': 90, 'y': 90})
+        arctos.move_joints({'x': 45})
+        arctos.move_joints({'x': -90})
+        arctos.move_joints({'x': 45, 'y': -90})
+        arctos.move_joints({'x': -90, 'y': 40})
+        arctos.move_joints({'y': -40})
 
 def test_x_run(bus: can.interface.Bus):
-    x_motor = XMotor(bus)
-    x_motor.set_zero()
-    x_motor.make_turn(90, speed=500, acc=100, timeout=20)
-    x_motor.make_turn(-90, speed=500, acc=100, timeout=20)
+    with Arctos(bus) as arctos:
+        arctos.x_motor().set_zero()
+        # The second turn is sent as soon as the first one stopped
+        queue = arctos.motion_queue('x')
+        queue.relative(90, speed=500, acc=100)
+        queue.relative(-90, speed=500, acc=100)
+        queue.wait(timeout=40)
 
 def debug_bc_motors(bus: can.interface.Bus):
     arctos = Arctos(bus)
@@ -93,23 +76,11 @@ def debug_bc_motors(bus: can.interface.Bus):
     arctos.b_motor().set_zero()
     arctos.c_motor().set_zero()
 
-    arctos.b_motor().make_turn(30, speed=debug_speed)
-    arctos.c_motor().make_turn(-30, speed=debug_speed)
-
-    sleep(5)
-
-    arctos.b_motor().make_turn(30, speed=debug_speed)
-    arctos.c_motor().make_turn(30, speed=debug_speed)
-
-    sleep(5)
-
-    arctos.b_motor().make_turn(-30, speed=debug_speed)
-    arctos.c_motor().make_turn(30, speed=debug_speed)
-
-    sleep(5)
-
-    arctos.b_motor().make_turn(-30, speed=debug_speed)
-    arctos.c_motor().make_turn(-30, speed=debug_speed)
+    arctos.move_joints({'b': 30, 'c': -30}, speed=debug_speed)
+    arctos.move_joints({'b': 30, 'c': 30}, speed=debug_speed)
+    arctos.move_joints({'b': -30, 'c': 30}, speed=debug_speed)
+    arctos.move_joints({'b': -30, 'c': -30}, speed=debug_speed)
+    arctos.stop_can_listener()
 
 def debug_motor(bus: can.interface.Bus):
     arctos = Arctos(bus)
@@ -124,7 +95,7 @@ def debug_motor(bus: can.interface.Bus):
     sleep(5)
     a_motor.stop_in_speed_mode(100)
     sleep(5)
-
+    arctos.stop_can_listener()
 
     # arctos.a_motor().go_home()
     # arctos.go_home()
@@ -144,21 +115,23 @@ def debug_motor(bus: can.interface.Bus):
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Control motors via CAN bus")
     parser.add_argument("command", choices=["read_encoders", "go_home", "test_x_run", "say_hello"], help="Command to execute")
+    add_bus_arguments(parser)
     args = parser.parse_args()
+    bus_config = bus_config_from_args(args)
 
     command = args.command
     # command = 'debug_bc_motors'
     # command = 'go_home'
 
     if command == "read_encoders":
-        run_threaded_fn(read_encoders)
+        run_threaded_fn(read_encoders, bus_config)
     elif command == "test_x_run":
-        run_threaded_fn(test_x_run)
+        run_threaded_fn(test_x_run, bus_config)
     elif command == "go_home":
-        run_threaded_fn(go_home)
+        run_threaded_fn(go_home, bus_config)
     elif command == "say_hello":
-        run_threaded_fn(say_hello)
+        run_threaded_fn(say_hello, bus_config)
     elif command == "debug_motor":
-        run_threaded_fn(debug_motor)
+        run_threaded_fn(debug_motor, bus_config)
     elif command == "debug_bc_motors":
-        run_threaded_fn(debug_bc_motors)
\ No newline at end of file
+        run_threaded_fn(debug_bc_motors, bus_config)
\ No newline at end of file
@@ -0,0 +1,237 @@
+"""
+Encoder/decoder of the MKS servo CAN frames.
+
+Every frame is ``[opcode, fields..., crc]`` where crc is the low byte of
+``can_id + sum(opcode and fields)``. Each opcode has a precompiled
+:class:`struct.Struct` layout per direction; signed 24 bit fields (relative
+and absolute axis values) are packed as the top three bytes of a 32 bit
+word whose low byte is the crc slot.
+"""
+import struct
+from typing import Dict, Optional, Tuple, Union
+
+import can
+
+from constants import CMD_READ_ENCODER, CMD_GO_HOME, CMD_SET_ZERO, CMD_SET_ENABLE, CMD_REMAP, CMD_MOTOR_STATUS, \
+    CMD_RELATIVE_TURN, CMD_RUN_MOTOR, CMD_GET_CURRENT_SPEED, CMD_ABSOLUTE_TURN, CMD_EMERGENCY_STOP, \
+    CMD_SET_WORK_CURRENT, CMD_SET_SUBDIVISION, CMD_SET_HOME_PARAMS
+
+
+# Encoder counts per motor shaft turn: CMD_READ_ENCODER replies (value wraps into carry)
+# and the axis values of CMD_RELATIVE_TURN / CMD_ABSOLUTE_TURN
+ENCODER_COUNTS = 0x4000
+
+
+class ChecksumError(ValueError):
+    def __init__(self, message: can.Message) -> None:
+        super().__init__(f"Bad checksum in frame from 0x{message.arbitration_id:X}: {bytes(message.data).hex()}")
+        self.message = message
+
+
+class Layout:
+    __slots__ = ('opcode', 'struct', 'int24', 'size')
+
+    def __init__(self, opcode: int, fields: str, int24: bool = False) -> None:
+        """
+        :param opcode: Command byte.
+        :param fields: struct format of the fields after the opcode (big endian).
+        :param int24: The last field is a signed 24 bit value, ``fields`` must end with ``I``.
+        """
+        self.opcode = opcode
+        self.struct = struct.Struct('>B' + fields)
+        self.int24 = int24
+        # Frame length including the crc byte
+        self.size = self.struct.size if int24 else self.struct.size + 1
+
+
+# Opcode -> layout of the command sent to the motor
+REQUEST_LAYOUTS: Dict[int, Layout] = {layout.opcode: layout for layout in [
+    Layout(CMD_READ_ENCODER, ''),
+    Layout(CMD_GET_CURRENT_SPEED, ''),
+    Layout(CMD_MOTOR_STATUS, ''),
+    Layout(CMD_SET_ZERO, ''),
+    Layout(CMD_GO_HOME, ''),
+    Layout(CMD_EMERGENCY_STOP, ''),
+    Layout(CMD_SET_ENABLE, 'B'),
+    Layout(CMD_REMAP, 'B'),
+    # speed, acc, relative / absolute axis
+    Layout(CMD_RELATIVE_TURN, 'HBI', int24=True),
+    Layout(CMD_ABSOLUTE_TURN, 'HBI', int24=True),
+    # direction (bit 15) and speed (bits 0-11), acc
+    Layout(CMD_RUN_MOTOR, 'HB'),
+    # current in mA
+    Layout(CMD_SET_WORK_CURRENT, 'H'),
+    Layout(CMD_SET_SUBDIVISION, 'B'),
+    # trigger level, direction, speed, end limit enable
+    Layout(CMD_SET_HOME_PARAMS, 'BBHB'),
+]}
+
+# Opcode -> layout of the reply sent by the motor
+REPLY_LAYOUTS: Dict[int, Layout] = {layout.opcode: layout for layout in [
+    # carry, value
+    Layout(CMD_READ_ENCODER, 'iH'),
+    Layout(CMD_GET_CURRENT_SPEED, 'h'),
+    *[Layout(opcode, 'B') for opcode in [
+        CMD_MOTOR_STATUS, CMD_SET_ZERO, CMD_GO_HOME, CMD_EMERGENCY_STOP, CMD_SET_ENABLE, CMD_REMAP,
+        CMD_RELATIVE_TURN, CMD_ABSOLUTE_TURN, CMD_RUN_MOTOR, CMD_SET_WORK_CURRENT, CMD_SET_SUBDIVISION,
+        CMD_SET_HOME_PARAMS,
+    ]],
+]}
+
+
+class EncoderReply:
+    __slots__ = ('can_id', 'opcode', 'carry', 'value')
+
+    def __init__(self, can_id: int, opcode: int, carry: int, value: int) -> None:
+        self.can_id = can_id
+        self.opcode = opcode
+        self.carry = carry
+        self.value = value
+
+    def __repr__(self):
+        return f"EncoderReply(can_id={self.can_id}, carry={self.carry}, value={self.value})"
+
+    @property
+    def counts(self) -> int:
+        """Multi-turn encoder position, ENCODER_COUNTS per motor shaft turn."""
+        return self.carry * ENCODER_COUNTS + self.value
+
+
+class SpeedReply:
+    __slots__ = ('can_id', 'opcode', 'speed')
+
+    def __init__(self, can_id: int, opcode: int, speed: int) -> None:
+        self.can_id = can_id
+        self.opcode = opcode
+        self.speed = speed
+
+    def __repr__(self):
+        return f"SpeedReply(can_id={self.can_id}, speed={self.speed})"
+
+
+class StatusReply:
+    __slots__ = ('can_id', 'opcode', 'status')
+
+    def __init__(self, can_id: int, opcode: int, status: int) -> None:
+        self.can_id = can_id
+        self.opcode = opcode
+        self.status = status
+
+    def __repr__(self):
+        return f"StatusReply(can_id={self.can_id}, opcode=0x{self.opcode:02X}, status=0x{self.status:02X})"
+
+
+Reply = Union[EncoderReply, SpeedReply, StatusReply]
+
+_reply_records = {
+    CMD_READ_ENCODER: EncoderReply,
+    CMD_GET_CURRENT_SPEED: SpeedReply,
+}
+
+
+def _new_message(can_id: int, size: int) -> can.Message:
+    return can.Message(arbitration_id=can_id, data=bytearray(size), is_extended_id=False)
+
+
+def _encode(layout: Layout, can_id: int, values: Tuple[int, ...], message: Optional[can.Message]) -> can.Message:
+    if message is None or len(message.data) != layout.size:
+        message = _new_message(can_id, layout.size)
+    data = message.data
+    if layout.int24:
+        *head, value = values
+        layout.struct.pack_into(data, 0, layout.opcode, *head, (value & 0xFFFFFF) << 8)
+    else:
+        layout.struct.pack_into(data, 0, layout.opcode, *values)
+    data[-1] = (can_id + sum(data) - data[-1]) & 0xFF
+    return message
+
+
+def encode_request(can_id: int, opcode: int, *values: int, message: Optional[can.Message] = None) -> can.Message:
+    """
+    Build a command frame.
+
+    :param can_id: CAN id of the motor.
+    :param opcode: Command byte, one of REQUEST_LAYOUTS.
+    :param values: Fields of the command, in layout order.
+    :param message: Message to encode into (reused buffer), a new one is created when None.
+    :return: The encoded message.
+    """
+    return _encode(REQUEST_LAYOUTS[opcode], can_id, values, message)
+
+
+def encode_reply(can_id: int, opcode: int, *values: int, message: Optional[can.Message] = None) -> can.Message:
+    """
+    Build a reply frame, as sent by a motor (used by the simulator).
+    """
+    return _encode(REPLY_LAYOUTS[opcode], can_id, values, message)
+
+
+def has_valid_checksum(message: can.Message) -> bool:
+    data = message.data
+    if len(data) < 2:
+        return False
+    return (message.arbitration_id + sum(data) - data[-1]) & 0xFF == data[-1]
+
+
+def decode_reply(message: can.Message) -> Optional[Reply]:
+    """
+    Decode a motor reply into a record.
+
+    :param message: Received frame.
+    :return: EncoderReply, SpeedReply or StatusReply, None for opcodes without a reply layout or short frames.
+    :raises ChecksumError: The crc byte doesn't match.
+    """
+    data = message.data
+    if not data:
+        return None
+    layout = REPLY_LAYOUTS.get(data[0])
+    if layout is None or len(data) < layout.size:
+        return None
+    if not has_valid_checksum(message):
+        raise ChecksumError(message)
+    fields = layout.struct.unpack_from(memoryview(data))
+    record = _reply_records.get(layout.opcode, StatusReply)
+    return record(message.arbitration_id, *fields)
+
+
+def decode_request(message: can.Message) -> Optional[Tuple[int, ...]]:
+    """
+    Decode a command frame into (opcode, fields...), None for unknown opcodes or short frames.
+
+    :raises ChecksumError: The crc byte doesn't match.
+    """
+    data = message.data
+    if not data:
+        return None
+    layout = REQUEST_LAYOUTS.get(data[0])
+    if layout is None or len(data) < layout.size:
+        return None
+    if not has_valid_checksum(message):
+        raise ChecksumError(message)
+    fields = layout.struct.unpack_from(memoryview(data))
+    if layout.int24:
+        *head, word = fields
+        value = word >> 8
+        return (*head, value - 0x1000000 if value & 0x800000 else value)
+    return fields
+
+
+class MessagePool:
+    def __init__(self, can_id: int) -> None:
+        """
+        One reusable message per opcode for a device.
+
+        Only use it when the frame is sent before the next encode of the same
+        opcode, e.g. a synchronous bus.send. Commands without fields encode
+        to the same bytes every time, so their message is effectively constant.
+
+        :param can_id: CAN id of the device.
+        """
+        self.can_id = can_id
+        self._messages: Dict[int, can.Message] = {}
+
+    def request(self, opcode: int, *values: int) -> can.Message:
+        message = self._messages.get(opcode)
+        message = encode_request(self.can_id, opcode, *values, message=message)
+        self._messages[opcode] = message
+        return message
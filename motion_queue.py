@@ -0,0 +1,226 @@
+"""
+Per-motor queue of turns that sends the next turn as soon as the previous one stops.
+
+:class:`MotionQueue` keeps the turns of one motor and sends the next one from
+the receive path when the "stopped" (0x02) reply of the current turn arrives,
+so consecutive turns are one bus round trip apart instead of a fixed timeout.
+"""
+import threading
+from collections import deque
+from concurrent.futures import Future
+from typing import Deque, List, Optional
+
+from base_motor import BaseMotor
+
+TURN_STOPPED = 0x02
+TURN_ENDSTOP = 0x03
+TURN_FAILED = 0x00
+
+
+class QueuedTurn:
+    def __init__(self, degrees: float, absolute: bool, speed: int, acc: int) -> None:
+        # Joint degrees: a target position when absolute, else a relative turn
+        self.degrees = degrees
+        self.absolute = absolute
+        self.speed = speed
+        self.acc = acc
+        # Resolved with the final status (0x02 stopped, 0x03 endstop, 0x00 failed)
+        self.future: Future = Future()
+
+
+class MotionQueue:
+    def __init__(self, motor: BaseMotor, blend: bool = False) -> None:
+        """
+        Turn queue of one motor. The motor must be attached to a running receive path (Arctos).
+
+        :param motor: Motor to turn, its position must be known (homed or set zero).
+        :param blend: Send consecutive queued turns in the same direction as one turn,
+            with the speed and acceleration of the last one. The motor does not stop
+            at the intermediate positions.
+        """
+        self.motor = motor
+        self.blend = blend
+        self._lock = threading.Lock()
+        self._queued: Deque[QueuedTurn] = deque()
+        # Turns sent as the current frame, empty when idle
+        self._active: List[QueuedTurn] = []
+        # Joint position once every sent and queued turn is done
+        self._target: Optional[float] = None
+        self._idle = threading.Event()
+        self._idle.set()
+        # Turn frames sent and turns merged into them
+        self.frames = 0
+        self.blended = 0
+
+    def __len__(self) -> int:
+        """
+        Number of turns waiting to be sent (the one running is not counted).
+        """
+        with self._lock:
+            return len(self._queued)
+
+    @property
+    def depth(self) -> int:
+        """
+        Number of turns not done yet, the running ones included.
+        """
+        with self._lock:
+            return len(self._queued) + len(self._active)
+
+    @property
+    def target(self) -> Optional[float]:
+        """
+        Joint position reached once the queue is empty.
+        """
+        with self._lock:
+            return self.motor.position if self._target is None else self._target
+
+    def relative(self, degrees: float, speed: int = 1000, acc: int = 200) -> Future:
+        """
+        Queue a relative turn.
+
+        :param degrees: Joint degrees from the position reached by the previous turn.
+        :return: Future resolved with the final status of the turn.
+        """
+        return self._add(QueuedTurn(degrees, False, speed, acc))
+
+    def absolute(self, position: float, speed: int = 1000, acc: int = 200) -> Future:
+        """
+        Queue a turn to a joint position. It is sent as the relative turn from the
+        position reached by the previous turn.
+
+        :param position: Joint degrees.
+        :return: Future resolved with the final status of the turn.
+        """
+        return self._add(QueuedTurn(position, True, speed, acc))
+
+    def _add(self, turn: QueuedTurn) -> Future:
+        assert self.motor.position is not None, 'Position is not set. First call go_home'
+        with self._lock:
+            if self._target is None:
+                self._target = self.motor.position
+            self._target = turn.degrees if turn.absolute else self._target + turn.degrees
+            self._queued.append(turn)
+            self._idle.clear()
+        self._advance()
+        return turn.future
+
+    def _next_frame(self, position: float) -> List[QueuedTurn]:
+        """
+        Pop the turns of the next frame. Called with the lock held.
+        """
+        turns = [self._queued.popleft()]
+        if self.blend:
+            end = self._end(turns[0], position)
+            direction = end > position
+            while self._queued:
+                following = self._end(self._queued[0], end)
+                if following != end and (following > end) != direction:
+                    break
+                end = following
+                turns.append(self._queued.popleft())
+        return turns
+
+    @staticmethod
+    def _end(turn: QueuedTurn, position: float) -> float:
+        return turn.degrees if turn.absolute else position + turn.degrees
+
+    @classmethod
+    def _rotation(cls, turns: List[QueuedTurn], position: float) -> float:
+        end = position
+        for turn in turns:
+            end = cls._end(turn, end)
+        return end - position
+
+    def _advance(self) -> None:
+        with self._lock:
+            if self._active or not self._queued:
+                return
+            position = self.motor.position
+            if position is None:
+                # Lost by a failed turn or a homing in between
+                self._active = list(self._queued)
+                self._queued.clear()
+            else:
+                self._active = self._next_frame(position)
+                last = self._active[-1]
+                rotation = self._rotation(self._active, position)
+                self.frames += 1
+                self.blended += len(self._active) - 1
+        if position is None:
+            self._finish(None, AssertionError('Position is not set. First call go_home'))
+            return
+        # Outside the lock: a fast reply may complete the future before the callback is added
+        try:
+            future = self.motor.start_turn(rotation, speed=last.speed, acc=last.acc)
+        except Exception as e:
+            self._finish(None, e)
+            return
+        future.add_done_callback(self._on_turn_done)
+
+    def _on_turn_done(self, future: Future) -> None:
+        if future.cancelled():
+            self._finish(None, RuntimeError(f'Motor {self.motor.can_id}: turn cancelled'))
+            return
+        exception = future.exception()
+        if exception is not None:
+            self._finish(None, exception)
+            return
+        replies = future.result()
+        status = replies[-1].data[1] if replies and len(replies[-1].data) > 1 else TURN_FAILED
+        self._finish(status, None)
+
+    def _finish(self, status: Optional[int], exception: Optional[BaseException]) -> None:
+        with self._lock:
+            turns, self._active = self._active, []
+            dropped: List[QueuedTurn] = []
+            if status != TURN_STOPPED:
+                # The motor is not where the next turns expect it: drop them
+                dropped = list(self._queued)
+                self._queued.clear()
+                self._target = None
+            idle = not self._queued
+            if idle:
+                self._target = None
+        for turn in turns:
+            if not turn.future.set_running_or_notify_cancel():
+                continue
+            if exception is not None:
+                turn.future.set_exception(exception)
+            else:
+                turn.future.set_result(status)
+        if dropped:
+            print(f"Motor {self.motor.can_id}: turn ended with status {status}, {len(dropped)} queued turns dropped")
+        for turn in dropped:
+            turn.future.cancel()
+        if idle:
+            self._idle.set()
+        else:
+            self._advance()
+
+    def clear(self) -> int:
+        """
+        Drop the turns not sent yet. The running turn is not stopped (see BaseMotor.emergency_stop).
+
+        :return: Number of turns dropped.
+        """
+        with self._lock:
+            dropped = list(self._queued)
+            self._queued.clear()
+            if self._active:
+                self._target = self.motor.position + self._rotation(self._active, self.motor.position) \
+                    if self.motor.position is not None else None
+            else:
+                self._target = None
+                self._idle.set()
+        for turn in dropped:
+            turn.future.cancel()
+        return len(dropped)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until every queued turn is done.
+
+        :return: False on timeout.
+        """
+        return self._idle.wait(timeout)
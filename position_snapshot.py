@@ -0,0 +1,123 @@
+"""
+On-disk snapshot of the arm position for restarts without homing.
+
+The snapshot holds, per axis, the last joint position, the zero point and
+the encoder offset (joint degrees at encoder 0), plus a clean flag that is
+only true after a controlled shutdown with every motor idle. On startup one
+encoder read per axis checks that the motors were not moved or power cycled
+in between.
+"""
+import json
+import os
+import time
+from concurrent.futures import wait
+from typing import Dict, List, Optional
+
+from base_motor import BaseMotor, MotorStatus
+
+SNAPSHOT_VERSION = 1
+DEFAULT_SNAPSHOT_PATH = 'arctos_snapshot.json'
+
+
+def save_snapshot(path: str, motors: Dict[str, BaseMotor], clean: bool) -> None:
+    """
+    Write the snapshot atomically (temporary file then rename).
+
+    :param path: Snapshot file.
+    :param motors: Axis -> motor.
+    :param clean: Controlled shutdown. Forced to False when a motor is not idle.
+    """
+    axes = {}
+    for axis, motor in motors.items():
+        if motor.position is None or motor.encoder_offset is None:
+            continue
+        if motor.status != MotorStatus.OK or motor.pending_degrees is not None:
+            clean = False
+        axes[axis] = {
+            'position': motor.position,
+            'zero_point': motor.zero_point,
+            'encoder_offset': motor.encoder_offset,
+        }
+    _write(path, {'version': SNAPSHOT_VERSION, 'clean': clean, 'time': time.time(), 'axes': axes})
+
+
+def _write(path: str, snapshot: Dict) -> None:
+    temporary = f'{path}.tmp'
+    with open(temporary, 'w') as f:
+        json.dump(snapshot, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary, path)
+
+
+def load_snapshot(path: str) -> Optional[Dict]:
+    """
+    Read a snapshot.
+
+    :return: The snapshot, None when missing, unreadable or of another version.
+    """
+    try:
+        with open(path) as f:
+            snapshot = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(snapshot, dict) or snapshot.get('version') != SNAPSHOT_VERSION:
+        return None
+    return snapshot
+
+
+def mark_dirty(path: str) -> None:
+    """
+    Clear the clean flag, so a crash before the next controlled shutdown forces homing.
+    """
+    snapshot = load_snapshot(path)
+    if snapshot is None or not snapshot['clean']:
+        return
+    snapshot['clean'] = False
+    _write(path, snapshot)
+
+
+def restore_positions(snapshot: Dict,
+                      motors: Dict[str, BaseMotor],
+                      tolerance: float = 0.5,
+                      timeout: float = 0.5) -> List[str]:
+    """
+    Restore the positions of a clean snapshot that the encoders confirm.
+
+    For each axis the saved encoder offset is applied and the encoder is read
+    once (all axes at once). When the resulting joint position is within
+    tolerance of the saved one, the motor is ready without homing.
+
+    :param snapshot: Snapshot from load_snapshot.
+    :param motors: Axis -> motor, attached to a running receive path.
+    :param tolerance: Max difference in joint degrees.
+    :param timeout: Max time in seconds to wait for the encoder replies.
+    :return: Axes restored.
+    """
+    if not snapshot.get('clean'):
+        return []
+    saved = {axis: values for axis, values in snapshot['axes'].items()
+             if axis in motors and motors[axis].zero_point == values['zero_point']}
+    futures = {}
+    for axis, values in saved.items():
+        motor = motors[axis]
+        motor.encoder_offset = values['encoder_offset']
+        futures[axis] = motor.start_read_encoder()
+    wait(list(futures.values()), timeout=timeout)
+
+    restored = []
+    for axis, future in futures.items():
+        motor = motors[axis]
+        answered = future.done()
+        if not answered:
+            future.cancel()
+        position = saved[axis]['position']
+        if answered and motor.encoder_position is not None and abs(motor.encoder_position - position) <= tolerance:
+            motor.position = motor.encoder_position
+            motor.status = MotorStatus.OK
+            restored.append(axis)
+        else:
+            print(f"Motor {motor.can_id}: encoder does not match the snapshot, homing needed")
+            motor.encoder_offset = None
+            motor.encoder_position = None
+    return restored
@@ -0,0 +1,404 @@
+"""
+Simulated Arctos CAN nodes: the six MKS servo motor controllers and the
+gripper/LED board, answering on a python-can bus (``virtual`` or ``vcan``).
+
+Run from the repository root, e.g. next to a program using the same channel::
+
+    python simulator.py --interface socketcan --channel vcan0
+"""
+import argparse
+import heapq
+import itertools
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import can
+
+from base_motor import BaseMotor
+from constants import CMD_READ_ENCODER, CMD_GO_HOME, CMD_SET_ZERO, CMD_SET_ENABLE, CMD_REMAP, CMD_MOTOR_STATUS, \
+    CMD_RELATIVE_TURN, CMD_RUN_MOTOR, CMD_GET_CURRENT_SPEED, CMD_ABSOLUTE_TURN, CMD_EMERGENCY_STOP, \
+    CMD_SET_WORK_CURRENT, CMD_SET_SUBDIVISION, CMD_SET_HOME_PARAMS, GRIPPER_ID, LED_ID
+from mks_codec import ChecksumError, ENCODER_COUNTS, decode_request, encode_reply
+from motors import XMotor, YMotor, ZMotor, AMotor, BMotor, CMotor
+from trajectory_planner import trapezoidal_min_time, DEGREES_PER_SECOND_PER_RPM, ACC_TICK
+
+# CMD_MOTOR_STATUS replies
+MOTOR_STATUS_STOPPED = 0x01
+MOTOR_STATUS_RUNNING = 0x04
+MOTOR_STATUS_HOMING = 0x05
+
+
+def motor_acceleration(acc: int) -> float:
+    """
+    Motor shaft acceleration in deg/s^2 for a firmware acc byte, 0 meaning no ramp.
+    """
+    if acc == 0:
+        return float('inf')
+    return DEGREES_PER_SECOND_PER_RPM / ((256 - acc) * ACC_TICK)
+
+
+def motion_duration(rotation: float, speed: int, acc: int) -> float:
+    """
+    Duration in seconds of a relative turn of the motor shaft by rotation degrees.
+    """
+    if rotation == 0:
+        return 0.0
+    if speed <= 0:
+        return float('inf')
+    duration, _ = trapezoidal_min_time(rotation, speed * DEGREES_PER_SECOND_PER_RPM, motor_acceleration(acc))
+    return float(duration)
+
+
+class SimulatedMotor:
+    def __init__(self, motor: BaseMotor, home_duration: float = 0.5) -> None:
+        """
+        State of one simulated MKS servo controller.
+
+        Angles are motor shaft degrees relative to the firmware zero. Joint
+        positions use the coordinates of BaseMotor.position: homing puts the
+        joint at -zero_point, set zero at 0.
+
+        :param motor: Driver side motor, gives the CAN id, ratio, zero point and limits.
+        :param home_duration: Seconds taken by the homing sequence.
+        """
+        self.can_id = motor.can_id
+        self.ratio = motor.ratio
+        self.zero_point = motor.zero_point
+        self.left_limit = motor.left_limit
+        self.right_limit = motor.right_limit
+        self.home_duration = home_duration
+
+        self.enabled = True
+        self.homing = False
+        self.joint_offset = 0.0
+        # Linear motion from start_angle at start_time, at velocity deg/s, until end_time
+        self.start_angle = 0.0
+        self.start_time = 0.0
+        self.velocity = 0.0
+        self.end_time = 0.0
+        # Signed firmware speed (RPM) of the current motion
+        self.speed = 0
+        # Scheduled completion of the current motion, cancelled when it is preempted
+        self.motion_event: Optional[List] = None
+        # Opcode of the command the current motion_event completes (go home, relative or absolute turn)
+        self.motion_opcode: Optional[int] = None
+
+    def angle(self, now: float) -> float:
+        elapsed = min(now, self.end_time) - self.start_time
+        return self.start_angle + self.velocity * max(0.0, elapsed)
+
+    def joint(self, now: float) -> float:
+        return self.angle(now) / self.ratio + self.joint_offset
+
+    def is_moving(self, now: float) -> bool:
+        return now < self.end_time
+
+    def current_speed(self, now: float) -> int:
+        return self.speed if self.is_moving(now) else 0
+
+    def hold(self, now: float) -> None:
+        self.start_angle = self.angle(now)
+        self.start_time = now
+        self.end_time = now
+        self.velocity = 0.0
+        self.speed = 0
+
+    def move(self, now: float, velocity: float, duration: float, speed: int) -> None:
+        """
+        Start a motion at velocity deg/s for duration seconds, reported as firmware speed.
+        """
+        self.start_angle = self.angle(now)
+        self.start_time = now
+        self.end_time = now + duration
+        self.velocity = velocity
+        self.speed = speed
+
+    def limit_rotation(self, now: float, rotation: float) -> Optional[float]:
+        """
+        Rotation stopping at the endstop crossed by the move, None when no endstop is crossed.
+        """
+        joint = self.joint(now)
+        target = joint + rotation / self.ratio
+        if rotation > 0 and self.right_limit is not None and joint < self.right_limit < target:
+            return (self.right_limit - joint) * self.ratio
+        if rotation < 0 and self.left_limit is not None and joint > self.left_limit > target:
+            return (self.left_limit - joint) * self.ratio
+        return None
+
+    def set_zero(self, now: float) -> None:
+        self.hold(now)
+        self.start_angle = 0.0
+        self.joint_offset = 0.0
+
+    def encoder(self, now: float):
+        counts = round(self.angle(now) * ENCODER_COUNTS / 360)
+        return counts // ENCODER_COUNTS, counts % ENCODER_COUNTS
+
+
+class ArctosSimulator:
+    def __init__(self,
+                 bus: can.interface.Bus,
+                 motors: Optional[List[BaseMotor]] = None,
+                 ack_delay: float = 0.001,
+                 time_scale: float = 1.0,
+                 home_duration: float = 0.5) -> None:
+        """
+        Emulate the Arctos motor controllers and gripper/LED board on a bus.
+
+        Every command gets its first reply after ack_delay. Moves complete
+        after the duration the firmware would take for their speed and acc,
+        scaled by time_scale, or earlier at an endstop.
+
+        :param bus: Bus to answer on, e.g. can.Bus(interface='virtual', channel=...).
+        :param motors: Driver side motors to emulate, defaults to the six Arctos axes.
+        :param ack_delay: Seconds before the first reply of a command.
+        :param time_scale: Multiplier of motion and homing durations, < 1 to run faster than real time.
+        :param home_duration: Seconds taken by the homing sequence (before scaling).
+        """
+        self._bus = bus
+        if motors is None:
+            motors = [cls(None) for cls in (XMotor, YMotor, ZMotor, AMotor, BMotor, CMotor)]
+        self.motors: Dict[int, SimulatedMotor] = {
+            motor.can_id: SimulatedMotor(motor, home_duration * time_scale) for motor in motors
+        }
+        self.ack_delay = ack_delay
+        self.time_scale = time_scale
+        self.gripper_position: Optional[int] = None
+        self.led_colors: List[int] = []
+        self.frames_received = 0
+        self.bad_checksums = 0
+
+        # Opcode -> handler called with the decoded (opcode, fields...) of the command
+        self._handlers: Dict[int, Callable[[SimulatedMotor, Tuple[int, ...], float], None]] = {
+            CMD_READ_ENCODER: self._on_read_encoder,
+            CMD_GET_CURRENT_SPEED: self._on_get_current_speed,
+            CMD_MOTOR_STATUS: self._on_motor_status,
+            CMD_SET_ENABLE: self._on_ack,
+            CMD_REMAP: self._on_ack,
+            CMD_SET_WORK_CURRENT: self._on_ack,
+            CMD_SET_SUBDIVISION: self._on_ack,
+            CMD_SET_HOME_PARAMS: self._on_ack,
+            CMD_EMERGENCY_STOP: self._on_emergency_stop,
+            CMD_ABSOLUTE_TURN: self._on_absolute_turn,
+            CMD_SET_ZERO: self._on_set_zero,
+            CMD_GO_HOME: self._on_go_home,
+            CMD_RELATIVE_TURN: self._on_relative_turn,
+            CMD_RUN_MOTOR: self._on_run_motor,
+        }
+        # Heap of [time, sequence, callback]; callback is set to None to cancel
+        self._events: List[List] = []
+        self._sequence = itertools.count()
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> 'ArctosSimulator':
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True, name='arctos simulator')
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+
+    def __enter__(self) -> 'ArctosSimulator':
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.stop()
+
+    def joint_position(self, can_id: int) -> float:
+        """
+        Simulated joint position in BaseMotor.position coordinates.
+        """
+        return self.motors[can_id].joint(time.monotonic())
+
+    def _schedule(self, delay: float, callback: Callable[[], None]) -> List:
+        event = [time.monotonic() + delay, next(self._sequence), callback]
+        heapq.heappush(self._events, event)
+        return event
+
+    def _reply(self, can_id: int, opcode: int, *values: int, delay: Optional[float] = None) -> None:
+        message = encode_reply(can_id, opcode, *values)
+        self._schedule(self.ack_delay if delay is None else delay, lambda: self._bus.send(message))
+
+    def _run(self) -> None:
+        while self._running:
+            now = time.monotonic()
+            while self._events and self._events[0][0] <= now:
+                _, _, callback = heapq.heappop(self._events)
+                if callback is not None:
+                    callback()
+            timeout = 0.05
+            if self._events:
+                timeout = min(timeout, max(0.0, self._events[0][0] - time.monotonic()))
+            message = self._bus.recv(timeout=timeout)
+            if message is not None:
+                self._on_message(message)
+
+    def _on_message(self, message: can.Message) -> None:
+        if message.is_error_frame or message.is_remote_frame or not message.data:
+            return
+        self.frames_received += 1
+        can_id = message.arbitration_id
+        if can_id == GRIPPER_ID:
+            self.gripper_position = message.data[0]
+            return
+        if can_id == LED_ID:
+            self._on_led(message)
+            return
+        motor = self.motors.get(can_id)
+        if motor is None:
+            return
+        try:
+            command = decode_request(message)
+        except ChecksumError:
+            self.bad_checksums += 1
+            return
+        handler = self._handlers.get(command[0]) if command else None
+        if handler:
+            handler(motor, command, time.monotonic())
+
+    def _on_led(self, message: can.Message) -> None:
+        if message.data[0] != 0x02:
+            return
+        colors = []
+        for byte in message.data[1:7]:
+            colors.extend([(byte >> 4) & 0x0F, byte & 0x0F])
+        self.led_colors = colors[:11]
+
+    def _on_ack(self, motor: SimulatedMotor, command: Tuple[int, ...], now: float) -> None:
+        self._reply(motor.can_id, command[0], 0x01)
+
+    def _on_read_encoder(self, motor: SimulatedMotor, command: Tuple[int, ...], now: float) -> None:
+        carry, value = motor.encoder(now)
+        self._reply(motor.can_id, CMD_READ_ENCODER, carry, value)
+
+    def _on_get_current_speed(self, motor: SimulatedMotor, command: Tuple[int, ...], now: float) -> None:
+        self._reply(motor.can_id, CMD_GET_CURRENT_SPEED, motor.current_speed(now))
+
+    def _on_motor_status(self, motor: SimulatedMotor, command: Tuple[int, ...], now: float) -> None:
+        if motor.homing:
+            status = MOTOR_STATUS_HOMING
+        elif motor.is_moving(now):
+            status = MOTOR_STATUS_RUNNING
+        else:
+            status = MOTOR_STATUS_STOPPED
+        self._reply(motor.can_id, CMD_MOTOR_STATUS, status)
+
+    def _on_set_zero(self, motor: SimulatedMotor, command: Tuple[int, ...], now: float) -> None:
+        self._cancel_motion(motor)
+        motor.set_zero(now)
+        self._reply(motor.can_id, CMD_SET_ZERO, 0x01)
+
+    def _cancel_motion(self, motor: SimulatedMotor) -> None:
+        if motor.motion_event is not None:
+            motor.motion_event[2] = None
+            motor.motion_event = None
+            motor.motion_opcode = None
+        motor.homing = False
+
+    def _on_emergency_stop(self, motor: SimulatedMotor, command: Tuple[int, ...], now: float) -> None:
+        # The interrupted command ends now and failed: it did not reach its target
+        opcode = motor.motion_opcode
+        self._cancel_motion(motor)
+        motor.hold(now)
+        self._reply(motor.can_id, CMD_EMERGENCY_STOP, 0x01)
+        if opcode is not None:
+            self._reply(motor.can_id, opcode, 0x00)
+
+    def _on_go_home(self, motor: SimulatedMotor, command: Tuple[int, ...], now: float) -> None:
+        self._cancel_motion(motor)
+        motor.hold(now)
+        motor.homing = True
+        self._reply(motor.can_id, CMD_GO_HOME, 0x01)
+
+        def home_found():
+            motor.homing = False
+            motor.motion_event = None
+            motor.motion_opcode = None
+            motor.set_zero(time.monotonic())
+            motor.joint_offset = -motor.zero_point
+            self._bus.send(encode_reply(motor.can_id, CMD_GO_HOME, 0x02))
+
+        motor.motion_event = self._schedule(self.ack_delay + motor.home_duration, home_found)
+        motor.motion_opcode = CMD_GO_HOME
+
+    def _on_relative_turn(self, motor: SimulatedMotor, command: Tuple[int, ...], now: float) -> None:
+        _, speed, acc, pulses = command
+        self._turn(motor, CMD_RELATIVE_TURN, pulses * 360 / ENCODER_COUNTS, speed, acc, now)
+
+    def _on_absolute_turn(self, motor: SimulatedMotor, command: Tuple[int, ...], now: float) -> None:
+        # The absolute axis counts from the firmware zero (set zero or home)
+        _, speed, acc, pulses = command
+        self._turn(motor, CMD_ABSOLUTE_TURN, pulses * 360 / ENCODER_COUNTS - motor.angle(now), speed, acc, now)
+
+    def _turn(self, motor: SimulatedMotor, opcode: int, rotation: float, speed: int, acc: int, now: float) -> None:
+        self._cancel_motion(motor)
+        self._reply(motor.can_id, opcode, 0x01)
+        status = 0x02
+        limited = motor.limit_rotation(now, rotation)
+        if limited is not None:
+            rotation = limited
+            status = 0x03
+        duration = motion_duration(rotation, speed, acc) * self.time_scale
+        if duration > 0:
+            motor.move(now, rotation / duration, duration, speed if rotation > 0 else -speed)
+        else:
+            motor.move(now, 0.0, 0.0, 0)
+            motor.start_angle += rotation
+
+        def finished():
+            motor.motion_event = None
+            motor.motion_opcode = None
+            self._bus.send(encode_reply(motor.can_id, opcode, status))
+
+        motor.motion_event = self._schedule(max(duration, self.ack_delay), finished)
+        motor.motion_opcode = opcode
+
+    def _on_run_motor(self, motor: SimulatedMotor, command: Tuple[int, ...], now: float) -> None:
+        _, direction_speed, acc = command
+        direction = 1 if direction_speed & 0x8000 else -1
+        speed = direction_speed & 0x0FFF
+        self._cancel_motion(motor)
+        if speed == 0:
+            # Stop: "stopping" now, "stopped" once decelerated
+            speed_now = motor.current_speed(now)
+            stop_time = abs(speed_now) * DEGREES_PER_SECOND_PER_RPM / motor_acceleration(acc) * self.time_scale
+            motor.hold(now)
+            self._reply(motor.can_id, CMD_RUN_MOTOR, 0x01)
+            self._reply(motor.can_id, CMD_RUN_MOTOR, 0x02, delay=self.ack_delay + stop_time)
+            return
+
+        velocity = direction * speed * DEGREES_PER_SECOND_PER_RPM / self.time_scale
+        self._reply(motor.can_id, CMD_RUN_MOTOR, 0x01)
+        # Run until stopped or until the endstop in the direction of motion
+        limited = motor.limit_rotation(now, velocity * 1e6)
+        duration = abs(limited / velocity) if limited is not None else float('inf')
+        motor.move(now, velocity, duration, direction * speed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate the Arctos motor controllers on a CAN bus")
+    parser.add_argument("--interface", default="socketcan", help="python-can interface, e.g. socketcan or virtual")
+    parser.add_argument("--channel", default="vcan0", help="Channel to answer on")
+    parser.add_argument("--time-scale", type=float, default=1.0, help="Multiplier of motion durations")
+    args = parser.parse_args()
+
+    bus = can.Bus(interface=args.interface, channel=args.channel)
+    simulator = ArctosSimulator(bus, time_scale=args.time_scale).start()
+    print(f"Simulating Arctos on {args.interface}:{args.channel}, Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    simulator.stop()
+    bus.shutdown()
+
+
+if __name__ == "__main__":
+    main()
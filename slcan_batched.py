@@ -0,0 +1,175 @@
+"""
+slcan transport that batches serial I/O.
+
+python-can's slcan bus writes (and flushes) every frame on its own and reads
+the serial port one byte at a time. :class:`BatchedSlcanBus` keeps the same
+adapter protocol but appends frames to a buffer written in one call, and
+parses every complete frame of a large read at once.
+"""
+import contextlib
+import select
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+
+from can import Message
+from can.interfaces.slcan import slcanBus
+
+# Lines of the adapter that are not frames: command acks ('z', 'Z', empty) and errors (bell)
+_FRAME_TYPES = b'tTrRx'
+
+
+def encode_frame(message: Message) -> bytes:
+    """
+    slcan line of a frame, terminator included.
+    """
+    if message.is_remote_frame:
+        if message.is_extended_id:
+            return f"R{message.arbitration_id:08X}{message.dlc:d}\r".encode()
+        return f"r{message.arbitration_id:03X}{message.dlc:d}\r".encode()
+    if message.is_extended_id:
+        head = f"T{message.arbitration_id:08X}{message.dlc:d}"
+    else:
+        head = f"t{message.arbitration_id:03X}{message.dlc:d}"
+    return (head + message.data.hex().upper() + "\r").encode()
+
+
+def parse_frame(line: bytes, timestamp: float) -> Optional[Message]:
+    """
+    Frame of an slcan line without its terminator, None for acks and unknown lines.
+    """
+    if not line or line[0] not in _FRAME_TYPES:
+        return None
+    kind = chr(line[0])
+    extended = kind in 'TRx'
+    id_end = 9 if extended else 4
+    try:
+        arbitration_id = int(line[1:id_end], 16)
+        dlc = int(line[id_end:id_end + 1])
+        remote = kind in 'rR'
+        data = None if remote else bytearray.fromhex(line[id_end + 1:id_end + 1 + dlc * 2].decode())
+    except ValueError:
+        return None
+    return Message(arbitration_id=arbitration_id,
+                   is_extended_id=extended,
+                   is_remote_frame=remote,
+                   timestamp=timestamp,
+                   dlc=dlc,
+                   data=data)
+
+
+class BatchedSlcanBus(slcanBus):
+    def __init__(self, channel: str, *args, read_size: int = 4096, **kwargs) -> None:
+        """
+        slcan bus with coalesced writes and buffered reads.
+
+        Frames sent inside ``with bus.batch():`` go out in one serial write when
+        the block exits; outside a batch each send is written right away. The
+        arguments are those of :class:`can.interfaces.slcan.slcanBus`.
+
+        :param channel: Serial port of the adapter, e.g. /dev/ttyACM0.
+        :param read_size: Max bytes read from the serial port at once.
+        """
+        self.read_size = read_size
+        self._tx_buffer = bytearray()
+        self._tx_lock = threading.Lock()
+        self._batch_depth = 0
+        self._rx_buffer = bytearray()
+        self._rx_frames: Deque[Message] = deque()
+        self.frames_sent = 0
+        self.frames_received = 0
+        self.writes = 0
+        self.reads = 0
+        super().__init__(channel, *args, **kwargs)
+        self._started = time.monotonic()
+
+    @contextlib.contextmanager
+    def batch(self):
+        """
+        Write the frames sent in the block with one serial write.
+        """
+        with self._tx_lock:
+            self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            with self._tx_lock:
+                self._batch_depth -= 1
+                if self._batch_depth == 0:
+                    self._flush_tx()
+
+    def send(self, msg: Message, timeout: Optional[float] = None) -> None:
+        with self._tx_lock:
+            self._tx_buffer += encode_frame(msg)
+            self.frames_sent += 1
+            if self._batch_depth == 0:
+                self._flush_tx()
+
+    def _flush_tx(self) -> None:
+        # Called with _tx_lock held
+        if not self._tx_buffer:
+            return
+        self.serialPortOrig.write(bytes(self._tx_buffer))
+        self._tx_buffer.clear()
+        self.writes += 1
+
+    def _wait_readable(self, timeout: Optional[float]) -> None:
+        try:
+            fileno = self.serialPortOrig.fileno()
+        except (AttributeError, OSError, NotImplementedError):
+            # No descriptor (e.g. a loop:// port): rely on the port's read timeout
+            return
+        select.select([fileno], [], [], timeout)
+
+    def _fill(self, timeout: Optional[float]) -> None:
+        port = self.serialPortOrig
+        waiting = port.in_waiting
+        if waiting == 0:
+            if timeout == 0:
+                return
+            self._wait_readable(timeout)
+            waiting = port.in_waiting
+        data = port.read(min(max(waiting, 1), self.read_size))
+        if not data:
+            return
+        self.reads += 1
+        buffer = self._rx_buffer
+        buffer += data
+        end = max(buffer.rfind(b'\r'), buffer.rfind(b'\a'))
+        if end < 0:
+            return
+        timestamp = time.time()
+        for line in bytes(buffer[:end]).replace(b'\a', b'\r').split(b'\r'):
+            message = parse_frame(line, timestamp)
+            if message is not None:
+                self._rx_frames.append(message)
+        del buffer[:end + 1]
+
+    def _recv_internal(self, timeout: Optional[float]) -> Tuple[Optional[Message], bool]:
+        if not self._rx_frames:
+            self._fill(timeout)
+        if self._rx_frames:
+            self.frames_received += 1
+            return self._rx_frames.popleft(), False
+        return None, False
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Frames and serial calls since the bus was opened, with the achieved frames/s.
+        """
+        elapsed = time.monotonic() - self._started
+        return {
+            'elapsed': elapsed,
+            'frames_sent': self.frames_sent,
+            'frames_received': self.frames_received,
+            'writes': self.writes,
+            'reads': self.reads,
+            'tx_frames_per_second': self.frames_sent / elapsed if elapsed > 0 else 0.0,
+            'rx_frames_per_second': self.frames_received / elapsed if elapsed > 0 else 0.0,
+        }
+
+    def shutdown(self) -> None:
+        with self._tx_lock:
+            self._flush_tx()
+        super().shutdown()
@@ -0,0 +1,217 @@
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import can
+import numpy as np
+
+from arctos import Arctos
+from can_helper import frame_bits
+from constants import CMD_READ_ENCODER, CMD_GET_CURRENT_SPEED, CMD_MOTOR_STATUS
+from mks_codec import ChecksumError, EncoderReply, SpeedReply, StatusReply, decode_reply, REQUEST_LAYOUTS, \
+    REPLY_LAYOUTS
+from tx_scheduler import TxPriority
+
+ENCODER = 'encoder'
+SPEED = 'speed'
+STATUS = 'status'
+
+# Quantity -> opcode of the query
+QUERY_OPCODES = {
+    ENCODER: CMD_READ_ENCODER,
+    SPEED: CMD_GET_CURRENT_SPEED,
+    STATUS: CMD_MOTOR_STATUS,
+}
+
+
+class RingBuffer:
+    def __init__(self, capacity: int) -> None:
+        """
+        Preallocated (time, value) history with a single writer.
+
+        The latest sample is published as one tuple, so readers get it without
+        locking. History reads copy the arrays; a sample written during the
+        copy may show up in place of the oldest one.
+
+        :param capacity: Number of samples kept.
+        """
+        self.capacity = capacity
+        self._times = np.zeros(capacity)
+        self._values = np.zeros(capacity)
+        # Number of samples ever written
+        self._count = 0
+        self.latest: Optional[Tuple[float, float]] = None
+
+    def __len__(self) -> int:
+        return min(self._count, self.capacity)
+
+    def append(self, timestamp: float, value: float) -> None:
+        index = self._count % self.capacity
+        self._times[index] = timestamp
+        self._values[index] = value
+        self._count += 1
+        self.latest = (timestamp, value)
+
+    def window(self, start: Optional[float] = None, end: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Samples with start <= time <= end, oldest first.
+
+        :return: (times, values) arrays.
+        """
+        count = self._count
+        if count <= self.capacity:
+            times = self._times[:count].copy()
+            values = self._values[:count].copy()
+        else:
+            index = count % self.capacity
+            times = np.concatenate((self._times[index:], self._times[:index]))
+            values = np.concatenate((self._values[index:], self._values[:index]))
+        if start is not None or end is not None:
+            low = 0 if start is None else np.searchsorted(times, start, side='left')
+            high = len(times) if end is None else np.searchsorted(times, end, side='right')
+            times = times[low:high]
+            values = values[low:high]
+        return times, values
+
+
+class Telemetry:
+    def __init__(self,
+                 arctos: Arctos,
+                 rate: float = 10.0,
+                 quantities: Sequence[str] = (ENCODER, SPEED, STATUS),
+                 capacity: int = 4096,
+                 bitrate: int = 500000,
+                 max_bus_load: float = 0.3) -> None:
+        """
+        Poll encoder, speed and status of every active motor at a fixed rate.
+
+        Queries are spread evenly over the polling period instead of being
+        sent in a burst, and the rate is lowered when queries and replies
+        would use more than max_bus_load of the bus. Replies are stored per
+        axis and quantity in preallocated ring buffers. Encoder samples are
+        total encoder counts (carry * 0x4000 + value).
+
+        :param arctos: Arctos instance whose receive path delivers the replies.
+        :param rate: Polling rate in Hz of each quantity of each motor.
+        :param quantities: Quantities to poll, among ENCODER, SPEED and STATUS.
+        :param capacity: Samples kept per axis and quantity.
+        :param bitrate: Bus bitrate in bit/s.
+        :param max_bus_load: Fraction of the bus the polling may use.
+        """
+        self._arctos = arctos
+        self.quantities = list(quantities)
+        self._axes_by_id = {arctos.get_motor_by_axis(axis).can_id: axis for axis in arctos.get_active_axes()}
+        self.buffers: Dict[str, Dict[str, RingBuffer]] = {
+            axis: {quantity: RingBuffer(capacity) for quantity in self.quantities}
+            for axis in self._axes_by_id.values()
+        }
+        self.rate = min(rate, self.max_rate(bitrate, max_bus_load))
+        if self.rate < rate:
+            print(f"Telemetry rate lowered from {rate} Hz to {self.rate:.1f} Hz to stay within the bus budget")
+        # Constant frames (no fields), reused for every poll
+        self._queries = [
+            arctos.get_motor_by_axis(axis).messages.request(QUERY_OPCODES[quantity])
+            for axis in self._axes_by_id.values()
+            for quantity in self.quantities
+        ]
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def bits_per_cycle(self) -> int:
+        """
+        Bus bits used by one query and reply of every quantity of every motor.
+        """
+        bits = 0
+        for quantity in self.quantities:
+            opcode = QUERY_OPCODES[quantity]
+            bits += frame_bits(REQUEST_LAYOUTS[opcode].size) + frame_bits(REPLY_LAYOUTS[opcode].size)
+        return bits * len(self._axes_by_id)
+
+    def max_rate(self, bitrate: int, max_bus_load: float) -> float:
+        bits = self.bits_per_cycle()
+        return bitrate * max_bus_load / bits if bits else float('inf')
+
+    def start(self) -> 'Telemetry':
+        self._arctos.add_message_listener(self.on_message)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._poll, daemon=True, name='arctos telemetry')
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+        self._arctos.remove_message_listener(self.on_message)
+
+    def _poll(self) -> None:
+        if not self._queries:
+            return
+        interval = 1 / (self.rate * len(self._queries))
+        next_time = time.monotonic()
+        index = 0
+        tx = self._arctos.tx
+        while not self._stop.is_set():
+            try:
+                # Sent without the console trace of can_send_message, polls are too frequent for it
+                tx.send(self._queries[index], priority=TxPriority.QUERY)
+            except can.CanError as e:
+                print(f"Error (telemetry): {e}")
+            index = (index + 1) % len(self._queries)
+            next_time += interval
+            delay = next_time - time.monotonic()
+            if delay < 0:
+                # Fell behind (e.g. a busy bus): restart the schedule from now
+                next_time = time.monotonic()
+                delay = 0
+            self._stop.wait(delay)
+
+    def on_message(self, message: can.Message) -> None:
+        axis = self._axes_by_id.get(message.arbitration_id)
+        if axis is None:
+            return
+        try:
+            reply = decode_reply(message)
+        except ChecksumError:
+            return
+        timestamp = time.monotonic()
+        buffers = self.buffers[axis]
+        if isinstance(reply, EncoderReply):
+            buffer = buffers.get(ENCODER)
+            value = reply.counts
+        elif isinstance(reply, SpeedReply):
+            buffer = buffers.get(SPEED)
+            value = reply.speed
+        elif isinstance(reply, StatusReply) and reply.opcode == CMD_MOTOR_STATUS:
+            buffer = buffers.get(STATUS)
+            value = reply.status
+        else:
+            return
+        if buffer is not None:
+            buffer.append(timestamp, value)
+
+    def latest(self, axis: str, quantity: str) -> Optional[Tuple[float, float]]:
+        """
+        Latest (time.monotonic() timestamp, value) of a quantity, None before the first reply.
+        """
+        return self.buffers[axis][quantity].latest
+
+    def history(self, axis: str, quantity: str, seconds: Optional[float] = None,
+                start: Optional[float] = None, end: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Samples of a quantity, oldest first.
+
+        :param axis: Axis name.
+        :param quantity: ENCODER, SPEED or STATUS.
+        :param seconds: Only the last seconds, overrides start.
+        :param start: First time.monotonic() timestamp to include.
+        :param end: Last time.monotonic() timestamp to include.
+        :return: (times, values) arrays.
+        """
+        if seconds is not None:
+            start = time.monotonic() - seconds
+        return self.buffers[axis][quantity].window(start, end)
+
+    def axes(self) -> List[str]:
+        return list(self.buffers)
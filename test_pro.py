@@ -1,12 +1,13 @@
 import random
+import threading
 import time
 
-import can
 import pygame
 from pygame.joystick import JoystickType
 
 from arctos import Arctos
-from base_motor import MotorStatus
+from bus_factory import BusConfig, create_bus
+from jog import JogController, PygameInputSource, latency_percentiles
 from led_device import Color
 from swith_pro_controller import Button, Axis, DPad
 
@@ -152,89 +153,41 @@ def play_with_turn_mode(arctos: Arctos):
         time.sleep(0.1)
 
 def play_with_speed_mode(arctos: Arctos):
-    gp = MyJoystick()
+    source = PygameInputSource()
 
     arctos.gripper.set_gripper_position(127)
 
-    # Start reading input
-    running = True
-    while running:
-        gp.process_buttons()
-
-        for button in gp.pressed_buttons:
-            print(f"Button Pressed: {button.name}")
-            if button == Button.HOME:
-                arctos.go_home()
-            elif button == Button.SCREENSHOT:
-                for motor in arctos.get_active_motors():
-                    motor.set_zero()
-                pass
-            if button in button_motor_map:
-                motor_data = button_motor_map[button]
-                motor = arctos.get_motor_by_axis(motor_data['motor'])
-                if motor.status == MotorStatus.OK:
-                    motor.run_in_speed_mode(motor_data['direction'], motor_data['speed'], motor_data['acc'])
-                else:
-                    print(f"Motor {motor.can_id} is not ready. Status: {motor.status}")
-            if button == Button.PLUS:
-                arctos.gripper.set_gripper_position(arctos.gripper.gripper_position + 85)
-            if button == Button.MINUS:
-                arctos.gripper.set_gripper_position(arctos.gripper.gripper_position - 85)
-
-            if button in button_axis_map:
-                axis_data = button_axis_map[button]
-                speed = 100
-                acc = 200
-                b_motor = arctos.get_motor_by_axis('b')
-                c_motor = arctos.get_motor_by_axis('c')
-                if b_motor.status == MotorStatus.OK and c_motor.status == MotorStatus.OK:
-                    axis = axis_data['axis']
-                    direction = axis_data['direction']
-                    d_b = 1
-                    d_c = 1
-                    if axis == 'c':
-                        if direction > 0:
-                            d_b = -1
-                            d_c = -1
-                        else:
-                            d_b = 1
-                            d_c = 1
-                    elif axis == 'b':
-                        if direction > 0:
-                            d_b = -1
-                            d_c = 1
-                        else:
-                            d_b = 1
-                            d_c = -1
-                    if b_motor.status == MotorStatus.OK and c_motor.status == MotorStatus.OK:
-                        b_motor.run_in_speed_mode(d_b, speed, acc)
-                        c_motor.run_in_speed_mode(d_c, speed, acc)
-                        time.sleep(0.3)
-                else:
-                    print(f"Motor {b_motor.can_id} is not ready. Status: {b_motor.status}")
-                    print(f"Motor {c_motor.can_id} is not ready. Status: {c_motor.status}")
-
-        for button in gp.released_buttons:
-            print(f"Button Released: {button.name}")
-            if button in button_motor_map:
-                motor_data = button_motor_map[button]
-                motor = arctos.get_motor_by_axis(motor_data['motor'])
-                if motor.status == MotorStatus.MOVING:
-                    motor.stop_in_speed_mode(100)
-            if button in button_axis_map:
-                b_motor = arctos.get_motor_by_axis('b')
-                c_motor = arctos.get_motor_by_axis('c')
-                if b_motor.status == MotorStatus.MOVING:
-                    b_motor.stop_in_speed_mode(100)
-                if c_motor.status == MotorStatus.MOVING:
-                    c_motor.stop_in_speed_mode(100)
-
-        # Quit on ESC key
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                running = False
-
-        time.sleep(0.3)
+    def set_zero():
+        for motor in arctos.get_active_motors():
+            motor.set_zero()
+
+    homing = None
+
+    def go_home():
+        nonlocal homing
+        if homing is not None and homing.is_alive():
+            return
+        # Stop jogging first, and home off the input loop so the gamepad stays responsive
+        jog.stop()
+        homing = threading.Thread(target=arctos.go_home, daemon=True, name='homing')
+        homing.start()
+
+    jog = JogController(
+        arctos,
+        source,
+        button_map=button_motor_map,
+        dpad_map=button_axis_map,
+        actions={
+            Button.HOME: go_home,
+            Button.SCREENSHOT: set_zero,
+            Button.PLUS: lambda: arctos.gripper.set_gripper_position(arctos.gripper.gripper_position + 85),
+            Button.MINUS: lambda: arctos.gripper.set_gripper_position(arctos.gripper.gripper_position - 85),
+        },
+    )
+    # Blocks on gamepad events until the window is closed
+    jog.run()
+    print(f"Input to bus latency: {latency_percentiles(jog.latencies)}")
+    jog.close()
 
 def debug_buttons():
     gp = MyJoystick()
@@ -248,16 +201,15 @@ def debug_buttons():
         time.sleep(0.1)
 
 
-def play_with_arm():
-    bus = can.ThreadSafeBus(interface="slcan", channel="/dev/ttyACM0", bitrate=500000)
-    arctos = Arctos(bus)
-
-    is_make_turn_mode = False
+def play_with_arm(config: BusConfig = None):
+    bus = create_bus(config or BusConfig(thread_safe=True))
+    with Arctos(bus) as arctos:
+        is_make_turn_mode = False
 
-    if is_make_turn_mode:
-        play_with_turn_mode(arctos)
-    else:
-        play_with_speed_mode(arctos)
+        if is_make_turn_mode:
+            play_with_turn_mode(arctos)
+        else:
+            play_with_speed_mode(arctos)
 
     pygame.quit()
     bus.shutdown()
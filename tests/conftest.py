@@ -0,0 +1,40 @@
+import itertools
+import os
+import sys
+
+import can
+import pytest
+
+# The modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from can_helper import set_message_trace  # noqa: E402
+from simulator import ArctosSimulator  # noqa: E402
+
+_channels = itertools.count()
+
+
+@pytest.fixture
+def channel():
+    """
+    Fresh python-can virtual channel name.
+    """
+    return f'arctos-test-{next(_channels)}'
+
+
+@pytest.fixture
+def simulator(channel):
+    set_message_trace(False)
+    bus = can.Bus(interface='virtual', channel=channel)
+    simulator = ArctosSimulator(bus, time_scale=0.02, home_duration=0.1).start()
+    yield simulator
+    simulator.stop()
+    bus.shutdown()
+
+
+@pytest.fixture
+def arctos(simulator, channel):
+    from arctos import Arctos
+    arctos = Arctos(can.Bus(interface='virtual', channel=channel))
+    yield arctos
+    arctos.stop_can_listener()
@@ -0,0 +1,55 @@
+import gc
+import threading
+import time
+
+import can
+import pytest
+
+from arctos import Arctos
+from position_snapshot import load_snapshot
+
+
+def test_move_joints(arctos, simulator):
+    arctos.x_motor().set_zero()
+    arctos.y_motor().set_zero()
+    assert arctos.move_joints({'x': 10, 'y': -5}) == {'x': 0x02, 'y': 0x02}
+    assert arctos.x_motor().position == pytest.approx(10, abs=1e-3)
+    assert arctos.y_motor().position == pytest.approx(-5, abs=1e-3)
+
+
+def test_emergency_stop_during_move_joints_is_a_failure(arctos, simulator):
+    arctos.x_motor().set_zero()
+    arctos.y_motor().set_zero()
+    results = {}
+    # Several seconds long, even sped up
+    move = threading.Thread(target=lambda: results.update(arctos.move_joints({'x': 720, 'y': 360}, speed=100, acc=100)))
+    move.start()
+    time.sleep(0.1)
+    arctos.emergency_stop()
+    move.join(timeout=5)
+    assert not move.is_alive()
+    assert results == {'x': 0x00, 'y': 0x00}
+
+
+def test_context_manager_saves_the_snapshot_and_shuts_the_bus_down(simulator, channel, tmp_path):
+    path = str(tmp_path / 'snapshot.json')
+    bus = can.Bus(interface='virtual', channel=channel)
+    with Arctos(bus, snapshot_path=path) as arctos:
+        arctos.x_motor().set_zero()
+        deadline = time.monotonic() + 1
+        while not arctos.x_motor().is_ready() and time.monotonic() < deadline:
+            time.sleep(0.005)
+    snapshot = load_snapshot(path)
+    assert snapshot['clean'] and snapshot['axes']['x']['position'] == 0
+    assert bus._is_shutdown
+
+
+def test_garbage_collection_has_no_side_effect(channel, tmp_path):
+    path = str(tmp_path / 'snapshot.json')
+    bus = can.Bus(interface='virtual', channel=channel)
+    Arctos(bus, threaded=False, snapshot_path=path)
+    gc.collect()
+    # The bus still belongs to the caller, and only an explicit stop writes the snapshot
+    assert not bus._is_shutdown
+    assert load_snapshot(path) is None
+    bus.shutdown()
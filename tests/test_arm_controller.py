@@ -0,0 +1,79 @@
+import socket
+import threading
+import time
+
+import can
+import pytest
+
+from arm_controller import ArmController
+from constants import X_MOTOR_ID
+from simulator import ArctosSimulator
+
+
+@pytest.fixture
+def simulators():
+    buses = [can.Bus(interface='virtual', channel=f'arm-controller-{name}') for name in ('left', 'right')]
+    simulators = [ArctosSimulator(bus, time_scale=0.02).start() for bus in buses]
+    yield simulators
+    for simulator, bus in zip(simulators, buses):
+        simulator.stop()
+        bus.shutdown()
+
+
+def test_arms_share_one_thread(simulators):
+    before = threading.active_count()
+    with ArmController() as controller:
+        arms = [controller.add_arm(name, can.Bus(interface='virtual', channel=f'arm-controller-{name}'))
+                for name in ('left', 'right')]
+        # One I/O thread, whatever the number of arms. Virtual buses have no file
+        # descriptor to wait on: each is read by a notifier thread blocking in recv
+        notifiers = [thread for thread in threading.enumerate() if thread.name.startswith('can.notifier')]
+        assert len(notifiers) == 2
+        assert threading.active_count() == before + 1 + len(notifiers)
+        for arm in arms:
+            arm.x_motor().set_zero()
+        assert arms[0].move_joints({'x': 10}) == {'x': 0x02}
+        assert arms[1].move_joints({'x': -20}) == {'x': 0x02}
+        assert threading.active_count() == before + 3
+    assert simulators[0].joint_position(X_MOTOR_ID) == pytest.approx(10, abs=0.1)
+    assert simulators[1].joint_position(X_MOTOR_ID) == pytest.approx(-20, abs=0.1)
+    assert threading.active_count() == before
+
+
+class FailingBus:
+    """
+    Bus whose file descriptor is always readable and whose reads always fail.
+    """
+    def __init__(self, error: Exception) -> None:
+        self.error = error
+        self.reads = 0
+        self._reader, self._writer = socket.socketpair()
+        self._writer.send(b'\0')
+
+    def fileno(self) -> int:
+        return self._reader.fileno()
+
+    def recv(self, timeout=None):
+        self.reads += 1
+        raise self.error
+
+    def send(self, message, timeout=None):
+        pass
+
+    def shutdown(self):
+        self._reader.close()
+        self._writer.close()
+
+
+@pytest.mark.parametrize('error, max_reads', [
+    # Read again after each backoff
+    (can.CanError('garbled frame'), 5),
+    # Closed: not read anymore
+    (can.CanOperationError('bus closed'), 1),
+])
+def test_read_errors_do_not_spin(error, max_reads):
+    bus = FailingBus(error)
+    with ArmController(error_backoff=0.1) as controller:
+        controller.add_arm('arm', bus)
+        time.sleep(0.3)
+    assert 1 <= bus.reads <= max_reads
@@ -0,0 +1,56 @@
+import asyncio
+import threading
+
+import can
+import pytest
+
+from async_arctos import AsyncArctos
+from base_motor import MotorStatus
+
+
+def new_threads(before):
+    # The python-can notifier needs a reader thread on buses without a file descriptor (virtual)
+    return {thread.name for thread in threading.enumerate()
+            if thread not in before and not thread.name.startswith('can.notifier')}
+
+
+def test_async_arctos_starts_no_thread(simulator, channel):
+    async def main():
+        before = set(threading.enumerate())
+        async with AsyncArctos(can.Bus(interface='virtual', channel=channel)) as arm:
+            assert new_threads(before) == set()
+            assert await arm.x.set_zero() == 0x01
+            assert await arm.x.turn(10, speed=500) == 0x02
+            assert await arm.y.go_home() == 0x02
+            assert new_threads(before) == set()
+            # LED frames go out from the loop too
+            await asyncio.sleep(0.3)
+            assert simulator.led_colors
+
+    asyncio.run(main())
+
+
+def test_async_arctos_pumps_the_timer_wheel(simulator, channel):
+    async def main():
+        async with AsyncArctos(can.Bus(interface='virtual', channel=channel)) as arm:
+            await arm.x.set_zero()
+            simulator._handlers[0xF4] = lambda motor, command, now: None
+            with pytest.raises(TimeoutError):
+                await asyncio.wrap_future(arm.x.motor.start_turn(10, timeout=0.1))
+            assert arm.x.motor.status == MotorStatus.ERROR
+
+    asyncio.run(main())
+
+
+def test_async_turn_timeout_sets_the_motor_to_error(simulator, channel):
+    async def main():
+        async with AsyncArctos(can.Bus(interface='virtual', channel=channel)) as arm:
+            await arm.x.set_zero()
+            simulator._handlers[0xF4] = lambda motor, command, now: None
+            with pytest.raises(asyncio.TimeoutError):
+                await arm.x.turn(10, timeout=0.1)
+            # Same state as a turn expired by the timer wheel
+            assert arm.x.motor.status == MotorStatus.ERROR
+            assert arm.x.motor.pending_degrees is None
+
+    asyncio.run(main())
@@ -0,0 +1,75 @@
+import time
+
+import can
+import numpy as np
+import pytest
+
+from base_motor import MotorStatus, relative_turn_pulses
+from constants import X_MOTOR_ID, Y_MOTOR_ID
+from mks_codec import ENCODER_COUNTS
+from motors import YMotor
+from position_snapshot import save_snapshot, load_snapshot
+from trajectory_planner import firmware_parameters
+
+
+def wait_until(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.005)
+    return True
+
+
+def test_emergency_stop_reads_the_position_again(arctos, simulator, tmp_path):
+    motor = arctos.x_motor()
+    motor.set_zero()
+    # 720 joint degrees of X last several seconds, even sped up
+    future = motor.start_turn(720, speed=100, acc=100)
+    time.sleep(0.05)
+    motor.emergency_stop()
+    assert wait_until(future.done)
+    # The interrupted turn failed
+    assert future.result()[-1].data[1] == 0x00
+    assert wait_until(lambda: motor.position is not None)
+    assert motor.status == MotorStatus.ERROR
+    assert motor.position == pytest.approx(simulator.joint_position(X_MOTOR_ID), abs=0.1)
+    assert 0 < motor.position < 720
+
+    path = str(tmp_path / 'snapshot.json')
+    save_snapshot(path, {'x': motor}, clean=True)
+    assert load_snapshot(path)['axes']['x']['position'] == pytest.approx(motor.position)
+
+
+def test_blocking_go_home_of_a_standalone_motor(simulator, channel):
+    bus = can.Bus(interface='virtual', channel=channel)
+    try:
+        motor = YMotor(bus)
+        motor.go_home(timeout=5)
+        assert motor.status == MotorStatus.OK
+        # The zero point move ran and its reply moved the position to 0
+        assert motor.position == pytest.approx(0, abs=1e-3)
+        assert simulator.joint_position(Y_MOTOR_ID) == pytest.approx(0, abs=0.1)
+    finally:
+        bus.shutdown()
+
+
+def test_turns_and_encoder_count_the_same_units():
+    assert relative_turn_pulses(360) == ENCODER_COUNTS
+    assert relative_turn_pulses(-90) == -ENCODER_COUNTS // 4
+    _, _, pulses = firmware_parameters(np.array([360.0, -90.0, 12.345]), np.ones(3), np.ones(3), np.ones(3))
+    assert list(pulses) == [relative_turn_pulses(360), relative_turn_pulses(-90), relative_turn_pulses(12.345)]
+
+
+def test_queued_turns_match_the_encoder(arctos, simulator):
+    motor = arctos.x_motor()
+    motor.set_zero()
+    assert wait_until(motor.is_ready)
+    queue = arctos.motion_queue('x')
+    for _ in range(20):
+        queue.relative(7.3, speed=3000, acc=255)
+    assert queue.wait(timeout=5)
+    # The position follows the whole counts turned, the encoder reads the same
+    count = 360 / ENCODER_COUNTS / motor.ratio
+    assert motor.position == pytest.approx(20 * 7.3, abs=20 * count)
+    assert motor.get_position(max_age=0) == pytest.approx(motor.position, abs=1e-9)
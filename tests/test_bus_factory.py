@@ -0,0 +1,73 @@
+import argparse
+import json
+
+import can
+import pytest
+
+from bus_factory import (ARCTOS_DEVICE_IDS, BusConfig, acceptance_filters, add_bus_arguments, bus_config_from_args,
+                         create_bus, load_bus_config)
+
+
+def accepted(filters, can_id):
+    return any(can_id & f['can_mask'] == f['can_id'] & f['can_mask'] for f in filters)
+
+
+@pytest.mark.parametrize('device_ids', [
+    ARCTOS_DEVICE_IDS,
+    [1],
+    [0, 1, 2, 3],
+    [3, 5, 6, 7, 8, 9, 0x7FF],
+    [16, 17, 18, 19, 20, 21, 22, 23, 40],
+])
+def test_filters_accept_exactly_the_device_ids(device_ids):
+    filters = acceptance_filters(device_ids)
+    assert all(not f['extended'] for f in filters)
+    assert [can_id for can_id in range(0x800) if accepted(filters, can_id)] == sorted(set(device_ids))
+
+
+def test_arm_ids_are_merged_into_aligned_blocks():
+    assert acceptance_filters(ARCTOS_DEVICE_IDS) == [
+        {'can_id': 1, 'can_mask': 0x7FF, 'extended': False},
+        {'can_id': 2, 'can_mask': 0x7FE, 'extended': False},
+        {'can_id': 4, 'can_mask': 0x7FC, 'extended': False},
+        {'can_id': 8, 'can_mask': 0x7FF, 'extended': False},
+    ]
+
+
+def test_virtual_bus_drops_other_ids(channel):
+    sender = can.Bus(interface='virtual', channel=channel)
+    receiver = create_bus(BusConfig(interface='virtual', channel=channel, device_ids=[1, 2]))
+    try:
+        for can_id in (3, 1, 9, 2):
+            sender.send(can.Message(arbitration_id=can_id, data=[can_id], is_extended_id=False))
+        received = [receiver.recv(0.1) for _ in range(3)]
+    finally:
+        sender.shutdown()
+        receiver.shutdown()
+    assert [message and message.arbitration_id for message in received] == [1, 2, None]
+
+
+def test_thread_safe_bus(channel):
+    bus = create_bus(BusConfig(interface='virtual', channel=channel, thread_safe=True, device_ids=[]))
+    try:
+        assert isinstance(bus, can.ThreadSafeBus)
+    finally:
+        bus.shutdown()
+
+
+def test_config_file_and_arguments(tmp_path):
+    path = tmp_path / 'bus.json'
+    path.write_text(json.dumps({'interface': 'socketcan', 'channel': 'can0'}))
+    assert load_bus_config(str(path)) == BusConfig(interface='socketcan', channel='can0')
+
+    parser = argparse.ArgumentParser()
+    add_bus_arguments(parser)
+    config = bus_config_from_args(parser.parse_args(['--bus-config', str(path), '--channel', 'vcan0']))
+    assert (config.interface, config.channel, config.batched) == ('socketcan', 'vcan0', False)
+    assert bus_config_from_args(parser.parse_args([])) == BusConfig()
+
+
+def test_unknown_config_keys():
+    with pytest.raises(ValueError, match='speed'):
+        BusConfig.from_dict({'interface': 'virtual', 'speed': 1})
+    assert BusConfig.from_dict(BusConfig().to_dict()) == BusConfig()
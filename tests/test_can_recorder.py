@@ -0,0 +1,66 @@
+import os
+import time
+
+import can
+
+from can_recorder import DIRECTION_RX, DIRECTION_TX, HEADER, RECORD, CanRecorder, log_files, read_log
+from constants import CMD_SET_ZERO, X_MOTOR_ID
+
+
+def frame(index, extended=False):
+    return can.Message(arbitration_id=0x100 + index if extended else index, is_extended_id=extended,
+                       data=bytes(range(index % 9)), timestamp=1000.0 + index)
+
+
+def recorded(directory):
+    return [message for path in log_files(directory) for message in read_log(path)]
+
+
+def test_round_trip(tmp_path):
+    directory = str(tmp_path)
+    frames = [frame(index, extended=index == 3) for index in range(9)]
+    with CanRecorder(directory) as recorder:
+        for index, message in enumerate(frames):
+            recorder.record(message, DIRECTION_TX if index % 2 else DIRECTION_RX)
+    path, = log_files(directory)
+    # Preallocated records are dropped on close
+    assert os.path.getsize(path) == HEADER.size + len(frames) * RECORD.size
+    for index, (original, read) in enumerate(zip(frames, recorded(directory))):
+        assert read.arbitration_id == original.arbitration_id
+        assert read.is_extended_id == original.is_extended_id
+        assert read.dlc == original.dlc
+        assert bytes(read.data) == bytes(original.data)
+        assert read.timestamp == original.timestamp
+        assert read.is_rx == (index % 2 == 0)
+
+
+def test_rotation_keeps_the_newest_files(tmp_path):
+    directory = str(tmp_path)
+    with CanRecorder(directory, max_records=3, max_files=2) as recorder:
+        for index in range(10):
+            recorder.record(frame(index), DIRECTION_RX)
+    # 10 records in files of 3: 4 files, the 2 newest kept
+    paths = log_files(directory)
+    assert [os.path.basename(path) for path in paths] == ['arctos-00002.canlog', 'arctos-00003.canlog']
+    assert [message.arbitration_id for message in recorded(directory)] == [6, 7, 8, 9]
+
+
+def test_a_new_recorder_does_not_overwrite(tmp_path):
+    directory = str(tmp_path)
+    with CanRecorder(directory) as recorder:
+        recorder.record(frame(1), DIRECTION_RX)
+    with CanRecorder(directory) as recorder:
+        recorder.record(frame(2), DIRECTION_RX)
+    assert [message.arbitration_id for message in recorded(directory)] == [1, 2]
+
+
+def test_attach_records_both_directions(arctos, simulator, tmp_path):
+    directory = str(tmp_path)
+    with CanRecorder(directory).attach(arctos):
+        arctos.x_motor().set_zero()
+        deadline = time.monotonic() + 1
+        while not arctos.x_motor().is_ready() and time.monotonic() < deadline:
+            time.sleep(0.005)
+    set_zero = [message for message in recorded(directory)
+                if message.arbitration_id == X_MOTOR_ID and message.data[0] == CMD_SET_ZERO]
+    assert [message.is_rx for message in set_zero] == [False, True]
@@ -0,0 +1,59 @@
+import time
+
+import can
+import pytest
+
+from can_recorder import DIRECTION_RX, DIRECTION_TX, CanRecorder
+from can_replay import read_recording, replay
+
+
+class RecordingBus:
+    def __init__(self) -> None:
+        self.sent = []
+
+    def send(self, message, timeout=None):
+        self.sent.append((time.monotonic(), message))
+
+
+def record_session(directory, count=6, interval=0.02, max_records=4):
+    with CanRecorder(directory, max_records=max_records) as recorder:
+        for index in range(count):
+            message = can.Message(arbitration_id=index + 1, data=[index, 0xAA], is_extended_id=False)
+            recorder.record(message, DIRECTION_TX if index % 3 == 0 else DIRECTION_RX, 100.0 + index * interval)
+
+
+def test_replays_the_received_frames_across_files(tmp_path):
+    record_session(str(tmp_path))
+    bus = RecordingBus()
+    assert replay(bus, read_recording(str(tmp_path)), speed=0) == 4
+    assert [message.arbitration_id for _, message in bus.sent] == [2, 3, 5, 6]
+    assert all(bytes(message.data) == bytes([message.arbitration_id - 1, 0xAA]) for _, message in bus.sent)
+
+
+def test_include_tx(tmp_path):
+    record_session(str(tmp_path))
+    bus = RecordingBus()
+    assert replay(bus, read_recording(str(tmp_path)), speed=0, include_tx=True) == 6
+    assert [message.arbitration_id for _, message in bus.sent] == [1, 2, 3, 4, 5, 6]
+
+
+@pytest.mark.parametrize('speed', [1.0, 2.0])
+def test_keeps_the_recorded_timing(tmp_path, speed):
+    record_session(str(tmp_path), interval=0.05)
+    bus = RecordingBus()
+    replay(bus, read_recording(str(tmp_path)), speed=speed, include_tx=True)
+    elapsed = bus.sent[-1][0] - bus.sent[0][0]
+    assert elapsed == pytest.approx(5 * 0.05 / speed, abs=0.03)
+
+
+def test_replay_feeds_a_listener_on_the_bus(tmp_path, channel):
+    record_session(str(tmp_path))
+    sender = can.Bus(interface='virtual', channel=channel)
+    receiver = can.Bus(interface='virtual', channel=channel)
+    try:
+        replay(sender, read_recording(str(tmp_path)), speed=0)
+        received = [receiver.recv(1) for _ in range(4)]
+    finally:
+        sender.shutdown()
+        receiver.shutdown()
+    assert [message.arbitration_id for message in received] == [2, 3, 5, 6]
@@ -0,0 +1,38 @@
+import can
+import pytest
+
+from can_requests import PendingRequests
+from constants import CMD_RELATIVE_TURN, X_MOTOR_ID
+from timer_wheel import TimerWheel
+
+
+def reply(status):
+    return can.Message(arbitration_id=X_MOTOR_ID, data=[CMD_RELATIVE_TURN, status, 0], is_extended_id=False)
+
+
+def pending_request(requests):
+    # Not pumped: the timeout only fires when the test calls _expire
+    future = requests.add(X_MOTOR_ID, CMD_RELATIVE_TURN, timeout=1)
+    return future, requests._pending[(X_MOTOR_ID, CMD_RELATIVE_TURN)][0]
+
+
+def test_timeout_after_the_final_reply_is_ignored():
+    requests = PendingRequests(TimerWheel())
+    future, request = pending_request(requests)
+    requests.on_message_received(reply(0x01))
+    requests.on_message_received(reply(0x02))
+    # The timer fired while the receive path was completing the request
+    requests._expire(request, 1)
+    assert [message.data[1] for message in future.result(timeout=0)] == [0x01, 0x02]
+    assert len(requests) == 0
+
+
+def test_final_reply_after_the_timeout_is_ignored():
+    requests = PendingRequests(TimerWheel())
+    future, request = pending_request(requests)
+    requests.on_message_received(reply(0x01))
+    requests._expire(request, 1)
+    requests.on_message_received(reply(0x02))
+    with pytest.raises(TimeoutError):
+        future.result(timeout=0)
+    assert len(requests) == 0
@@ -0,0 +1,120 @@
+import time
+
+import pytest
+
+from base_motor import MotorStatus
+from constants import CMD_RUN_MOTOR, X_MOTOR_ID, B_MOTOR_ID, C_MOTOR_ID
+from jog import JogController, ScriptedInputSource, quantize, latency_percentiles
+from swith_pro_controller import Axis, DPad
+
+
+def test_quantize_deadzone_and_range():
+    assert quantize(0.05, 8, 0.1) == 0
+    assert quantize(-0.05, 8, 0.1) == 0
+    assert quantize(1.0, 8, 0.1) == 8
+    assert quantize(-1.0, 8, 0.1) == -8
+    assert quantize(0.55, 8, 0.1) == 4
+
+
+def test_quantize_hysteresis_keeps_the_step_near_a_boundary():
+    # 0.5 maps to 3.56: step 4 from rest, but a previous step of 3 is kept
+    assert quantize(0.5, 8, 0.1) == 4
+    assert quantize(0.5, 8, 0.1, previous=3) == 3
+    assert quantize(0.5, 8, 0.1, previous=4) == 4
+    # Further than half a step plus the hysteresis: the step changes
+    assert quantize(0.65, 8, 0.1, previous=3) == 5
+
+
+def ready_motors(arctos, axes):
+    for axis in axes:
+        arctos.get_motor_by_axis(axis).set_zero()
+    deadline = time.monotonic() + 1
+    while not all(arctos.get_motor_by_axis(axis).status == MotorStatus.OK for axis in axes):
+        assert time.monotonic() < deadline, 'Motors not ready'
+        time.sleep(0.005)
+
+
+def run_motor_frames(arctos):
+    frames = []
+    arctos.tx.add_sent_listener(
+        lambda message: frames.append(message) if message.data[0] == CMD_RUN_MOTOR else None)
+    return frames
+
+
+def test_only_speed_changes_are_sent(arctos):
+    ready_motors(arctos, 'x')
+    frames = run_motor_frames(arctos)
+    source = ScriptedInputSource([
+        (0.0, {Axis.LEFT_STICK_X: 0.5}),
+        # Stick noise inside the same step
+        (0.01, {Axis.LEFT_STICK_X: 0.52}),
+        (0.01, {Axis.LEFT_STICK_X: 0.49}),
+        (0.01, {Axis.LEFT_STICK_X: 0.51}),
+        # Inside the deadzone: stop
+        (0.01, {Axis.LEFT_STICK_X: 0.02}),
+        (0.01, {Axis.LEFT_STICK_X: 0.0}),
+    ])
+    jog = JogController(arctos, source)
+    jog.run(poll_timeout=0.05)
+    arctos.tx.flush()
+    jog.close()
+
+    x_frames = [frame for frame in frames if frame.arbitration_id == X_MOTOR_ID]
+    assert len(x_frames) == 2
+    assert jog.frames == 2
+    # Start to the right, then stop
+    start, stop = x_frames
+    assert start.data[1] & 0x80 and (start.data[1] << 8 | start.data[2]) & 0x0FFF > 0
+    assert stop.data[1] == 0 and stop.data[2] == 0
+
+
+def test_latency_is_measured_when_frames_reach_the_bus(arctos):
+    ready_motors(arctos, 'x')
+    source = ScriptedInputSource([(0.0, {Axis.LEFT_STICK_X: 1.0}), (0.02, {Axis.LEFT_STICK_X: 0.0})])
+    jog = JogController(arctos, source)
+    jog.run(poll_timeout=0.05)
+    arctos.tx.flush()
+    jog.close()
+    assert len(jog.latencies) == 2
+    percentiles = latency_percentiles(jog.latencies)
+    assert 0 <= percentiles['p50_ms'] <= percentiles['max_ms'] < 100
+
+
+@pytest.mark.parametrize('held, expected', [
+    # Pitch: b and c turn in opposite directions
+    ({DPad.UP}, {'b': -100, 'c': 100}),
+    ({DPad.DOWN}, {'b': 100, 'c': -100}),
+    # Roll: b and c turn in the same direction
+    ({DPad.RIGHT}, {'b': -100, 'c': -100}),
+    ({DPad.LEFT}, {'b': 100, 'c': 100}),
+    # Pitch and roll at once: one motor stops, the other adds up (clamped)
+    ({DPad.UP, DPad.RIGHT}, {'b': -100, 'c': 0}),
+    (set(), {'b': 0, 'c': 0}),
+])
+def test_wrist_differential(arctos, held, expected):
+    dpad_map = {
+        DPad.UP: {'axis': 'b', 'direction': 1},
+        DPad.DOWN: {'axis': 'b', 'direction': -1},
+        DPad.RIGHT: {'axis': 'c', 'direction': 1},
+        DPad.LEFT: {'axis': 'c', 'direction': -1},
+    }
+    jog = JogController(arctos, ScriptedInputSource([]), stick_map={}, dpad_map=dpad_map, wrist_speed=100)
+    state = jog.source.state()
+    state.held = set(held)
+    speeds = {axis: speed for axis, (speed, _) in jog.target_speeds(state).items()}
+    jog.close()
+    assert speeds == expected
+
+
+def test_wrist_frames_reach_the_simulator(arctos, simulator):
+    ready_motors(arctos, 'bc')
+    dpad_map = {DPad.UP: {'axis': 'b', 'direction': 1}}
+    source = ScriptedInputSource([(0.0, {DPad.UP: True})])
+    jog = JogController(arctos, source, stick_map={}, dpad_map=dpad_map, wrist_speed=100)
+    jog.update(source.state()) if source.poll(0.1) else None
+    arctos.tx.flush()
+    time.sleep(0.05)
+    assert simulator.motors[B_MOTOR_ID].current_speed(time.monotonic()) == -100
+    assert simulator.motors[C_MOTOR_ID].current_speed(time.monotonic()) == 100
+    jog.stop()
+    jog.close()
@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+
+from kinematics import forward_kinematics, inverse_kinematics, inverse_kinematics_cached, ik_solutions, \
+    cartesian_path_to_motors, joints_to_motors, motors_to_joints, pose_from_xyz_rpy
+
+# Joints 1-6 in degrees
+LOW = np.array([-170, -90, -90, -170, -120, -170])
+HIGH = -LOW
+
+
+def random_joints(count, seed=0):
+    return np.random.default_rng(seed).uniform(LOW, HIGH, (count, 6))
+
+
+@pytest.mark.parametrize('joints', [
+    [0, 0, 0, 0, 0, 0],
+    [0, 0, 0, 0, 30, 0],
+    [20, 10, 15, -30, 45, 60],
+    [-45, 30, -20, 90, 10, -120],
+])
+def test_default_branch_round_trip(joints):
+    assert inverse_kinematics(forward_kinematics(joints)) == pytest.approx(joints, abs=1e-6)
+
+
+def test_default_branch_is_front_shoulder_elbow_up_wrist_not_flipped():
+    joints = random_joints(2000)
+    poses = forward_kinematics(joints)
+    solved = inverse_kinematics(poses)
+    assert not np.isnan(solved).any()
+    assert np.abs(forward_kinematics(solved) - poses).max() < 1e-6
+    assert (solved[:, 4] >= 0).all()
+    assert solved == pytest.approx(ik_solutions(poses)[:, 0], abs=1e-9)
+
+
+def test_seed_round_trip_returns_the_same_joints():
+    joints = random_joints(2000, seed=1)
+    poses = forward_kinematics(joints)
+    assert np.abs(inverse_kinematics(poses, seed=joints) - joints).max() < 1e-6
+    # A seed a few degrees away picks the same branch, away from the stretched arm (joint 3
+    # near -86) where the elbow up and down solutions meet
+    joints = joints[np.abs(joints[:, 2] + 86) > 15]
+    poses = forward_kinematics(joints)
+    near = joints + np.random.default_rng(2).uniform(-5, 5, joints.shape)
+    assert np.abs(inverse_kinematics(poses, seed=near) - joints).max() < 1e-6
+
+
+def test_back_shoulder_pose():
+    joints = [-87.9, -32.5, -28.0, 86.8, 60.0, 25.2]
+    pose = forward_kinematics(joints)
+    assert inverse_kinematics(pose, seed=joints) == pytest.approx(joints, abs=1e-6)
+    # Without seed: the same pose from the front shoulder
+    solved = inverse_kinematics(pose)
+    assert solved[0] == pytest.approx(92.1, abs=1e-6)
+    assert forward_kinematics(solved) == pytest.approx(pose, abs=1e-6)
+
+
+def test_solutions_reach_the_pose():
+    pose = forward_kinematics([20, 10, 15, -30, 45, 60])
+    solutions = ik_solutions(pose)
+    reachable = solutions[~np.isnan(solutions[:, 0])]
+    assert len(reachable) >= 4
+    for joints in reachable:
+        assert forward_kinematics(joints) == pytest.approx(pose, abs=1e-6)
+
+
+def test_unreachable_pose_is_nan():
+    assert np.isnan(inverse_kinematics(pose_from_xyz_rpy([5000, 0, 0], [0, 0, 0]))).all()
+
+
+def test_cartesian_path_stays_on_one_branch():
+    start = np.array([-87.9, -32.5, -28.0, 86.8, 60.0, 25.2])
+    end = np.array([-60.0, -20.0, -40.0, 60.0, 40.0, 0.0])
+    joints = start + np.linspace(0, 1, 50)[:, None] * (end - start)
+    motors = cartesian_path_to_motors(forward_kinematics(joints), seed=start)
+    assert motors == pytest.approx(joints_to_motors(joints), abs=1e-6)
+    assert np.abs(np.diff(motors, axis=0)).max() < 5
+
+
+def test_motor_joint_conversion_round_trip():
+    joints = random_joints(10)
+    assert motors_to_joints(joints_to_motors(joints)) == pytest.approx(joints)
+
+
+def test_cached_matches_uncached():
+    pose = forward_kinematics([20, 10, 15, -30, 45, 60])
+    assert inverse_kinematics_cached(pose) == pytest.approx(inverse_kinematics(pose))
@@ -0,0 +1,75 @@
+import time
+
+from led_device import Color, LedDevice, LedRenderer
+
+
+class RecordingBus:
+    def __init__(self) -> None:
+        self.sent = []
+
+    def send(self, message, timeout=None):
+        self.sent.append(message)
+
+
+def test_show_packs_two_leds_per_byte():
+    bus = RecordingBus()
+    led = LedDevice(bus)
+    led.set_led(0, Color.RED, send_to_device=False)
+    led.set_led(1, Color.GREEN, send_to_device=False)
+    led.set_led(10, Color.BLUE)
+    data = bus.sent[-1].data
+    assert data[0] == 0x02
+    assert data[1] == (Color.RED.value << 4) | Color.GREEN.value
+    # 11 LEDs: the last byte holds the 11th and a padding nibble
+    assert data[6] == Color.BLUE.value << 4
+    assert led.shown == tuple(led.leds)
+
+
+def test_pump_limits_the_rate_and_sends_the_latest_state():
+    bus = RecordingBus()
+    led = LedDevice(bus)
+    renderer = LedRenderer(led, rate=10)
+
+    led.set_led(0, Color.RED, send_to_device=False)
+    renderer.invalidate()
+    assert renderer.pump() == float('inf')
+    assert len(bus.sent) == 1
+
+    # Changes within the interval wait for it
+    led.set_led(0, Color.GREEN, send_to_device=False)
+    renderer.invalidate()
+    led.set_led(0, Color.BLUE, send_to_device=False)
+    renderer.invalidate()
+    delay = renderer.pump()
+    assert 0 < delay <= 0.1
+    assert len(bus.sent) == 1
+
+    time.sleep(delay)
+    assert renderer.pump() == float('inf')
+    assert len(bus.sent) == 2
+    assert bus.sent[-1].data[1] >> 4 == Color.BLUE.value
+
+    # Nothing changed: nothing sent
+    renderer.invalidate()
+    time.sleep(0.1)
+    renderer.pump()
+    assert len(bus.sent) == 2
+
+
+def test_thread_rate_limit():
+    bus = RecordingBus()
+    led = LedDevice(bus)
+    renderer = LedRenderer(led, rate=10).start()
+    try:
+        colors = [Color.RED, Color.GREEN, Color.BLUE]
+        for index in range(60):
+            led.set_led(0, colors[index % 3], send_to_device=False)
+            renderer.invalidate()
+            time.sleep(0.005)
+        last = led.leds[0]
+        time.sleep(0.25)
+    finally:
+        renderer.stop()
+    # About 0.3 s at 10 frames per second, not one frame per change
+    assert 2 <= len(bus.sent) <= 5
+    assert bus.sent[-1].data[1] >> 4 == last.value
@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+from can_recorder import DIRECTION_RX, DIRECTION_TX, CanRecorder
+from constants import CMD_GET_CURRENT_SPEED, CMD_MOTOR_STATUS, CMD_READ_ENCODER
+from log_index import (RecordingIndex, decode_speed, decode_status, encoder_counts, encoder_degrees,
+                       valid_checksums)
+from mks_codec import ENCODER_COUNTS, decode_reply, encode_reply, encode_request
+
+ENCODERS = [(0, 0), (0, 0x2000), (1, 0x0100), (-1, 0x3F00), (-3, 0x0001), (2, 0x3FFF)]
+
+
+def record_session(directory):
+    """
+    Encoder replies of motors 1 and 2 over several files, with other frames in between.
+    """
+    with CanRecorder(directory, max_records=5) as recorder:
+        for index, (carry, value) in enumerate(ENCODERS):
+            timestamp = 10.0 + index
+            recorder.record(encode_request(1, CMD_READ_ENCODER), DIRECTION_TX, timestamp)
+            recorder.record(encode_reply(1, CMD_READ_ENCODER, carry, value), DIRECTION_RX, timestamp + 0.01)
+            recorder.record(encode_reply(2, CMD_READ_ENCODER, -carry, value), DIRECTION_RX, timestamp + 0.02)
+        recorder.record(encode_reply(1, CMD_GET_CURRENT_SPEED, -120), DIRECTION_RX, 20.0)
+        recorder.record(encode_reply(1, CMD_MOTOR_STATUS, 0x02), DIRECTION_RX, 20.5)
+        corrupted = encode_reply(1, CMD_READ_ENCODER, 5, 5)
+        corrupted.data[-1] ^= 0xFF
+        recorder.record(corrupted, DIRECTION_RX, 21.0)
+
+
+@pytest.fixture(params=[2, 4096])
+def index(request, tmp_path):
+    record_session(str(tmp_path))
+    return RecordingIndex(str(tmp_path), block_size=request.param)
+
+
+def test_recording_spans_files(index):
+    assert len(index.files) > 1
+
+
+def test_query_matches_decode_reply(index):
+    records = index.query(1, CMD_READ_ENCODER)
+    assert list(records['timestamp']) == pytest.approx([10.01 + i for i in range(len(ENCODERS))])
+    expected = [decode_reply(encode_reply(1, CMD_READ_ENCODER, carry, value)).counts for carry, value in ENCODERS]
+    assert list(encoder_counts(records)) == expected
+
+
+def test_query_by_id_and_direction(index):
+    motor_2 = index.query(2, CMD_READ_ENCODER)
+    assert list(encoder_counts(motor_2)) == [-carry * ENCODER_COUNTS + value for carry, value in ENCODERS]
+    requests = index.query(1, CMD_READ_ENCODER, direction=DIRECTION_TX)
+    assert len(requests) == len(ENCODERS)
+    assert len(index.query(3, CMD_READ_ENCODER)) == 0
+
+
+def test_query_time_range(index):
+    records = index.query(1, CMD_READ_ENCODER, start=11.5, end=14.0)
+    assert list(records['timestamp']) == pytest.approx([12.01, 13.01])
+    assert len(index.query(1, CMD_READ_ENCODER, start=30.0)) == 0
+
+
+def test_checksum(index):
+    unchecked = index.query(1, CMD_READ_ENCODER, check_crc=False)
+    assert len(unchecked) == len(ENCODERS) + 1
+    assert list(valid_checksums(unchecked)) == [True] * len(ENCODERS) + [False]
+
+
+def test_speed_and_status(index):
+    assert list(decode_speed(index.query(1, CMD_GET_CURRENT_SPEED))) == [-120]
+    assert list(decode_status(index.query(1, CMD_MOTOR_STATUS))) == [0x02]
+
+
+def test_encoder_degrees(index):
+    records = index.query(1, CMD_READ_ENCODER)
+    counts = np.array([carry * ENCODER_COUNTS + value for carry, value in ENCODERS])
+    assert encoder_degrees(records, 13.5, 5.0) == pytest.approx(counts * 360 / ENCODER_COUNTS / 13.5 + 5.0)
+
+
+def test_empty_recording(tmp_path):
+    index = RecordingIndex(str(tmp_path))
+    assert len(index.query(1, CMD_READ_ENCODER)) == 0
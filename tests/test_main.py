@@ -0,0 +1,18 @@
+import can
+
+import main
+from position_snapshot import load_snapshot
+
+
+def test_go_home_saves_the_snapshot_on_exit(simulator, channel, tmp_path, monkeypatch):
+    path = str(tmp_path / 'snapshot.json')
+    monkeypatch.setattr(main, 'DEFAULT_SNAPSHOT_PATH', path)
+
+    bus = can.Bus(interface='virtual', channel=channel)
+    main.go_home(bus)
+    # Shut down by the flow, a second shutdown (run_fn) is harmless
+    bus.shutdown()
+
+    snapshot = load_snapshot(path)
+    assert snapshot is not None and snapshot['clean']
+    assert snapshot['axes']['x']['position'] is not None
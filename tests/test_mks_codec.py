@@ -0,0 +1,92 @@
+import struct
+
+import can
+import pytest
+
+from can_helper import calc_checksum
+from constants import CMD_ABSOLUTE_TURN, CMD_GET_CURRENT_SPEED, CMD_GO_HOME, CMD_READ_ENCODER, CMD_RELATIVE_TURN, \
+    CMD_RUN_MOTOR, X_MOTOR_ID
+from mks_codec import ENCODER_COUNTS, REPLY_LAYOUTS, REQUEST_LAYOUTS, ChecksumError, EncoderReply, MessagePool, \
+    SpeedReply, StatusReply, decode_reply, decode_request, encode_reply, encode_request, has_valid_checksum
+
+
+def sample_values(layout, sign=1):
+    """
+    Values for every field of a layout, the largest each field holds.
+    """
+    codes = layout.struct.format[2:]
+    values = []
+    for index, code in enumerate(codes):
+        if layout.int24 and index == len(codes) - 1:
+            values.append(sign * 0x7FFFFF)
+        else:
+            size = struct.calcsize('>' + code)
+            values.append((1 << (8 * size - 1)) - 1 if code.islower() else (1 << (8 * size)) - 1)
+    return tuple(values)
+
+
+@pytest.mark.parametrize('opcode', sorted(REQUEST_LAYOUTS))
+def test_request_round_trip(opcode):
+    layout = REQUEST_LAYOUTS[opcode]
+    for sign in (1, -1):
+        values = sample_values(layout, sign)
+        message = encode_request(X_MOTOR_ID, opcode, *values)
+        assert len(message.data) == layout.size
+        assert message.data[0] == opcode
+        assert message.data[-1] == calc_checksum(X_MOTOR_ID, list(message.data[:-1]))
+        assert decode_request(message) == (opcode, *values)
+
+
+@pytest.mark.parametrize('opcode', sorted(REPLY_LAYOUTS))
+def test_reply_round_trip(opcode):
+    layout = REPLY_LAYOUTS[opcode]
+    values = sample_values(layout)
+    message = encode_reply(X_MOTOR_ID, opcode, *values)
+    assert len(message.data) == layout.size
+    assert has_valid_checksum(message)
+    reply = decode_reply(message)
+    assert reply.can_id == X_MOTOR_ID and reply.opcode == opcode
+    if isinstance(reply, EncoderReply):
+        assert (reply.carry, reply.value) == values
+    elif isinstance(reply, SpeedReply):
+        assert reply.speed == values[0]
+    else:
+        assert isinstance(reply, StatusReply) and reply.status == values[0]
+
+
+def test_turn_frame_layout():
+    # speed 0x0123, acc 0x45, axis -2 as 24 bit two's complement
+    message = encode_request(X_MOTOR_ID, CMD_RELATIVE_TURN, 0x0123, 0x45, -2)
+    assert bytes(message.data[:-1]) == bytes([CMD_RELATIVE_TURN, 0x01, 0x23, 0x45, 0xFF, 0xFF, 0xFE])
+    assert decode_request(message) == (CMD_RELATIVE_TURN, 0x0123, 0x45, -2)
+    assert decode_request(encode_request(X_MOTOR_ID, CMD_ABSOLUTE_TURN, 1, 2, 3 * ENCODER_COUNTS)) == \
+        (CMD_ABSOLUTE_TURN, 1, 2, 3 * ENCODER_COUNTS)
+
+
+def test_negative_encoder_and_speed_replies():
+    encoder = decode_reply(encode_reply(X_MOTOR_ID, CMD_READ_ENCODER, -2, 0x1000))
+    assert encoder.counts == -2 * ENCODER_COUNTS + 0x1000
+    assert decode_reply(encode_reply(X_MOTOR_ID, CMD_GET_CURRENT_SPEED, -300)).speed == -300
+
+
+def test_bad_checksum():
+    message = encode_reply(X_MOTOR_ID, CMD_GO_HOME, 0x02)
+    message.data[-1] ^= 0xFF
+    with pytest.raises(ChecksumError):
+        decode_reply(message)
+    with pytest.raises(ChecksumError):
+        decode_request(message)
+
+
+def test_unknown_and_short_frames_decode_to_none():
+    assert decode_reply(can.Message(arbitration_id=X_MOTOR_ID, data=[0x99, 0x01, 0x9A], is_extended_id=False)) is None
+    assert decode_reply(can.Message(arbitration_id=X_MOTOR_ID, data=[CMD_READ_ENCODER, 0x00], is_extended_id=False)) is None
+    assert decode_reply(can.Message(arbitration_id=X_MOTOR_ID, data=[], is_extended_id=False)) is None
+
+
+def test_message_pool_reuses_the_frame():
+    pool = MessagePool(X_MOTOR_ID)
+    first = pool.request(CMD_RUN_MOTOR, 0x8100, 10)
+    second = pool.request(CMD_RUN_MOTOR, 0, 10)
+    assert first is second
+    assert decode_request(second) == (CMD_RUN_MOTOR, 0, 10)
@@ -0,0 +1,99 @@
+import time
+from concurrent.futures import CancelledError
+
+import pytest
+
+from base_motor import MotorStatus
+from constants import CMD_RELATIVE_TURN
+from motion_queue import MotionQueue, TURN_FAILED, TURN_STOPPED
+
+# Every turn rounds to whole encoder counts (0.0016 joint degrees on X)
+POSITION_TOLERANCE = 0.01
+
+
+@pytest.fixture
+def motor(arctos):
+    motor = arctos.x_motor()
+    motor.set_zero()
+    deadline = time.monotonic() + 1
+    while not motor.is_ready() and time.monotonic() < deadline:
+        time.sleep(0.005)
+    assert motor.is_ready()
+    return motor
+
+
+def test_turns_follow_each_other(motor):
+    queue = MotionQueue(motor)
+    futures = [queue.relative(degrees) for degrees in (10, -4, 6)]
+    assert queue.target == pytest.approx(12)
+    assert queue.wait(5)
+    assert [future.result() for future in futures] == [TURN_STOPPED] * 3
+    assert (queue.frames, queue.blended, queue.depth) == (3, 0, 0)
+    assert motor.position == pytest.approx(12, abs=POSITION_TOLERANCE)
+
+
+def test_absolute_turns_start_from_the_previous_target(motor):
+    queue = MotionQueue(motor)
+    queue.relative(10)
+    queue.absolute(-5)
+    queue.relative(2)
+    assert queue.wait(5)
+    assert motor.position == pytest.approx(-3, abs=POSITION_TOLERANCE)
+    assert queue.target == pytest.approx(-3, abs=POSITION_TOLERANCE)
+
+
+def test_blend_merges_turns_in_the_same_direction(motor):
+    queue = MotionQueue(motor, blend=True)
+    # The first turn is sent alone and runs while the others are queued
+    futures = [queue.relative(45, speed=100)]
+    futures += [queue.relative(degrees) for degrees in (10, 10, -5)]
+    assert queue.wait(10)
+    assert [future.result() for future in futures] == [TURN_STOPPED] * 4
+    assert (queue.frames, queue.blended) == (3, 1)
+    assert motor.position == pytest.approx(60, abs=POSITION_TOLERANCE)
+
+
+def test_clear_drops_the_turns_not_sent(motor):
+    queue = MotionQueue(motor)
+    running = queue.relative(45, speed=100)
+    queued = [queue.relative(10), queue.relative(10)]
+    assert queue.clear() == 2
+    assert all(future.cancelled() for future in queued)
+    assert queue.target == pytest.approx(45)
+    assert running.result(timeout=10) == TURN_STOPPED
+    assert queue.wait(1)
+    assert motor.position == pytest.approx(45, abs=POSITION_TOLERANCE)
+
+
+def test_emergency_stop_drops_the_queued_turns(arctos, motor):
+    queue = MotionQueue(motor)
+    running = queue.relative(720, speed=100, acc=100)
+    queued = queue.relative(10)
+    time.sleep(0.1)
+    arctos.emergency_stop()
+    assert running.result(timeout=5) == TURN_FAILED
+    with pytest.raises(CancelledError):
+        queued.result(timeout=1)
+    assert queue.wait(1)
+    assert queue.depth == 0
+
+
+def test_missing_reply_fails_the_turn_and_drops_the_queue(simulator, motor):
+    simulator._handlers[CMD_RELATIVE_TURN] = lambda motor, command, now: None
+    queue = MotionQueue(motor)
+    # Short turns with a steep ramp time out after about a second
+    running = queue.relative(1, acc=255)
+    queued = queue.relative(1, acc=255)
+    with pytest.raises(TimeoutError):
+        running.result(timeout=10)
+    # The queue is idle once the dropped turns are cancelled
+    assert queue.wait(1)
+    assert queued.cancelled()
+    assert motor.status == MotorStatus.ERROR
+
+
+def test_position_must_be_known(arctos):
+    queue = MotionQueue(arctos.y_motor())
+    with pytest.raises(AssertionError):
+        queue.relative(10)
+    assert queue.depth == 0
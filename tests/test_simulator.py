@@ -0,0 +1,73 @@
+import time
+
+import can
+import pytest
+
+import constants
+from constants import CMD_ABSOLUTE_TURN, CMD_EMERGENCY_STOP, CMD_RELATIVE_TURN, CMD_SET_ZERO, X_MOTOR_ID
+from mks_codec import ENCODER_COUNTS, REQUEST_LAYOUTS, encode_request
+
+# Opcode -> fields of a valid request
+_REQUEST_VALUES = {
+    constants.CMD_SET_ENABLE: (1,),
+    constants.CMD_REMAP: (0,),
+    constants.CMD_RELATIVE_TURN: (100, 200, 0),
+    constants.CMD_ABSOLUTE_TURN: (100, 200, 0),
+    constants.CMD_RUN_MOTOR: (0, 200),
+    constants.CMD_SET_WORK_CURRENT: (1600,),
+    constants.CMD_SET_SUBDIVISION: (16,),
+    constants.CMD_SET_HOME_PARAMS: (0, 0, 60, 1),
+}
+
+
+@pytest.fixture
+def bus(simulator, channel):
+    client = can.Bus(interface='virtual', channel=channel)
+    client.simulator = simulator
+    yield client
+    client.shutdown()
+
+
+def request(bus, opcode, *values, final=None, timeout=1.0):
+    """
+    Send a command to the X motor and return the status bytes received until final (or the first reply).
+    """
+    bus.send(encode_request(X_MOTOR_ID, opcode, *values))
+    statuses = []
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        message = bus.recv(timeout=deadline - time.monotonic())
+        if message is None or message.arbitration_id != X_MOTOR_ID or message.data[0] != opcode:
+            continue
+        statuses.append(message.data[1])
+        if final is None or message.data[1] in final:
+            break
+    return statuses
+
+
+def test_every_command_opcode_is_answered(bus):
+    opcodes = [value for name, value in vars(constants).items() if name.startswith('CMD_')]
+    assert set(opcodes) <= set(REQUEST_LAYOUTS)
+    for opcode in opcodes:
+        assert request(bus, opcode, *_REQUEST_VALUES.get(opcode, ())), f'No reply to 0x{opcode:02X}'
+
+
+def test_emergency_stop_halts_a_turn(bus):
+    request(bus, CMD_SET_ZERO)
+    pulses = 10 * ENCODER_COUNTS  # ten motor turns
+    bus.send(encode_request(X_MOTOR_ID, CMD_RELATIVE_TURN, 100, 200, pulses))
+    time.sleep(0.02)
+    assert request(bus, CMD_EMERGENCY_STOP) == [0x01]
+    stopped_at = bus.simulator.joint_position(X_MOTOR_ID)
+    time.sleep(0.1)
+    assert bus.simulator.joint_position(X_MOTOR_ID) == stopped_at
+    assert stopped_at < 3600 / bus.simulator.motors[X_MOTOR_ID].ratio
+
+
+def test_absolute_turn_reaches_the_target(bus):
+    request(bus, CMD_SET_ZERO)
+    ratio = bus.simulator.motors[X_MOTOR_ID].ratio
+    for joint in (20, -10, 0):
+        pulses = round(joint * ratio * ENCODER_COUNTS / 360)
+        assert request(bus, CMD_ABSOLUTE_TURN, 1000, 200, pulses, final=(0x00, 0x02, 0x03)) == [0x01, 0x02]
+        assert bus.simulator.joint_position(X_MOTOR_ID) == pytest.approx(joint, abs=0.01)
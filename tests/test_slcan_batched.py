@@ -0,0 +1,71 @@
+import can
+import pytest
+
+from slcan_batched import BatchedSlcanBus, encode_frame, parse_frame
+
+
+@pytest.fixture
+def bus():
+    # loop:// reads back everything written, so the bus receives its own frames
+    bus = BatchedSlcanBus('loop://', bitrate=500000, sleep_after_open=0)
+    yield bus
+    bus.shutdown()
+
+
+def frame(can_id, data):
+    return can.Message(arbitration_id=can_id, data=data, is_extended_id=False)
+
+
+@pytest.mark.parametrize('message', [
+    can.Message(arbitration_id=0x001, data=[], is_extended_id=False),
+    can.Message(arbitration_id=0x7FF, data=[0xF4, 0x01, 0x02, 0xAB], is_extended_id=False),
+    can.Message(arbitration_id=0x1ABCDEF0, data=range(8), is_extended_id=True),
+    can.Message(arbitration_id=0x123, dlc=3, is_remote_frame=True, is_extended_id=False),
+    can.Message(arbitration_id=0x1234567, dlc=2, is_remote_frame=True, is_extended_id=True),
+])
+def test_frame_round_trip(message):
+    line = encode_frame(message)
+    assert line.endswith(b'\r')
+    parsed = parse_frame(line[:-1], 1.5)
+    assert parsed.equals(message, timestamp_delta=None)
+    assert parsed.timestamp == 1.5
+
+
+@pytest.mark.parametrize('line', [b'', b'z', b'Z', b'\a', b'C', b'tXYZ1', b't12'])
+def test_acks_and_garbage_are_not_frames(line):
+    assert parse_frame(line, 0.0) is None
+
+
+def test_batch_writes_once(bus):
+    writes = bus.writes
+    with bus.batch():
+        for can_id in range(1, 7):
+            bus.send(frame(can_id, [0x30, can_id]))
+        assert bus.writes == writes
+    assert bus.writes == writes + 1
+    bus.send(frame(7, [0x31]))
+    assert bus.writes == writes + 2
+    assert bus.frames_sent == 7
+
+
+def test_nested_batches_flush_at_the_outer_block(bus):
+    writes = bus.writes
+    with bus.batch():
+        bus.send(frame(1, [1]))
+        with bus.batch():
+            bus.send(frame(2, [2]))
+        assert bus.writes == writes
+    assert bus.writes == writes + 1
+
+
+def test_frames_of_one_read_are_parsed_together(bus):
+    with bus.batch():
+        for can_id in range(1, 7):
+            bus.send(frame(can_id, [0x30, can_id]))
+    received = [bus.recv(1) for _ in range(6)]
+    assert [(message.arbitration_id, bytes(message.data)) for message in received] == \
+        [(can_id, bytes([0x30, can_id])) for can_id in range(1, 7)]
+    assert bus.reads == 1
+    assert bus.recv(0) is None
+    stats = bus.stats()
+    assert (stats['frames_sent'], stats['frames_received']) == (6, 6)
@@ -0,0 +1,53 @@
+import time
+
+import numpy as np
+import pytest
+
+from mks_codec import ENCODER_COUNTS
+from telemetry import ENCODER, SPEED, STATUS, RingBuffer, Telemetry
+
+
+def test_ring_buffer_wraps_around():
+    buffer = RingBuffer(4)
+    assert buffer.latest is None and len(buffer) == 0
+    for sample in range(6):
+        buffer.append(float(sample), sample * 10.0)
+    assert len(buffer) == 4
+    assert buffer.latest == (5.0, 50.0)
+    times, values = buffer.window()
+    assert list(times) == [2, 3, 4, 5]
+    assert list(values) == [20, 30, 40, 50]
+    times, values = buffer.window(start=3, end=4)
+    assert list(times) == [3, 4] and list(values) == [30, 40]
+
+
+def test_rate_is_lowered_to_the_bus_budget(arctos):
+    telemetry = Telemetry(arctos, rate=1000, bitrate=125000, max_bus_load=0.1)
+    assert telemetry.rate == pytest.approx(125000 * 0.1 / telemetry.bits_per_cycle())
+    assert telemetry.rate < 1000
+
+
+def test_polls_every_active_motor(arctos, simulator):
+    motor = arctos.x_motor()
+    motor.set_zero()
+    telemetry = Telemetry(arctos, rate=20).start()
+    try:
+        time.sleep(0.4)
+        motor.start_turn(10, speed=3000, acc=255).result(timeout=2)
+        time.sleep(0.2)
+    finally:
+        telemetry.stop()
+    assert set(telemetry.axes()) == set(arctos.get_active_axes())
+    for quantity in (ENCODER, SPEED, STATUS):
+        assert telemetry.latest('x', quantity) is not None
+    times, counts = telemetry.history('x', ENCODER)
+    assert len(times) >= 5
+    assert np.all(np.diff(times) >= 0)
+    # The encoder followed the turn: 10 joint degrees in counts
+    assert counts[0] == 0
+    assert counts[-1] == pytest.approx(10 * motor.ratio * ENCODER_COUNTS / 360, abs=1)
+
+    # Stopped: no more samples
+    samples = len(telemetry.history('x', ENCODER)[0])
+    time.sleep(0.2)
+    assert len(telemetry.history('x', ENCODER)[0]) == samples
@@ -0,0 +1,137 @@
+import threading
+
+import pytest
+
+import timer_wheel
+from timer_wheel import TimerWheel
+
+# Binary fractions keep the tick arithmetic exact
+TICK = 0.25
+
+
+class FakeClock:
+    def __init__(self, now: float = 1000.0) -> None:
+        self.now = now
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(timer_wheel, 'time', clock)
+    return clock
+
+
+def run_until(wheel, clock, end):
+    while clock.now < end:
+        clock.now += TICK
+        wheel.pump()
+
+
+def test_timers_fire_in_deadline_order_and_not_early(clock):
+    wheel = TimerWheel(tick=TICK, slots=16)
+    fired = []
+    for delay in (1.0, 0.25, 0.5, 0.6):
+        wheel.schedule(delay, lambda delay=delay: fired.append((delay, clock.now - 1000.0)))
+    assert len(wheel) == 4
+    run_until(wheel, clock, 1002.0)
+    assert [delay for delay, _ in fired] == [0.25, 0.5, 0.6, 1.0]
+    assert all(delay <= at < delay + TICK for delay, at in fired)
+    assert len(wheel) == 0 and wheel.fired == 4
+
+
+def test_deadlines_past_a_turn_of_the_wheel(clock):
+    wheel = TimerWheel(tick=TICK, slots=4)
+    fired = []
+    # 10 and 17 ticks away on a 4 slot wheel, sharing slots with the 2 and 1 tick timers
+    for delay in (2.5, 0.5, 4.25, 0.25):
+        wheel.schedule(delay, lambda delay=delay: fired.append((delay, clock.now - 1000.0)))
+    run_until(wheel, clock, 1005.0)
+    assert fired == [(0.25, 0.25), (0.5, 0.5), (2.5, 2.5), (4.25, 4.25)]
+
+
+def test_a_late_pump_fires_every_expired_timer(clock):
+    wheel = TimerWheel(tick=TICK, slots=4)
+    fired = []
+    for delay in (0.25, 1.5, 3.0, 10.0):
+        wheel.schedule(delay, lambda delay=delay: fired.append(delay))
+    clock.now += 5.0
+    wheel.pump()
+    assert sorted(fired) == [0.25, 1.5, 3.0]
+    assert len(wheel) == 1
+    run_until(wheel, clock, 1010.0)
+    assert sorted(fired) == [0.25, 1.5, 3.0, 10.0]
+
+
+def test_cancel(clock):
+    wheel = TimerWheel(tick=TICK, slots=4)
+    fired = []
+    cancelled = wheel.schedule(1.0, lambda: fired.append('cancelled'))
+    kept = wheel.schedule(1.0, lambda: fired.append('kept'))
+    assert cancelled.cancel() and not cancelled.active
+    assert not cancelled.cancel()
+    assert len(wheel) == 1
+    run_until(wheel, clock, 1002.0)
+    assert fired == ['kept']
+    assert not kept.active and not kept.cancel()
+    assert not wheel.cancel(kept)
+
+
+def test_deadline_in_the_past_fires_on_the_next_tick(clock):
+    wheel = TimerWheel(tick=TICK, slots=4)
+    fired = []
+    wheel.schedule_at(clock.now - 3.0, lambda: fired.append(clock.now))
+    wheel.pump()
+    assert fired == []
+    clock.now += TICK
+    wheel.pump()
+    assert fired == [1000.0 + TICK]
+
+
+def test_pump_returns_the_wait(clock):
+    wheel = TimerWheel(tick=TICK, slots=4)
+    assert wheel.pump() == float('inf')
+    wheel.schedule(2.0, lambda: None)
+    clock.now += 0.1
+    assert wheel.pump() == pytest.approx(TICK - 0.1)
+
+
+def test_wakeup_when_the_wheel_stops_being_empty(clock):
+    wheel = TimerWheel(tick=TICK, slots=4)
+    wakeups = []
+    wheel.wakeup = lambda: wakeups.append(len(wheel))
+    first = wheel.schedule(1.0, lambda: None)
+    wheel.schedule(1.0, lambda: None)
+    assert wakeups == [1]
+    run_until(wheel, clock, 1001.0)
+    first.cancel()
+    wheel.schedule(1.0, lambda: None)
+    assert wakeups == [1, 1]
+
+
+def test_a_failing_callback_does_not_stop_the_others(clock):
+    wheel = TimerWheel(tick=TICK, slots=4)
+    fired = []
+    wheel.schedule(0.25, lambda: 1 / 0)
+    wheel.schedule(0.25, lambda: fired.append(True))
+    run_until(wheel, clock, 1000.5)
+    assert fired == [True] and wheel.fired == 2
+
+
+def test_thread():
+    wheel = TimerWheel(tick=0.005).start()
+    try:
+        done = threading.Event()
+        # Added while the thread waits on an empty wheel
+        wheel.schedule(0.02, done.set)
+        assert done.wait(1)
+        fired = []
+        wheel.schedule(0.02, lambda: fired.append(True)).cancel()
+        done.clear()
+        wheel.schedule(0.04, done.set)
+        assert done.wait(1)
+        assert fired == []
+    finally:
+        wheel.stop()
@@ -0,0 +1,35 @@
+import numpy as np
+
+from trajectory_planner import PROFILE_S_CURVE, plan_trajectory, s_curve_min_time, trapezoidal_min_time
+
+
+def test_s_curve_short_move_is_rest_to_rest():
+    time, peak = s_curve_min_time(10, 100, 50, 1e9)
+    trapezoid_time, trapezoid_peak = trapezoidal_min_time(10, 100, 50)
+    assert np.isclose(time, trapezoid_time, rtol=1e-3)
+    assert np.isclose(peak, trapezoid_peak, rtol=1e-3)
+
+
+def test_s_curve_never_faster_than_trapezoid():
+    distances = np.array([0.01, 0.5, 5, 10, 50, 200, 1000])
+    for velocity, acceleration, jerk in [(100, 50, 20), (100, 50, 1e3), (30, 400, 100), (500, 100, 1e5)]:
+        s_curve, _ = s_curve_min_time(distances, velocity, acceleration, jerk)
+        trapezoid, _ = trapezoidal_min_time(distances, velocity, acceleration)
+        assert np.all(s_curve >= trapezoid - 1e-9)
+
+
+def test_s_curve_approaches_trapezoid_with_infinite_jerk():
+    distances = np.array([1, 10, 100, 1000])
+    trapezoid, _ = trapezoidal_min_time(distances, 100, 50)
+    errors = [np.max(np.abs(s_curve_min_time(distances, 100, 50, jerk)[0] - trapezoid)) for jerk in (1e2, 1e4, 1e6)]
+    assert errors[0] > errors[1] > errors[2]
+    assert errors[2] < 1e-3
+
+
+def test_s_curve_plan_keeps_a_real_ramp():
+    # The velocity limit is not reached: the ramp lasts the whole move
+    plan = plan_trajectory(['x'], [[0], [10]], [1], 200, 2000, profile=PROFILE_S_CURVE, max_jerk=1e5)
+    trapezoid = plan_trajectory(['x'], [[0], [10]], [1], 200, 2000)
+    assert plan.durations[0] >= trapezoid.durations[0]
+    assert 0 < plan.accelerations[0, 0] <= 2000
+    assert plan.accs[0, 0] > 1
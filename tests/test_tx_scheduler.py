@@ -0,0 +1,73 @@
+import can
+import pytest
+
+from can_helper import can_send_request
+from can_requests import PendingRequests
+from constants import CMD_EMERGENCY_STOP, CMD_READ_ENCODER, CMD_RELATIVE_TURN, CMD_RUN_MOTOR, X_MOTOR_ID, \
+    Y_MOTOR_ID, LED_ID
+from mks_codec import encode_request
+from tx_scheduler import TransmitScheduler, TxPriority, classify
+
+
+class RecordingBus:
+    def __init__(self, error: Exception = None) -> None:
+        self.error = error
+        self.sent = []
+
+    def send(self, message, timeout=None):
+        if self.error is not None:
+            raise self.error
+        self.sent.append(message)
+
+
+def turn(can_id):
+    return encode_request(can_id, CMD_RELATIVE_TURN, 1000, 200, 3200)
+
+
+def test_classify():
+    assert classify(encode_request(X_MOTOR_ID, CMD_EMERGENCY_STOP)) == TxPriority.EMERGENCY
+    assert classify(encode_request(X_MOTOR_ID, CMD_RUN_MOTOR, 0, 100)) == TxPriority.EMERGENCY
+    assert classify(encode_request(X_MOTOR_ID, CMD_RUN_MOTOR, 0x8100, 100)) == TxPriority.MOTION
+    assert classify(turn(X_MOTOR_ID)) == TxPriority.MOTION
+    assert classify(encode_request(X_MOTOR_ID, CMD_READ_ENCODER)) == TxPriority.QUERY
+    assert classify(can.Message(arbitration_id=LED_ID, data=[1, 2], is_extended_id=False)) == TxPriority.COSMETIC
+
+
+def test_emergency_stop_drops_the_queued_turn_of_its_motor():
+    bus = RecordingBus()
+    tx = TransmitScheduler(bus)
+    requests = PendingRequests()
+    tx.add_failed_listener(requests.fail_request)
+    x_turn = can_send_request(tx, turn(X_MOTOR_ID), requests)
+    y_turn = can_send_request(tx, turn(Y_MOTOR_ID), requests)
+    read = can_send_request(tx, encode_request(X_MOTOR_ID, CMD_READ_ENCODER), requests)
+    tx.send(encode_request(X_MOTOR_ID, CMD_EMERGENCY_STOP))
+    tx.pump()
+
+    sent = [(message.arbitration_id, message.data[0]) for message in bus.sent]
+    # The X turn is never sent after the stop; other motors and queries are kept
+    assert sent == [(X_MOTOR_ID, CMD_EMERGENCY_STOP), (Y_MOTOR_ID, CMD_RELATIVE_TURN), (X_MOTOR_ID, CMD_READ_ENCODER)]
+    assert tx.superseded == 1
+    with pytest.raises(RuntimeError):
+        x_turn.result(timeout=0)
+    assert not y_turn.done() and not read.done()
+
+
+def test_stop_in_speed_mode_drops_the_queued_start():
+    bus = RecordingBus()
+    tx = TransmitScheduler(bus)
+    tx.send(encode_request(X_MOTOR_ID, CMD_RUN_MOTOR, 0x8100, 100))
+    tx.send(encode_request(X_MOTOR_ID, CMD_RUN_MOTOR, 0, 100))
+    tx.pump()
+    assert [bytes(message.data[:3]) for message in bus.sent] == [bytes([CMD_RUN_MOTOR, 0, 0])]
+
+
+def test_send_error_fails_the_request():
+    error = can.CanOperationError('bus off')
+    tx = TransmitScheduler(RecordingBus(error))
+    requests = PendingRequests()
+    tx.add_failed_listener(requests.fail_request)
+    future = can_send_request(tx, turn(X_MOTOR_ID), requests)
+    tx.pump()
+    assert future.exception(timeout=0) is error
+    assert len(requests) == 0
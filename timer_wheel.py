@@ -0,0 +1,158 @@
+"""
+Hashed timing wheel for the deadlines of in-flight commands.
+
+Timers are kept in one of ``slots`` sets chosen from their expiry tick, so
+adding and cancelling a timer is O(1) whatever the number of timers. Each
+tick only the timers of one slot are looked at.
+"""
+import math
+import threading
+import time
+from typing import Callable, List, Optional, Set
+
+
+class Timer:
+    __slots__ = ('deadline', 'callback', 'tick', '_wheel')
+
+    def __init__(self, wheel: 'TimerWheel', deadline: float, tick: int, callback: Callable[[], None]) -> None:
+        self.deadline = deadline
+        self.callback = callback
+        self.tick = tick
+        self._wheel: Optional[TimerWheel] = wheel
+
+    @property
+    def active(self) -> bool:
+        return self._wheel is not None
+
+    def cancel(self) -> bool:
+        """
+        :return: False when the timer already fired or was cancelled.
+        """
+        wheel = self._wheel
+        return wheel is not None and wheel.cancel(self)
+
+
+class TimerWheel:
+    def __init__(self, tick: float = 0.01, slots: int = 512) -> None:
+        """
+        Timers fired at most one tick after their deadline.
+
+        Runs its own thread after :meth:`start`, or is driven by an owner
+        calling :meth:`pump` (see :class:`arm_controller.ArmController`).
+        Callbacks run on that thread and must not block.
+
+        :param tick: Resolution in seconds.
+        :param slots: Number of slots, deadlines further than tick * slots
+            only cost a look per turn of the wheel.
+        """
+        self.tick = tick
+        self._slots: List[Set[Timer]] = [set() for _ in range(slots)]
+        self._lock = threading.Lock()
+        self._condition = threading.Condition(self._lock)
+        self._count = 0
+        # Last tick processed
+        self._current = math.floor(time.monotonic() / tick)
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+        # Called when a timer is added to an empty wheel, for an owner waiting on pump()
+        self.wakeup: Optional[Callable[[], None]] = None
+        self.fired = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _tick_of(self, deadline: float) -> int:
+        return math.ceil(deadline / self.tick)
+
+    def schedule(self, delay: float, callback: Callable[[], None]) -> Timer:
+        """
+        Call callback once delay seconds have passed, unless the timer is cancelled first.
+        """
+        return self.schedule_at(time.monotonic() + delay, callback)
+
+    def schedule_at(self, deadline: float, callback: Callable[[], None]) -> Timer:
+        """
+        Call callback once time.monotonic() reaches deadline, unless the timer is cancelled first.
+        """
+        with self._lock:
+            # A tick already processed is looked at again one turn later: fire it on the next one
+            tick = max(self._tick_of(deadline), self._current + 1)
+            timer = Timer(self, deadline, tick, callback)
+            self._slots[tick % len(self._slots)].add(timer)
+            self._count += 1
+            was_empty = self._count == 1
+            if was_empty:
+                self._condition.notify()
+        if was_empty and self.wakeup is not None:
+            self.wakeup()
+        return timer
+
+    def cancel(self, timer: Timer) -> bool:
+        with self._lock:
+            if timer._wheel is not self:
+                return False
+            timer._wheel = None
+            self._slots[timer.tick % len(self._slots)].discard(timer)
+            self._count -= 1
+            return True
+
+    def pump(self) -> float:
+        """
+        Fire the expired timers.
+
+        :return: Seconds until the next tick, inf when there is no timer.
+        """
+        now = time.monotonic()
+        expired: List[Timer] = []
+        with self._lock:
+            target = math.floor(now / self.tick)
+            slots = self._slots
+            # Past a full turn every slot has been looked at
+            start = max(self._current + 1, target - len(slots) + 1)
+            for tick in range(start, target + 1):
+                slot = slots[tick % len(slots)]
+                if not slot:
+                    continue
+                due = [timer for timer in slot if timer.tick <= target]
+                for timer in due:
+                    slot.discard(timer)
+                    timer._wheel = None
+                expired.extend(due)
+            self._current = max(self._current, target)
+            self._count -= len(expired)
+            empty = self._count == 0
+        for timer in expired:
+            self.fired += 1
+            try:
+                timer.callback()
+            except Exception as e:
+                print(f"Error in timer callback: {e}")
+        if empty:
+            return float('inf')
+        return max(0.0, (self._current + 1) * self.tick - time.monotonic())
+
+    def start(self) -> 'TimerWheel':
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True, name='timer wheel')
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        with self._lock:
+            self._running = False
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+
+    def _run(self) -> None:
+        while self._running:
+            wait = self.pump()
+            with self._lock:
+                if not self._running:
+                    break
+                if self._count == 0:
+                    self._condition.wait()
+                elif wait > 0:
+                    # A timer added since pump() returned fires at the earliest next tick
+                    self._condition.wait(min(wait, self.tick))
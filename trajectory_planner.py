@@ -0,0 +1,233 @@
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from base_motor import BaseMotor
+from mks_codec import ENCODER_COUNTS
+
+MAX_SPEED = 3000
+MAX_ACC = 255
+# Motor shaft degrees per second for one unit of firmware speed (RPM)
+DEGREES_PER_SECOND_PER_RPM = 6.0
+# The firmware changes the speed by 1 RPM every (256 - acc) * ACC_TICK seconds
+ACC_TICK = 50e-6
+
+PROFILE_TRAPEZOIDAL = 'trapezoidal'
+PROFILE_S_CURVE = 's_curve'
+
+
+@dataclass
+class TurnCommand:
+    """Parameters of one BaseMotor.make_turn call."""
+    degrees: float
+    speed: int
+    acc: int
+    # Relative axis value sent in the CMD_RELATIVE_TURN frame
+    pulses: int
+    duration: float
+
+
+@dataclass
+class TrajectoryPlan:
+    axes: List[str]
+    # Per segment duration in seconds, shape (segments,)
+    durations: np.ndarray
+    # Arrays below have shape (segments, axes)
+    # Relative joint angle in degrees
+    distances: np.ndarray
+    # Peak joint velocity (deg/s) and mean ramp acceleration (deg/s^2)
+    velocities: np.ndarray
+    accelerations: np.ndarray
+    # Firmware parameters of the CMD_RELATIVE_TURN frames
+    speeds: np.ndarray
+    accs: np.ndarray
+    pulses: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.durations)
+
+    @property
+    def total_duration(self) -> float:
+        return float(self.durations.sum())
+
+    def commands(self, segment: int) -> Dict[str, TurnCommand]:
+        """
+        Turn parameters of a segment, axis name -> command. Axes that don't move are left out.
+        """
+        commands = {}
+        for index, axis in enumerate(self.axes):
+            if self.distances[segment, index] == 0:
+                continue
+            commands[axis] = TurnCommand(
+                degrees=float(self.distances[segment, index]),
+                speed=int(self.speeds[segment, index]),
+                acc=int(self.accs[segment, index]),
+                pulses=int(self.pulses[segment, index]),
+                duration=float(self.durations[segment]),
+            )
+        return commands
+
+    def timeout(self, segment: int, margin: float = 0.5, factor: float = 1.5) -> float:
+        """
+        Timeout to wait for the end of a segment.
+
+        :param segment: Segment index.
+        :param margin: Seconds added to the scaled duration (bus and ack latency).
+        :param factor: Multiplier of the predicted duration.
+        """
+        return float(self.durations[segment]) * factor + margin
+
+
+def motor_limits(motor: BaseMotor, speed: int = MAX_SPEED, acc: int = MAX_ACC):
+    """
+    Joint velocity (deg/s) and acceleration (deg/s^2) reached by a motor at the given firmware speed and acc.
+    """
+    velocity = speed * DEGREES_PER_SECOND_PER_RPM / motor.ratio
+    acceleration = DEGREES_PER_SECOND_PER_RPM / ((256 - acc) * ACC_TICK) / motor.ratio
+    return velocity, acceleration
+
+
+def trapezoidal_min_time(distance, max_velocity, max_acceleration):
+    """
+    Minimum rest-to-rest time and peak velocity of a trapezoidal profile, element-wise.
+    """
+    distance = np.abs(distance)
+    v, a = np.broadcast_arrays(max_velocity, max_acceleration)
+    reaches_v = distance * a >= v * v
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cruise_time = np.where(reaches_v, distance / v + v / a, 0.0)
+        triangle_time = 2 * np.sqrt(distance / a)
+    time = np.where(reaches_v, cruise_time, triangle_time)
+    peak = np.where(reaches_v, v, np.sqrt(distance * a))
+    return time, peak
+
+
+def s_curve_min_time(distance, max_velocity, max_acceleration, max_jerk):
+    """
+    Minimum rest-to-rest time and peak velocity of a jerk limited (7 phase) profile, element-wise.
+    """
+    distance = np.abs(distance)
+    v, a, j = np.broadcast_arrays(max_velocity, max_acceleration, max_jerk)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Time to go from rest to velocity vp, whether or not a is reached
+        def ramp_time(vp):
+            return np.where(vp * j >= a * a, a / j + vp / a, 2 * np.sqrt(vp / j))
+
+        ramp = ramp_time(v)
+        # Distance covered while ramping up and down again is vp * ramp
+        reaches_v = distance >= v * ramp
+        time_v = 2 * ramp + (distance - v * ramp) / v
+
+        # v is not reached: peak velocity with acceleration saturated...
+        ta = a / j
+        peak_a = (-ta + np.sqrt(ta * ta + 4 * distance / a)) * a / 2
+        # ...or without ever reaching a
+        peak_j = np.cbrt((distance * np.sqrt(j) / 2) ** 2)
+        peak = np.where(peak_a * j >= a * a, peak_a, peak_j)
+        # Ramp up to the peak and straight back down
+        time_peak = 2 * ramp_time(peak)
+        time_peak = np.where(np.isfinite(time_peak), time_peak, 0.0)
+
+    time = np.where(reaches_v, time_v, time_peak)
+    peak = np.where(reaches_v, v, peak)
+    return np.nan_to_num(time), np.nan_to_num(peak)
+
+
+def plan_trajectory(axes: Sequence[str],
+                    waypoints,
+                    ratios,
+                    max_velocity,
+                    max_acceleration,
+                    profile: str = PROFILE_TRAPEZOIDAL,
+                    max_jerk=None) -> TrajectoryPlan:
+    """
+    Plan synchronized moves through joint waypoints.
+
+    Each segment lasts as long as its slowest axis at its limits. The other
+    axes are slowed down by scaling their profile in time, so all of them
+    start and arrive together. Everything is computed on (segments, axes)
+    arrays, so long waypoint lists cost a few NumPy operations.
+
+    :param axes: Axis names, in waypoint column order.
+    :param waypoints: Absolute joint angles in degrees, shape (points, axes).
+    :param ratios: Gear ratio of each axis, shape (axes,).
+    :param max_velocity: Joint velocity limit in deg/s, scalar or shape (axes,).
+    :param max_acceleration: Joint acceleration limit in deg/s^2, scalar or shape (axes,).
+    :param profile: PROFILE_TRAPEZOIDAL or PROFILE_S_CURVE.
+    :param max_jerk: Joint jerk limit in deg/s^3, required by PROFILE_S_CURVE.
+    :return: The plan, with the firmware parameters of every segment.
+    """
+    waypoints = np.atleast_2d(np.asarray(waypoints, dtype=float))
+    assert waypoints.shape[1] == len(axes), 'Waypoints must have one column per axis'
+    ratios = np.asarray(ratios, dtype=float)
+    max_velocity = np.broadcast_to(np.asarray(max_velocity, dtype=float), ratios.shape)
+    max_acceleration = np.broadcast_to(np.asarray(max_acceleration, dtype=float), ratios.shape)
+
+    distances = np.diff(waypoints, axis=0)
+    if profile == PROFILE_TRAPEZOIDAL:
+        times, peaks = trapezoidal_min_time(distances, max_velocity, max_acceleration)
+    elif profile == PROFILE_S_CURVE:
+        assert max_jerk is not None, 'S-curve profile needs max_jerk'
+        max_jerk = np.broadcast_to(np.asarray(max_jerk, dtype=float), ratios.shape)
+        times, peaks = s_curve_min_time(distances, max_velocity, max_acceleration, max_jerk)
+    else:
+        raise ValueError(f"Unknown profile '{profile}'")
+
+    durations = times.max(axis=1) if times.size else np.zeros(0)
+    # Stretching a profile in time by s divides its velocity by s and its
+    # acceleration by s^2, keeping every axis inside its limits
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scale = np.where(times > 0, times / durations[:, None], 0.0)
+    velocities = peaks * scale
+    # The firmware only runs trapezoids: use the mean acceleration of the
+    # ramp, which lasts (time - distance / peak) for both profiles
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ramp_times = times - np.abs(distances) / peaks
+        accelerations = np.where(ramp_times > 0, peaks / ramp_times, 0.0) * scale * scale
+
+    speeds, accs, pulses = firmware_parameters(distances, velocities, accelerations, ratios)
+    return TrajectoryPlan(list(axes), durations, distances, velocities, accelerations, speeds, accs, pulses)
+
+
+def firmware_parameters(distances, velocities, accelerations, ratios):
+    """
+    Convert joint distances (deg), velocities (deg/s) and accelerations (deg/s^2) to firmware speed, acc and pulses.
+    """
+    motor_rotation = distances * ratios
+    speeds = np.clip(np.rint(velocities * ratios / DEGREES_PER_SECOND_PER_RPM), 1, MAX_SPEED).astype(int)
+    motor_acceleration = accelerations * ratios / DEGREES_PER_SECOND_PER_RPM
+    with np.errstate(divide='ignore'):
+        acc = 256 - 1 / (motor_acceleration * ACC_TICK)
+    accs = np.clip(np.rint(np.nan_to_num(acc, neginf=1)), 1, MAX_ACC).astype(int)
+    pulses = np.rint(motor_rotation * ENCODER_COUNTS / 360).astype(int)
+    return speeds, accs, pulses
+
+
+def plan_motor_trajectory(motors: Dict[str, BaseMotor],
+                          waypoints: List[Dict[str, float]],
+                          start: Optional[Dict[str, float]] = None,
+                          speed: int = MAX_SPEED,
+                          acc: int = MAX_ACC,
+                          profile: str = PROFILE_TRAPEZOIDAL,
+                          max_jerk=None) -> TrajectoryPlan:
+    """
+    Plan a trajectory for motors, with limits taken from their firmware speed and acc.
+
+    :param motors: Axis name -> motor.
+    :param waypoints: Absolute joint angles, axis name -> degrees. Missing axes keep their previous angle.
+    :param start: Start angle per axis, defaults to the motor positions.
+    :param speed: Firmware speed limit of every axis (0-3000).
+    :param acc: Firmware acceleration limit of every axis (0-255).
+    :param profile: PROFILE_TRAPEZOIDAL or PROFILE_S_CURVE.
+    :param max_jerk: Joint jerk limit in deg/s^3 for PROFILE_S_CURVE.
+    """
+    axes = list(motors)
+    if start is None:
+        start = {axis: motor.position for axis, motor in motors.items()}
+    points = [[start[axis] for axis in axes]]
+    for waypoint in waypoints:
+        points.append([waypoint.get(axis, points[-1][index]) for index, axis in enumerate(axes)])
+    limits = np.array([motor_limits(motors[axis], speed, acc) for axis in axes])
+    ratios = [motors[axis].ratio for axis in axes]
+    return plan_trajectory(axes, points, ratios, limits[:, 0], limits[:, 1], profile=profile, max_jerk=max_jerk)
@@ -0,0 +1,326 @@
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from enum import IntEnum
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+import can
+
+from can_helper import frame_bits
+from constants import CMD_EMERGENCY_STOP, CMD_RUN_MOTOR, CMD_READ_ENCODER, CMD_GET_CURRENT_SPEED, \
+    CMD_MOTOR_STATUS, GRIPPER_ID, LED_ID
+
+
+class TxPriority(IntEnum):
+    EMERGENCY = 0
+    MOTION = 1
+    QUERY = 2
+    COSMETIC = 3
+
+
+_query_opcodes = {CMD_READ_ENCODER, CMD_GET_CURRENT_SPEED, CMD_MOTOR_STATUS}
+_cosmetic_ids = {GRIPPER_ID, LED_ID}
+
+
+def classify(message: can.Message) -> TxPriority:
+    """
+    Priority class of a frame from its id and opcode.
+    """
+    if message.arbitration_id in _cosmetic_ids:
+        return TxPriority.COSMETIC
+    data = message.data
+    if not data:
+        return TxPriority.MOTION
+    opcode = data[0]
+    if opcode == CMD_EMERGENCY_STOP:
+        return TxPriority.EMERGENCY
+    if opcode == CMD_RUN_MOTOR and len(data) > 2 and data[1] & 0x0F == 0 and data[2] == 0:
+        # Speed mode with speed 0: stop
+        return TxPriority.EMERGENCY
+    if opcode in _query_opcodes:
+        return TxPriority.QUERY
+    return TxPriority.MOTION
+
+
+class BusLoad:
+    def __init__(self, bitrate: int, window: float) -> None:
+        """
+        Sliding window estimate of the bus load from worst case frame bit lengths.
+
+        :param bitrate: Bus bitrate in bit/s.
+        :param window: Window length in seconds.
+        """
+        self.bitrate = bitrate
+        self.window = window
+        self._frames: Deque[Tuple[float, int]] = deque()
+        self._bits = 0
+
+    def add(self, message: can.Message, now: float) -> None:
+        bits = frame_bits(message.dlc, message.is_extended_id)
+        self._frames.append((now, bits))
+        self._bits += bits
+
+    def _expire(self, now: float) -> None:
+        frames = self._frames
+        while frames and frames[0][0] < now - self.window:
+            self._bits -= frames.popleft()[1]
+
+    def load(self, now: float) -> float:
+        """
+        Fraction of the bus used over the last window.
+        """
+        self._expire(now)
+        return self._bits / (self.bitrate * self.window)
+
+    def time_until_below(self, max_load: float, now: float) -> float:
+        """
+        Seconds until the load falls below max_load if nothing else is sent.
+        """
+        self._expire(now)
+        budget = max_load * self.bitrate * self.window
+        bits = self._bits
+        for timestamp, frame in self._frames:
+            if bits < budget:
+                break
+            bits -= frame
+            if bits < budget:
+                return max(0.0, timestamp + self.window - now)
+        return 0.0
+
+
+class TransmitScheduler:
+    def __init__(self,
+                 bus: can.interface.Bus,
+                 bitrate: int = 500000,
+                 max_load: float = 0.7,
+                 window: float = 0.1) -> None:
+        """
+        Single priority ordered transmit path of a bus.
+
+        Frames are sent highest priority first (emergency stop > motion >
+        queries > LED/gripper). Emergency and motion frames are always sent
+        right away; queries and cosmetic frames wait while the measured bus
+        load is above max_load. A cosmetic frame replaces any queued frame with
+        the same id, so only the latest LED/gripper state is sent. An emergency
+        frame drops the motion frames queued for its id, which would otherwise
+        be sent after it and set the motor in motion again.
+
+        It has the send() method of a bus, so it can be passed where a bus is
+        expected for sending (e.g. can_helper.can_send_message).
+
+        :param bus: Bus to send on.
+        :param bitrate: Bus bitrate in bit/s.
+        :param max_load: Bus load above which queries and cosmetic frames are held back.
+        :param window: Window in seconds of the bus load estimate.
+        """
+        self.bus = bus
+        self.max_load = max_load
+        self.load = BusLoad(bitrate, window)
+        # Heap of [priority, sequence, message]; message is None once replaced
+        self._queue: List[list] = []
+        self._sequence = itertools.count()
+        self._cosmetic: Dict[int, list] = {}
+        self._condition = threading.Condition()
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+        self.sent = {priority: 0 for priority in TxPriority}
+        self.coalesced = 0
+        # Called when a frame is queued, set by an I/O loop calling pump instead of the thread
+        self.wakeup: Optional[Callable[[], None]] = None
+        # Called with every frame once it is on the bus (recorders...)
+        self._sent_listeners: List[Callable[[can.Message], None]] = []
+        # Called with every frame that is not sent and the reason (see PendingRequests.fail_request)
+        self._failed_listeners: List[Callable[[can.Message, Exception], None]] = []
+        self.superseded = 0
+
+    def __len__(self) -> int:
+        with self._condition:
+            return sum(1 for entry in self._queue if entry[2] is not None)
+
+    def start(self) -> 'TransmitScheduler':
+        """
+        Send from a dedicated thread. Without it, pump() must be called by the owner's I/O loop.
+        """
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True, name='arctos tx')
+        self._thread.start()
+        return self
+
+    def stop(self, flush: bool = True) -> None:
+        if flush:
+            self.flush()
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+
+    def send(self, message: can.Message, timeout: Optional[float] = None, priority: Optional[TxPriority] = None) -> None:
+        """
+        Queue a frame.
+
+        :param message: Frame to send, must not be modified until sent.
+        :param timeout: Unused, for compatibility with BusABC.send.
+        :param priority: Priority class, derived from the frame when None.
+        """
+        if priority is None:
+            priority = classify(message)
+        superseded: List[can.Message] = []
+        with self._condition:
+            if priority == TxPriority.EMERGENCY:
+                superseded = self._supersede(message.arbitration_id)
+            if priority == TxPriority.COSMETIC:
+                queued = self._cosmetic.get(message.arbitration_id)
+                if queued is not None and queued[2] is not None:
+                    queued[2] = message
+                    self.coalesced += 1
+                    return
+            entry = [priority, next(self._sequence), message]
+            heapq.heappush(self._queue, entry)
+            if priority == TxPriority.COSMETIC:
+                self._cosmetic[message.arbitration_id] = entry
+            self._condition.notify()
+        for dropped in superseded:
+            self._failed(dropped, RuntimeError(
+                f"Device {dropped.arbitration_id}: 0x{dropped.data[0]:02X} dropped by an emergency stop"))
+        if self.wakeup is not None:
+            self.wakeup()
+
+    def _supersede(self, arbitration_id: int) -> List[can.Message]:
+        """
+        Drop the queued motion frames of a device. Called with the lock held.
+        """
+        superseded = []
+        for entry in self._queue:
+            message = entry[2]
+            if entry[0] == TxPriority.MOTION and message is not None and message.arbitration_id == arbitration_id:
+                entry[2] = None
+                superseded.append(message)
+        self.superseded += len(superseded)
+        return superseded
+
+    def add_sent_listener(self, listener: Callable[[can.Message], None]) -> None:
+        self._sent_listeners.append(listener)
+
+    def remove_sent_listener(self, listener: Callable[[can.Message], None]) -> None:
+        if listener in self._sent_listeners:
+            self._sent_listeners.remove(listener)
+
+    def add_failed_listener(self, listener: Callable[[can.Message, Exception], None]) -> None:
+        self._failed_listeners.append(listener)
+
+    def remove_failed_listener(self, listener: Callable[[can.Message, Exception], None]) -> None:
+        if listener in self._failed_listeners:
+            self._failed_listeners.remove(listener)
+
+    def _failed(self, message: can.Message, exc: Exception) -> None:
+        for listener in self._failed_listeners:
+            listener(message, exc)
+
+    def note_received(self, message: can.Message) -> None:
+        """
+        Account a received frame in the bus load.
+        """
+        with self._condition:
+            self.load.add(message, time.monotonic())
+
+    def _next(self, now: float) -> Tuple[Optional[can.Message], float]:
+        """
+        Pop the next frame allowed on the bus. Called with the lock held.
+
+        :return: (frame, 0) or (None, seconds to wait before trying again; inf when the queue is empty).
+        """
+        queue = self._queue
+        while queue and queue[0][2] is None:
+            heapq.heappop(queue)
+        if not queue:
+            return None, float('inf')
+        priority = queue[0][0]
+        if priority >= TxPriority.QUERY and self.load.load(now) >= self.max_load:
+            return None, max(self.load.time_until_below(self.max_load, now), 0.001)
+        _, _, message = heapq.heappop(queue)
+        if priority == TxPriority.COSMETIC:
+            self._cosmetic.pop(message.arbitration_id, None)
+        self.load.add(message, now)
+        self.sent[priority] += 1
+        return message, 0.0
+
+    def _take(self) -> Tuple[List[can.Message], float]:
+        """
+        Pop every frame allowed on the bus now. Called with the lock held.
+        """
+        now = time.monotonic()
+        messages = []
+        while True:
+            message, wait = self._next(now)
+            if message is None:
+                return messages, wait
+            messages.append(message)
+
+    def pump(self) -> float:
+        """
+        Send every frame currently allowed on the bus.
+
+        :return: Seconds until frames held back by the load budget may be sent, inf when the queue is empty.
+        """
+        while True:
+            with self._condition:
+                messages, wait = self._take()
+            if not messages:
+                return wait
+            self._transmit_all(messages)
+
+    def flush(self, timeout: float = 1.0) -> None:
+        """
+        Send everything queued, ignoring the load budget.
+        """
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._condition:
+                queue = self._queue
+                while queue and queue[0][2] is None:
+                    heapq.heappop(queue)
+                if not queue:
+                    return
+                priority, _, message = heapq.heappop(queue)
+                if priority == TxPriority.COSMETIC:
+                    self._cosmetic.pop(message.arbitration_id, None)
+                self.load.add(message, time.monotonic())
+                self.sent[priority] += 1
+            self._transmit(message)
+
+    def _transmit_all(self, messages: List[can.Message]) -> None:
+        # Buses that can coalesce writes (slcan_batched.BatchedSlcanBus) get the frames as one batch
+        batch = getattr(self.bus, 'batch', None)
+        if batch is None or len(messages) == 1:
+            for message in messages:
+                self._transmit(message)
+            return
+        with batch():
+            for message in messages:
+                self._transmit(message)
+
+    def _transmit(self, message: can.Message) -> None:
+        try:
+            self.bus.send(message)
+        except (can.CanError, OSError) as e:
+            print(f"Error (transmit): {e}")
+            # The caller waiting for a reply gets the send error instead of a timeout
+            self._failed(message, e)
+            return
+        for listener in self._sent_listeners:
+            listener(message)
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                if not self._running:
+                    return
+                messages, wait = self._take()
+                if not messages:
+                    self._condition.wait(None if wait == float('inf') else wait)
+                    continue
+            self._transmit_all(messages)